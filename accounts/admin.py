@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from ticket_system.cache import USERS
+from ticket_system.search import PrefixAutocompleteMixin
 from .models import CustomUser
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(PrefixAutocompleteMixin, BaseUserAdmin):
     list_display = ['email', 'first_name', 'last_name', 'company', 'role', 'is_active', 'is_staff']
     list_filter = ['role', 'is_active', 'is_staff', 'company']
     search_fields = ['email', 'first_name', 'last_name', 'phone_number']
@@ -47,3 +49,19 @@ class CustomUserAdmin(BaseUserAdmin):
     )
     
     readonly_fields = ['date_joined', 'last_login']
+    
+    autocomplete_prefix_fields = ['search_first_name', 'search_last_name', 'search_email']
+    autocomplete_cache_namespace = USERS
+    # One letter matches a large share of users across three indexes, and
+    # the union has to be sorted.
+    autocomplete_min_length = 2
+    
+    def get_autocomplete_scope(self, request, queryset):
+        if request.GET.get('model_name') == 'ticket' and request.GET.get('field_name') == 'assigned_to':
+            # Tickets can only be worked by active support staff.
+            queryset = queryset.filter(
+                is_active=True,
+                role__in=[CustomUser.SUPPORT, CustomUser.SUPERVISOR],
+            )
+            return queryset, 'assignee'
+        return queryset, 'all'
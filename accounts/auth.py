@@ -0,0 +1,80 @@
+"""
+Cached loading of the authenticated user.
+
+The user object is cached under its id. A hit is only trusted when the
+session's auth hash still matches the cached user's password-derived hash
+and the session's backend is still configured; anything else falls back to
+``django.contrib.auth.get_user``, which performs the full check (and logs
+the session out if it fails). Saving or deleting a CustomUser drops its
+entry, so role, ``is_active`` and password changes apply on the next
+request. Dropping an entry only reaches other workers through a shared
+cache, so the cached middleware and the write-behind sessions refuse to
+run on anything else (``require_shared_cache``).
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import constant_time_compare
+
+from monitoring.metrics import record_cache
+
+
+# Backends whose entries every worker on every host sees. locmem is per
+# process and the file cache per host.
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.db.DatabaseCache',
+)
+
+
+def shared_cache():
+    backend = type(caches['default'])
+    return f'{backend.__module__}.{backend.__qualname__}' in SHARED_CACHE_BACKENDS
+
+
+def require_shared_cache(feature):
+    if not shared_cache():
+        raise ImproperlyConfigured(
+            f'{feature} needs a cache shared by all workers (TICKET_CACHE_BACKEND=redis); '
+            f'the default cache is {settings.CACHES["default"]["BACKEND"]}.'
+        )
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def get_cached_user(request):
+    session = request.session
+    try:
+        user_id = session[SESSION_KEY]
+        backend_path = session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    session_hash = session.get(HASH_SESSION_KEY)
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    record_cache(user is not None)
+    if (
+        user is not None
+        and user.is_active
+        and backend_path in settings.AUTHENTICATION_BACKENDS
+        and session_hash
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        user.backend = backend_path
+        return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    return user
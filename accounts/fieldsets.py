@@ -0,0 +1,10 @@
+from companies.fieldsets import COMPANY_FIELDS
+from ticket_system.fieldsets import FieldSet
+from .models import CustomUser
+
+USER_FIELDS = FieldSet(
+    CustomUser,
+    fields=['id', 'email', 'first_name', 'last_name', 'phone_number', 'role', 'is_active', 'date_joined'],
+    related={'company': COMPANY_FIELDS},
+    default=['id', 'email', 'first_name', 'last_name', 'role', 'company'],
+)
@@ -0,0 +1,38 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.sessions import pending_writes
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in small batches without locking the session table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        pending_writes.flush()
+        cutoff = timezone.now()
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            # Each batch is its own short autocommit statement, so writers
+            # only ever wait for one small DELETE.
+            keys = list(
+                Session.objects.filter(expire_date__lt=cutoff)
+                .order_by()
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            deleted, _ = Session.objects.filter(session_key__in=keys, expire_date__lt=cutoff).delete()
+            total += deleted
+            if len(keys) < batch_size:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired session(s)'))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
+
+from .auth import get_cached_user, require_shared_cache
+from .throttling import Throttle
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that loads ``request.user`` through the user cache."""
+
+    def __init__(self, get_response):
+        require_shared_cache('CachedAuthenticationMiddleware')
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+
+
+class ApiThrottleMiddleware:
+    """
+    Rejects API requests over their user's or company's rate with a 429
+    and ``Retry-After``, before the view runs (see accounts.throttling).
+    Must come after the authentication middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'API_THROTTLE_ENABLED', True)
+        self.paths = tuple(getattr(settings, 'API_THROTTLE_PATHS', ('/api/',)))
+        self.throttle = Throttle() if self.enabled else None
+
+    def __call__(self, request):
+        if self.enabled and request.path.startswith(self.paths):
+            retry_after = self.throttle.check(request)
+            if retry_after is not None:
+                response = JsonResponse({'error': 'Too many requests.'}, status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+        return self.get_response(request)
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:34
+
+from django.db import migrations, models
+
+from ticket_system.search import normalize
+
+
+SEARCH_FIELDS = [('first_name', 'search_first_name'), ('last_name', 'search_last_name'), ('email', 'search_email')]
+
+
+def populate_search_fields(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    batch = []
+    for obj in CustomUser.objects.only('pk', *(source for source, _ in SEARCH_FIELDS)).iterator(chunk_size=2000):
+        for source, target in SEARCH_FIELDS:
+            setattr(obj, target, normalize(getattr(obj, source)))
+        batch.append(obj)
+        if len(batch) >= 2000:
+            CustomUser.objects.bulk_update(batch, [target for _, target in SEARCH_FIELDS])
+            batch = []
+    CustomUser.objects.bulk_update(batch, [target for _, target in SEARCH_FIELDS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='search_email',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='search_first_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='search_last_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150),
+        ),
+        migrations.RunPython(populate_search_fields, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from companies.models import Company
+from ticket_system.cache import USERS, bump_namespace
+from ticket_system.search import normalize
+from .auth import invalidate_users
 
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        for field, search_field in CustomUser.SEARCH_FIELDS.items():
+            if isinstance(kwargs.get(field), str):
+                kwargs[search_field] = normalize(kwargs[field])
+        # Bulk updates bypass post_save, so invalidate cached user data here.
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_users(user_ids)
+        bump_namespace(USERS)
+        return rows
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     """
     Custom user manager for CustomUser model.
     """
@@ -80,6 +96,17 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(null=True, blank=True)
     
+    # Normalized copies for indexed prefix search (admin autocomplete)
+    search_first_name = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
+    search_last_name = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
+    search_email = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
+    
+    SEARCH_FIELDS = {
+        'first_name': 'search_first_name',
+        'last_name': 'search_last_name',
+        'email': 'search_email',
+    }
+    
     objects = CustomUserManager()
     
     USERNAME_FIELD = 'email'
@@ -93,6 +120,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
     
+    def save(self, *args, **kwargs):
+        for field, search_field in self.SEARCH_FIELDS.items():
+            setattr(self, search_field, normalize(getattr(self, field)))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SEARCH_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {
+                self.SEARCH_FIELDS[f] for f in update_fields if f in self.SEARCH_FIELDS
+            }
+        super().save(*args, **kwargs)
+    
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
     
@@ -130,3 +167,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def can_edit_users(self):
         """Can edit user accounts."""
         return self.role in [self.SUPERVISOR, self.SUPERADMIN] or self.is_superuser
+    
+    def ticket_scope(self):
+        """Key naming the set of tickets this user can see, e.g. for ETags."""
+        if self.can_view_all_tickets():
+            return 'all'
+        return f'company:{self.company_id}' if self.company_id else 'none'
+    
+    def can_view_ticket(self, ticket):
+        """Can view a specific ticket (all tickets, or their company's)."""
+        if self.can_view_all_tickets():
+            return True
+        return self.company_id is not None and ticket.company_id == self.company_id
@@ -0,0 +1,116 @@
+"""
+Write-behind cached database sessions.
+
+Reads come from the cache and fall back to the ``django_session`` table, as
+with ``cached_db``. Writes that only change ordinary session data go to the
+cache immediately and are queued in this process; the queue is written to the
+database in a single statement every ``SESSION_WRITE_BEHIND_INTERVAL``
+seconds, when it reaches ``SESSION_WRITE_BEHIND_MAX_PENDING`` entries, or
+when the process exits. New sessions and changes to the logged-in user
+(login, logout, password change) are written through immediately, so a
+killed worker can only lose ordinary session data, never a login or logout.
+Queued writes only update sessions that still exist, so a flush never
+brings back a session that was logged out in the meantime.
+
+Queued writes are only visible to other workers through the cache, so the
+engine refuses to run unless the default cache is shared.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+from .auth import require_shared_cache
+
+KEY_PREFIX = 'accounts.sessions'
+
+
+class PendingWrites:
+    """Sessions saved to the cache but not yet to the database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, session_key, session_data, expire_date):
+        with self._lock:
+            self._pending[session_key] = (session_data, expire_date)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def due(self):
+        interval = getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 30)
+        max_pending = getattr(settings, 'SESSION_WRITE_BEHIND_MAX_PENDING', 1000)
+        return len(self._pending) >= max_pending or time.monotonic() - self.last_flush >= interval
+
+    def flush(self):
+        """Update every queued session in one statement; returns the count."""
+        from django.contrib.sessions.models import Session
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        # An update, not an upsert: a session deleted since it was queued
+        # (a logout in another worker, purge_sessions) stays deleted.
+        return Session.objects.bulk_update(
+            [
+                Session(session_key=key, session_data=data, expire_date=expire_date)
+                for key, (data, expire_date) in pending.items()
+            ],
+            ['session_data', 'expire_date'],
+        )
+
+
+pending_writes = PendingWrites()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        pending_writes.flush()
+    except Exception:
+        pass
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        require_shared_cache('The accounts.sessions engine')
+        super().__init__(session_key)
+
+    def load(self):
+        data = super().load()
+        self._persisted_auth = (data.get(SESSION_KEY), data.get(HASH_SESSION_KEY))
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        auth = (data.get(SESSION_KEY), data.get(HASH_SESSION_KEY))
+        if must_create or auth != getattr(self, '_persisted_auth', None):
+            super().save(must_create)
+            pending_writes.discard(self.session_key)
+            self._persisted_auth = auth
+            return
+
+        self._cache.set(self.cache_key, data, self.get_expiry_age())
+        pending_writes.add(self.session_key, self.encode(data), self.get_expiry_date())
+        if pending_writes.due():
+            pending_writes.flush()
+
+    def delete(self, session_key=None):
+        pending_writes.discard(session_key or self.session_key)
+        super().delete(session_key)
@@ -0,0 +1,27 @@
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ticket_system.cache import USERS, bump_namespace
+from .auth import invalidate_users
+from .models import CustomUser
+from .throttling import session_user_key
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """Invalidate cached data that embeds user details."""
+    invalidate_users([instance.pk])
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Recorded on every login; nothing cached shows it.
+        return
+    bump_namespace(USERS)
+
+
+@receiver(user_logged_out)
+def session_ended(sender, request, **kwargs):
+    """Forget the session's user so the throttle stops attributing it."""
+    if request is not None and request.session.session_key:
+        cache.delete(session_user_key(request.session.session_key))
@@ -1,6 +1,23 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .auth import get_cached_user, user_cache_key
+from .middleware import CachedAuthenticationMiddleware
 from .models import CustomUser
+from .sessions import SessionStore, pending_writes
+from .throttling import CacheWindowBackend, TokenBucketBackend, session_user_key
 from companies.models import Company
+from ticket_system.search import prefix_q
 
 
 class CustomUserModelTest(TestCase):
@@ -123,3 +140,320 @@ class CustomUserModelTest(TestCase):
             last_name='User'
         )
         self.assertEqual(user.email, 'Test@example.com')
+
+
+class CachedAuthenticationTest(TestCase):
+    """Tests for the write-behind session store and cached user loading."""
+
+    def setUp(self):
+        """Set up test data."""
+        # The test cache is locmem; pretend it is shared.
+        patcher = mock.patch('accounts.auth.shared_cache', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        pending_writes.flush()
+        self.user = CustomUser.objects.create_user(
+            email='support@example.com',
+            password='test123',
+            first_name='Support',
+            last_name='User',
+            role=CustomUser.SUPPORT
+        )
+        self.client.force_login(self.user)
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def make_request(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore(self.session_key)
+        return request
+
+    def test_warm_request_needs_no_queries(self):
+        """Test that session and user both come from the cache."""
+        self.assertEqual(get_cached_user(self.make_request()), self.user)
+        with self.assertNumQueries(0):
+            user = get_cached_user(self.make_request())
+        self.assertEqual(user.role, CustomUser.SUPPORT)
+
+    def test_user_changes_are_picked_up(self):
+        """Test that role and is_active changes invalidate the cached user."""
+        get_cached_user(self.make_request())
+        self.user.role = CustomUser.SUPERVISOR
+        self.user.save()
+        self.assertEqual(get_cached_user(self.make_request()).role, CustomUser.SUPERVISOR)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(get_cached_user(self.make_request()).is_authenticated)
+
+    def test_inactive_cached_user_rejected(self):
+        """Test that a cached user deactivated elsewhere is not trusted."""
+        get_cached_user(self.make_request())
+        cached = cache.get(user_cache_key(self.user.pk))
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        cached.is_active = False
+        cache.set(user_cache_key(self.user.pk), cached)
+        self.assertFalse(get_cached_user(self.make_request()).is_authenticated)
+
+    def test_refuses_per_process_cache(self):
+        """Test that both features refuse to run without a shared cache."""
+        with mock.patch('accounts.auth.shared_cache', return_value=False):
+            with self.assertRaises(ImproperlyConfigured):
+                CachedAuthenticationMiddleware(lambda request: None)
+            with self.assertRaises(ImproperlyConfigured):
+                SessionStore(self.session_key)
+
+    @override_settings(SESSION_ENGINE='accounts.sessions')
+    def test_login_and_logout_written_through(self):
+        """Test that login and logout reach the database without a flush."""
+        self.client.logout()
+        self.client.login(email='support@example.com', password='test123')
+        key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        stored = Session.objects.get(session_key=key).get_decoded()
+        self.assertEqual(stored['_auth_user_id'], str(self.user.pk))
+
+        self.client.logout()
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(len(pending_writes), 0)
+
+    def test_flush_does_not_restore_deleted_session(self):
+        """Test that a queued write for a logged-out session is dropped."""
+        session = SessionStore(self.session_key)
+        session['theme'] = 'dark'
+        session.save()
+        Session.objects.filter(session_key=self.session_key).delete()
+        pending_writes.flush()
+        self.assertFalse(Session.objects.filter(session_key=self.session_key).exists())
+
+    def test_password_change_logs_out_sessions(self):
+        """Test that a password change invalidates existing sessions."""
+        get_cached_user(self.make_request())
+        self.user.set_password('newpass456')
+        self.user.save()
+        self.assertFalse(get_cached_user(self.make_request()).is_authenticated)
+
+    def test_session_writes_are_deferred(self):
+        """Test that ordinary session changes reach the database on flush."""
+        session = SessionStore(self.session_key)
+        session['theme'] = 'dark'
+        session.save()
+        stored = Session.objects.get(session_key=self.session_key).get_decoded()
+        self.assertNotIn('theme', stored)
+        self.assertEqual(SessionStore(self.session_key)['theme'], 'dark')
+
+        pending_writes.flush()
+        stored = Session.objects.get(session_key=self.session_key).get_decoded()
+        self.assertEqual(stored['theme'], 'dark')
+
+    def test_purge_sessions(self):
+        """Test that expired sessions are deleted in batches."""
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i:04d}', session_data='', expire_date=expired)
+            for i in range(25)
+        ])
+        out = StringIO()
+        call_command('purge_sessions', '--batch-size', '10', '--sleep', '0', stdout=out)
+        self.assertIn('Deleted 25', out.getvalue())
+        self.assertTrue(Session.objects.filter(session_key=self.session_key).exists())
+
+
+class UserAutocompleteTest(TestCase):
+    """Tests for prefix-indexed user autocomplete."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.admin = CustomUser.objects.create_superuser(
+            email='root@example.com', password='admin123', first_name='Root', last_name='Admin'
+        )
+        self.support = CustomUser.objects.create_user(
+            email='jose@example.com', password='test123', first_name='José', last_name='Smith',
+            role=CustomUser.SUPPORT
+        )
+        self.viewer = CustomUser.objects.create_user(
+            email='joe@example.com', password='test123', first_name='Joe', last_name='Smithers',
+            role=CustomUser.ACCOUNT_VIEWER
+        )
+        self.inactive = CustomUser.objects.create_user(
+            email='john@example.com', password='test123', first_name='John', last_name='Smyth',
+            role=CustomUser.SUPERVISOR, is_active=False
+        )
+        self.client.force_login(self.admin)
+
+    def autocomplete(self, term, field_name):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': term, 'app_label': 'ticketing', 'model_name': 'ticket', 'field_name': field_name,
+        })
+        self.assertEqual(response.status_code, 200)
+        return sorted(r['text'] for r in response.json()['results'])
+
+    def test_search_fields_are_normalized(self):
+        """Test that the search columns are lower-cased and accent-free."""
+        self.assertEqual(self.support.search_first_name, 'jose')
+        CustomUser.objects.filter(pk=self.viewer.pk).update(last_name='ÖSTER')
+        self.viewer.refresh_from_db()
+        self.assertEqual(self.viewer.search_last_name, 'oster')
+
+    def test_prefix_matches_any_name_part(self):
+        """Test that every term must prefix-match a name or email."""
+        self.assertEqual(len(self.autocomplete('jo', 'created_by')), 3)
+        self.assertEqual(self.autocomplete('Jo smithe', 'created_by'), [str(self.viewer)])
+        self.assertEqual(self.autocomplete('mith', 'created_by'), [])
+
+    def test_short_terms_are_ignored(self):
+        """Test that one-letter words do not match on their own."""
+        self.assertEqual(self.autocomplete('j', 'created_by'), [])
+        self.assertEqual(self.autocomplete('joe s', 'created_by'), [str(self.viewer)])
+
+    def test_assignee_suggestions_are_active_support_staff(self):
+        """Test that assigned_to only offers active Support/Supervisor users."""
+        self.assertEqual(self.autocomplete('jo', 'assigned_to'), [str(self.support)])
+
+    def test_results_are_cached_and_invalidated(self):
+        """Test that a prefix is resolved once until users change."""
+        self.autocomplete('jo', 'assigned_to')
+        self.viewer.role = CustomUser.SUPPORT
+        self.viewer.save()
+        self.assertEqual(len(self.autocomplete('jo', 'assigned_to')), 2)
+
+    def test_prefix_lookup_uses_index(self):
+        """Test that the prefix condition is answered from an index."""
+        queryset = CustomUser.objects.filter(prefix_q('search_last_name', 'smi')).values('pk')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING', plan)
+        self.assertIn('search_last_name', plan)
+
+
+class UserReadAPITest(TestCase):
+    """Tests for the sparse-field user read API."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Acme')
+        other = Company.objects.create(name='Globex')
+        self.viewer = CustomUser.objects.create_user(
+            email='viewer@acme.com', password='test123', first_name='View', last_name='Er', company=self.company
+        )
+        CustomUser.objects.create_user(
+            email='colleague@acme.com', password='test123', first_name='Col', last_name='League', company=self.company
+        )
+        CustomUser.objects.create_user(
+            email='outsider@globex.com', password='test123', first_name='Out', last_name='Sider', company=other
+        )
+        self.client.force_login(self.viewer)
+
+    def test_list_scoped_and_sparse(self):
+        """Test that users only see their company and get the requested fields."""
+        response = self.client.get(reverse('accounts:api_user_list'), {'fields': 'email,company.name'})
+        self.assertEqual(response.json()['results'], [
+            {'email': 'viewer@acme.com', 'company': {'name': 'Acme'}},
+            {'email': 'colleague@acme.com', 'company': {'name': 'Acme'}},
+        ])
+
+    def test_invalid_company_filter_rejected(self):
+        """Test that a non-numeric company filter is a 400, not a server error."""
+        response = self.client.get(reverse('accounts:api_user_list'), {'company': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_detail_hides_password(self):
+        """Test that password is not a readable field."""
+        url = reverse('accounts:api_user_detail', args=[self.viewer.pk])
+        self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+        self.assertNotIn('password', self.client.get(url).json())
+
+
+@override_settings(
+    API_THROTTLE_RATES={'account_viewer': '2/min'},
+    API_THROTTLE_COMPANY_RATE='3/min',
+)
+class ApiThrottleTest(TestCase):
+    """Tests for the API rate limiting middleware."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.company = Company.objects.create(name='Acme')
+        self.users = [
+            CustomUser.objects.create_user(
+                email=f'user{i}@acme.com', password='test123', first_name='U', last_name=str(i),
+                company=self.company
+            )
+            for i in range(2)
+        ]
+        self.url = reverse('companies:api_company_detail', args=[self.company.pk])
+
+    def test_user_limit_returns_429_without_queries(self):
+        """Test that a user over their role's rate gets 429 with Retry-After before any query."""
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+    def test_role_change_applies_to_throttle(self):
+        """Test that the cached throttle identity follows role changes and logout."""
+        self.client.force_login(self.users[0])
+        self.client.get(self.url)
+        self.client.get(self.url)
+        CustomUser.objects.filter(pk=self.users[0].pk).update(role=CustomUser.SUPPORT)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        session_key = self.client.session.session_key
+        self.client.logout()
+        self.assertIsNone(cache.get(session_user_key(session_key)))
+
+    def test_company_limit_shared(self):
+        """Test that users of one company share the company bucket."""
+        self.client.force_login(self.users[0])
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.force_login(self.users[1])
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 429)
+
+    def test_non_api_paths_unthrottled(self):
+        """Test that paths outside /api/ are not throttled."""
+        self.client.force_login(self.users[0])
+        for _ in range(4):
+            self.assertNotEqual(self.client.get('/admin/login/').status_code, 429)
+
+    def test_token_bucket_refills(self):
+        """Test that the in-memory bucket refills at the configured rate."""
+        bucket = TokenBucketBackend()
+        self.assertEqual(bucket.allow('k', 2, 60, now=0), (True, 0))
+        self.assertEqual(bucket.allow('k', 2, 60, now=0), (True, 0))
+        allowed, retry_after = bucket.allow('k', 2, 60, now=0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 30)
+        self.assertTrue(bucket.allow('k', 2, 60, now=30)[0])
+
+    def test_token_bucket_evicts_least_recently_used(self):
+        """Test that the bucket used longest ago is dropped past max_keys."""
+        bucket = TokenBucketBackend(max_keys=2)
+        bucket.allow('a', 1, 60, now=0)
+        bucket.allow('b', 1, 60, now=1)
+        bucket.allow('a', 1, 60, now=2)
+        bucket.allow('c', 1, 60, now=3)
+        self.assertEqual(list(bucket._buckets), ['a', 'c'])
+
+    def test_rejected_request_takes_no_tokens(self):
+        """Test that a request one bucket rejects is not counted in the others."""
+        for backend in (TokenBucketBackend(), CacheWindowBackend()):
+            self.assertTrue(backend.allow_all([('user', 2, 60), ('company', 1, 60)], now=120)[0])
+            self.assertFalse(backend.allow_all([('user', 2, 60), ('company', 1, 60)], now=120)[0])
+            self.assertTrue(backend.allow('user', 2, 60, now=120)[0])
+
+    def test_cache_window_backend(self):
+        """Test the shared-cache fixed-window backend."""
+        backend = CacheWindowBackend()
+        self.assertTrue(backend.allow('k', 1, 60, now=120)[0])
+        allowed, retry_after = backend.allow('k', 1, 60, now=150)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 30)
+        self.assertTrue(backend.allow('k', 1, 60, now=180)[0])
@@ -0,0 +1,187 @@
+"""
+Rate limiting for API requests.
+
+Every request under ``API_THROTTLE_PATHS`` draws from a bucket for its user,
+with a rate set by the user's role in ``API_THROTTLE_RATES``, and from a
+bucket shared by everyone in the user's company (``API_THROTTLE_COMPANY_RATE``).
+Anonymous requests draw from a per-address bucket. Rates are written like
+``'600/min'``; ``None`` (or a role missing from the setting) means unlimited.
+A request only counts against its buckets if all of them let it through, so
+a request the company bucket rejects does not use up the user's token.
+
+The middleware runs before the view, and a rejected request should cost no
+database work. The user is therefore looked up from the session cookie in
+the cache first: the cookie maps to the user id, and the user comes from
+the cached-user entry of accounts.auth, which is dropped whenever the user
+is saved. Only on a miss is ``request.user`` loaded, and the result cached.
+
+Two backends are available:
+
+- ``memory`` (default): token buckets in this process, kept in
+  least-recently-used order. Past ``max_keys`` buckets the one idle longest
+  is dropped, in constant time.
+- ``cache``: fixed-window counters in the default cache, shared by all
+  workers when the cache is (Redis, memcached).
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .auth import user_cache_key
+
+_PERIODS = {
+    's': 1, 'sec': 1, 'second': 1,
+    'm': 60, 'min': 60, 'minute': 60,
+    'h': 3600, 'hour': 3600,
+    'd': 86400, 'day': 86400,
+}
+
+def session_user_key(session_key):
+    return f'throttle:session:{session_key}'
+
+
+def request_user(request):
+    """
+    The authenticated user making ``request``, or ``None``. Answered from the
+    cache without a query once the session has been seen.
+    """
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        user_id = cache.get(session_user_key(session_key))
+        if user_id is not None:
+            user = cache.get(user_cache_key(user_id))
+            if user is not None and user.is_active:
+                return user
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if session_key:
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+        cache.set(session_user_key(session_key), user.pk, timeout)
+        cache.add(user_cache_key(user.pk), user, timeout)
+    return user
+
+
+def parse_rate(rate):
+    """Parse ``'N/period'`` into ``(N, seconds)``, or ``None`` for no limit."""
+    if rate is None:
+        return None
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), _PERIODS[period.strip().lower()]
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid throttle rate: {rate!r}')
+
+
+class TokenBucketBackend:
+    """Per-key token buckets held in process memory."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, limit, period, now=None):
+        """Take a token for ``key``; returns ``(allowed, retry_after_seconds)``."""
+        return self.allow_all([(key, limit, period)], now)
+
+    def allow_all(self, buckets, now=None):
+        """Take a token from every ``(key, limit, period)`` bucket, or from none."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = []
+            retry_after = 0
+            for key, limit, period in buckets:
+                rate = limit / period
+                tokens, last = self._buckets.get(key, (limit, now))
+                tokens = min(limit, tokens + (now - last) * rate)
+                levels.append((key, tokens))
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+            allowed = not retry_after
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class CacheWindowBackend:
+    """Fixed-window request counters in the shared cache."""
+
+    def allow(self, key, limit, period, now=None):
+        """Count a request for ``key``; returns ``(allowed, retry_after_seconds)``."""
+        return self.allow_all([(key, limit, period)], now)
+
+    def allow_all(self, buckets, now=None):
+        """Count the request in every ``(key, limit, period)`` window, or in none."""
+        now = time.time() if now is None else now
+        counted = []
+        retry_after = 0
+        for key, limit, period in buckets:
+            window = int(now // period)
+            cache_key = f'throttle:{key}:{period}:{window}'
+            cache.add(cache_key, 0, timeout=period + 1)
+            try:
+                count = cache.incr(cache_key)
+            except ValueError:
+                # Evicted between add() and incr(); count this request alone.
+                cache.set(cache_key, 1, timeout=period + 1)
+                count = 1
+            counted.append(cache_key)
+            if count > limit:
+                retry_after = (window + 1) * period - now
+                break
+        if not retry_after:
+            return True, 0
+        # Rejected: take the request back out of every window it was counted in.
+        for cache_key in counted:
+            try:
+                cache.decr(cache_key)
+            except ValueError:
+                pass
+        return False, retry_after
+
+
+BACKENDS = {
+    'memory': TokenBucketBackend,
+    'cache': CacheWindowBackend,
+}
+
+
+class Throttle:
+    """The configured limits and backend."""
+
+    def __init__(self):
+        rates = getattr(settings, 'API_THROTTLE_RATES', {})
+        self.role_rates = {role: parse_rate(rate) for role, rate in rates.items()}
+        self.company_rate = parse_rate(getattr(settings, 'API_THROTTLE_COMPANY_RATE', '1200/min'))
+        self.anon_rate = parse_rate(getattr(settings, 'API_THROTTLE_ANON_RATE', '60/min'))
+        self.backend = BACKENDS[getattr(settings, 'API_THROTTLE_BACKEND', 'memory')]()
+
+    def limits_for(self, request):
+        """Yield ``(key, (limit, period))`` for every bucket this request draws from."""
+        user = request_user(request)
+        if user is None:
+            if self.anon_rate:
+                yield f'anon:{request.META.get("REMOTE_ADDR", "")}', self.anon_rate
+            return
+        role = 'superadmin' if user.is_superuser else user.role
+        rate = self.role_rates.get(role)
+        if rate:
+            yield f'user:{user.pk}', rate
+        if user.company_id and self.company_rate and rate:
+            yield f'company:{user.company_id}', self.company_rate
+
+    def check(self, request):
+        """Return ``None`` if the request may proceed, else seconds to wait."""
+        buckets = [(key, limit, period) for key, (limit, period) in self.limits_for(request)]
+        if not buckets:
+            return None
+        allowed, retry_after = self.backend.allow_all(buckets)
+        return None if allowed else max(1, math.ceil(retry_after))
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'accounts'
+
+urlpatterns = [
+    path('api/users/', views.user_list, name='api_user_list'),
+    path('api/users/<int:user_id>/', views.user_detail, name='api_user_detail'),
+]
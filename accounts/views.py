@@ -1,3 +1,63 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from .fieldsets import USER_FIELDS
+from .models import CustomUser
+
+USER_PAGE_SIZE = 50
+USER_MAX_PAGE_SIZE = 200
+
+
+def _visible_users(user):
+    """Support and above see every user; others see their company's users."""
+    if user.can_view_all_tickets():
+        return CustomUser.objects.all()
+    if user.company_id is None:
+        return CustomUser.objects.filter(pk=user.pk)
+    return CustomUser.objects.filter(company_id=user.company_id)
+
+
+@login_required
+@require_GET
+def user_detail(request, user_id):
+    """Return one user with the fields chosen in ``?fields=``."""
+    try:
+        selection = USER_FIELDS.parse(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    user = USER_FIELDS.apply(_visible_users(request.user).filter(pk=user_id), selection).first()
+    if user is None:
+        raise Http404
+    return JsonResponse(USER_FIELDS.serialize(user, selection))
+
+
+@login_required
+@require_GET
+def user_list(request):
+    """
+    Return the users the current user can see, by id, with the fields
+    chosen in ``?fields=``. Filter with ``company`` and ``role``; page with
+    ``cursor`` (the last id seen) and ``limit``.
+    """
+    users = _visible_users(request.user)
+    try:
+        if request.GET.get('company'):
+            users = users.filter(company_id=int(request.GET['company']))
+        if request.GET.get('role'):
+            users = users.filter(role=request.GET['role'])
+        selection = USER_FIELDS.parse(request.GET.get('fields'))
+        limit = max(min(int(request.GET.get('limit', USER_PAGE_SIZE)), USER_MAX_PAGE_SIZE), 1)
+        users = users.filter(pk__gt=int(request.GET.get('cursor') or 0)).order_by('pk')
+        page = list(USER_FIELDS.apply(users, selection)[:limit + 1])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = str(page[-1].pk)
+    return JsonResponse({
+        'results': [USER_FIELDS.serialize(user, selection) for user in page],
+        'next_cursor': next_cursor,
+    })
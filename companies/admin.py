@@ -1,9 +1,12 @@
-from django.contrib import admin
-from .models import Company
+from django.contrib import admin, messages
+from ticket_system.cache import COMPANIES
+from ticket_system.search import PrefixAutocompleteMixin
+from .deletion import schedule_deletion
+from .models import Company, CompanyDeletion
 
 
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(PrefixAutocompleteMixin, admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'email', 'phone']
@@ -20,3 +23,64 @@ class CompanyAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+    autocomplete_prefix_fields = ['search_name']
+    autocomplete_cache_namespace = COMPANIES
+
+    def get_autocomplete_scope(self, request, queryset):
+        return queryset.filter(is_active=True), 'active'
+
+    def get_deleted_objects(self, objs, request):
+        """
+        Summarise what a deletion removes with two COUNT queries per company
+        instead of collecting every related ticket and user.
+        """
+        from accounts.models import CustomUser
+        from ticketing.models import Ticket
+
+        to_delete, tickets = [], 0
+        for company in objs:
+            ticket_count = Ticket.objects.filter(company=company).count()
+            user_count = CustomUser.objects.filter(company=company).count()
+            tickets += ticket_count
+            to_delete.append(f'Company: {company}')
+            to_delete.append([
+                f'{ticket_count} ticket(s), with their comments and attachments',
+                f'{user_count} user(s) will be detached from the company, not deleted',
+            ])
+        model_count = {Company._meta.verbose_name_plural: len(objs), Ticket._meta.verbose_name_plural: tickets}
+        perms_needed = set()
+        if tickets and not request.user.has_perm('ticketing.delete_ticket'):
+            perms_needed.add(Ticket._meta.verbose_name)
+        return to_delete, model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj, requested_by=request.user)
+        self.message_user(
+            request,
+            f'{obj} has been deactivated; its tickets and users are being removed in the background.',
+            messages.INFO,
+        )
+
+    def delete_queryset(self, request, queryset):
+        for company in queryset:
+            schedule_deletion(company, requested_by=request.user)
+
+
+@admin.register(CompanyDeletion)
+class CompanyDeletionAdmin(admin.ModelAdmin):
+    list_display = ['company_name', 'status', 'progress_display', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status']
+    list_select_related = ['requested_by']
+    readonly_fields = [
+        'company_id', 'company_name', 'requested_by', 'status', 'tickets_total', 'tickets_deleted',
+        'users_total', 'users_detached', 'error', 'created_at', 'updated_at', 'finished_at',
+    ]
+
+    def has_add_permission(self, request):
+        # Jobs are created by deleting a company.
+        return False
+
+    def progress_display(self, obj):
+        return f'{obj.progress:.0%}'
+    progress_display.short_description = 'Progress'
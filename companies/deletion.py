@@ -0,0 +1,173 @@
+"""
+Batched, non-blocking deletion of companies.
+
+Deleting a company through the ORM collects every ticket, comment,
+attachment and user that refers to it and removes them in a single
+transaction, holding the write lock for as long as that takes. Instead,
+``schedule_deletion()`` marks the company inactive and records a
+CompanyDeletion job; the job then:
+
+1. deletes the company's tickets ``COMPANY_DELETION_BATCH_SIZE`` at a time
+   (each batch takes its comments, attachments and index rows with it)
+2. detaches its users (``company = NULL``, as ``on_delete=SET_NULL`` would)
+3. deletes its SLA rollups and finally the company row
+
+Every batch is its own short transaction followed by a pause of
+``COMPANY_DELETION_SLEEP`` seconds, and the job's counters and
+``updated_at`` heartbeat are updated after each one. Jobs start in a
+background thread of the process that scheduled them. A worker recycle or
+deploy kills that thread, so ``python manage.py resume_company_deletions
+--watch 60`` runs next to the web workers and picks up pending jobs and
+running jobs whose heartbeat is older than ``COMPANY_DELETION_STALE``
+seconds. A job is claimed with a single conditional update, so two runners
+never work on the same one. Every step is idempotent, so resuming simply
+continues with whatever is left.
+
+While the job runs, the company is inactive and takes no new tickets.
+"""
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Company, CompanyDeletion
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_deletion(company, requested_by=None):
+    """Deactivate ``company`` and start deleting it; returns the job."""
+    from accounts.models import CustomUser
+    from ticketing.models import Ticket
+
+    with transaction.atomic():
+        job = CompanyDeletion.objects.filter(
+            company_id=company.pk, status__in=[CompanyDeletion.STATUS_PENDING, CompanyDeletion.STATUS_RUNNING]
+        ).first()
+        if job is not None:
+            return job
+        Company.objects.filter(pk=company.pk).update(is_active=False)
+        job = CompanyDeletion.objects.create(
+            company_id=company.pk,
+            company_name=company.name,
+            requested_by=requested_by,
+            tickets_total=Ticket.objects.filter(company_id=company.pk).count(),
+            users_total=CustomUser.objects.filter(company_id=company.pk).count(),
+        )
+        transaction.on_commit(lambda: start(job.pk))
+    return job
+
+
+def start(job_id):
+    """Run the job in a background thread, or inline if that is turned off."""
+    if not getattr(settings, 'COMPANY_DELETION_BACKGROUND', True):
+        run_deletion(job_id)
+        return
+    thread = threading.Thread(
+        target=_run_in_thread, args=(job_id,), name=f'company-deletion-{job_id}', daemon=True
+    )
+    thread.start()
+
+
+def _run_in_thread(job_id):
+    try:
+        run_deletion(job_id)
+    finally:
+        # The thread has its own connection; don't leave it open.
+        connection.close()
+
+
+def claimable(stale=None, retry_failed=False):
+    """
+    Jobs a runner may take: pending ones, running ones whose heartbeat is
+    older than ``stale`` seconds and, with ``retry_failed``, failed ones.
+    """
+    stale = getattr(settings, 'COMPANY_DELETION_STALE', 300) if stale is None else stale
+    cutoff = timezone.now() - datetime.timedelta(seconds=stale)
+    condition = (
+        Q(status=CompanyDeletion.STATUS_PENDING)
+        | Q(status=CompanyDeletion.STATUS_RUNNING, updated_at__lt=cutoff)
+    )
+    if retry_failed:
+        condition |= Q(status=CompanyDeletion.STATUS_FAILED)
+    return CompanyDeletion.objects.filter(condition)
+
+
+def claim(job_id, stale=None, retry_failed=False):
+    """Mark the job running if it is claimable; returns whether this caller got it."""
+    return bool(
+        claimable(stale, retry_failed).filter(pk=job_id)
+        .update(status=CompanyDeletion.STATUS_RUNNING, error='', updated_at=timezone.now())
+    )
+
+
+def run_deletion(job_id, batch_size=None, sleep=None, stale=None, retry_failed=False):
+    """
+    Carry out (or resume) a deletion job. Returns the job. A job that is
+    done, or running with a recent heartbeat, is left alone.
+    """
+    batch_size = batch_size or getattr(settings, 'COMPANY_DELETION_BATCH_SIZE', 500)
+    sleep = getattr(settings, 'COMPANY_DELETION_SLEEP', 0.05) if sleep is None else sleep
+
+    if not claim(job_id, stale, retry_failed):
+        return CompanyDeletion.objects.get(pk=job_id)
+    job = CompanyDeletion.objects.get(pk=job_id)
+    try:
+        _delete_tickets(job, batch_size, sleep)
+        _detach_users(job, batch_size, sleep)
+        _delete_company(job, batch_size, sleep)
+    except Exception as e:
+        logger.exception('Deletion of company %s failed', job.company_id)
+        _set(job_id, status=CompanyDeletion.STATUS_FAILED, error=str(e))
+    else:
+        _set(job_id, status=CompanyDeletion.STATUS_DONE, finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def _set(job_id, **values):
+    # Queryset updates skip auto_now; the heartbeat is set explicitly.
+    CompanyDeletion.objects.filter(pk=job_id).update(updated_at=timezone.now(), **values)
+
+
+def _batches(queryset, batch_size, sleep):
+    """Yield lists of at most ``batch_size`` ids until ``queryset`` is empty."""
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        if sleep:
+            time.sleep(sleep)
+
+
+def _delete_tickets(job, batch_size, sleep):
+    from ticketing.models import Ticket
+
+    for ids in _batches(Ticket.objects.filter(company_id=job.company_id), batch_size, sleep):
+        with transaction.atomic():
+            Ticket.objects.filter(pk__in=ids).delete()
+            _set(job.pk, tickets_deleted=F('tickets_deleted') + len(ids))
+
+
+def _detach_users(job, batch_size, sleep):
+    from accounts.models import CustomUser
+
+    for ids in _batches(CustomUser.objects.filter(company_id=job.company_id), batch_size, sleep):
+        with transaction.atomic():
+            CustomUser.objects.filter(pk__in=ids).update(company=None)
+            _set(job.pk, users_detached=F('users_detached') + len(ids))
+
+
+def _delete_company(job, batch_size, sleep):
+    from ticketing.models import ResolutionRollup
+
+    for ids in _batches(ResolutionRollup.objects.filter(company_id=job.company_id), batch_size, sleep):
+        ResolutionRollup.objects.filter(pk__in=ids).delete()
+    # Nothing refers to the company any more, so this is a single-row delete.
+    Company.objects.filter(pk=job.company_id).delete()
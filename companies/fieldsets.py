@@ -0,0 +1,7 @@
+from ticket_system.fieldsets import FieldSet
+from .models import Company
+
+COMPANY_FIELDS = FieldSet(
+    Company,
+    fields=['id', 'name', 'address', 'phone', 'email', 'website', 'is_active', 'created_at', 'updated_at'],
+)
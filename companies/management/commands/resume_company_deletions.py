@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from companies.deletion import claimable, run_deletion
+from companies.models import CompanyDeletion
+
+
+class Command(BaseCommand):
+    help = 'Resumes company deletions that were interrupted (e.g. by a restart) or failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', type=int,
+                            help='Seconds without progress before a running job counts as interrupted '
+                                 '(default: COMPANY_DELETION_STALE)')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry failed jobs')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, help='Seconds to pause between batches')
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='Keep running and look for jobs every SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            self.resume(options)
+            if not options['watch']:
+                return
+            # Don't hold a connection open between polls.
+            connection.close()
+            time.sleep(options['watch'])
+
+    def resume(self, options):
+        jobs = claimable(options['stale'], options['retry_failed']).order_by('created_at')
+        for job_id in list(jobs.values_list('pk', flat=True)):
+            job = run_deletion(
+                job_id, batch_size=options['batch_size'], sleep=options['sleep'],
+                stale=options['stale'], retry_failed=options['retry_failed'],
+            )
+            message = (
+                f'{job.company_name}: {job.get_status_display()} '
+                f'({job.tickets_deleted}/{job.tickets_total} tickets, {job.users_detached}/{job.users_total} users)'
+            )
+            if job.status == CompanyDeletion.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(message))
+            elif job.status == CompanyDeletion.STATUS_RUNNING:
+                self.stdout.write(f'{message}: taken by another runner')
+            else:
+                self.stdout.write(self.style.ERROR(f'{message}: {job.error}'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:34
+
+from django.db import migrations, models
+
+from ticket_system.search import normalize
+
+
+SEARCH_FIELDS = [('name', 'search_name')]
+
+
+def populate_search_fields(apps, schema_editor):
+    Company = apps.get_model('companies', 'Company')
+    batch = []
+    for obj in Company.objects.only('pk', *(source for source, _ in SEARCH_FIELDS)).iterator(chunk_size=2000):
+        for source, target in SEARCH_FIELDS:
+            setattr(obj, target, normalize(getattr(obj, source)))
+        batch.append(obj)
+        if len(batch) >= 2000:
+            Company.objects.bulk_update(batch, [target for _, target in SEARCH_FIELDS])
+            batch = []
+    Company.objects.bulk_update(batch, [target for _, target in SEARCH_FIELDS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_search_fields, migrations.RunPython.noop),
+    ]
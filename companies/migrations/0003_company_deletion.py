@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('companies', '0002_search_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company_id', models.PositiveIntegerField(db_index=True)),
+                ('company_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('tickets_total', models.PositiveIntegerField(default=0)),
+                ('tickets_deleted', models.PositiveIntegerField(default=0)),
+                ('users_total', models.PositiveIntegerField(default=0)),
+                ('users_detached', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Company Deletion',
+                'verbose_name_plural': 'Company Deletions',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_company_deletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='companydeletion',
+            name='company_id',
+            field=models.BigIntegerField(db_index=True),
+        ),
+    ]
@@ -1,4 +1,23 @@
 from django.db import models
+from django.utils import timezone
+
+from ticket_system.cache import COMPANIES, bump_company_version, bump_namespace
+from ticket_system.search import normalize
+
+
+class CompanyQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if isinstance(kwargs.get('name'), str):
+            kwargs['search_name'] = normalize(kwargs['name'])
+        # auto_now is only applied by save(); keep ETags and Last-Modified honest.
+        kwargs.setdefault('updated_at', timezone.now())
+        # Bulk updates bypass post_save, so invalidate cached lookups here.
+        company_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        for company_id in company_ids:
+            bump_company_version(company_id)
+        bump_namespace(COMPANIES)
+        return rows
 
 
 class Company(models.Model):
@@ -13,6 +32,10 @@ class Company(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Normalized copy of name for indexed prefix search (admin autocomplete)
+    search_name = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+
+    objects = CompanyQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Companies"
@@ -20,3 +43,67 @@ class Company(models.Model):
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        self.search_name = normalize(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super().save(*args, **kwargs)
+
+
+class CompanyDeletion(models.Model):
+    """
+    A company being deleted in the background (see companies.deletion).
+
+    The company is deactivated as soon as the job is created; its tickets
+    are then deleted and its users detached in small batches, and the
+    company row itself goes last. The job row remains as a record.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Not a foreign key: the company is gone when the job finishes.
+    company_id = models.BigIntegerField(db_index=True)
+    company_name = models.CharField(max_length=255)
+    requested_by = models.ForeignKey(
+        'accounts.CustomUser',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    tickets_total = models.PositiveIntegerField(default=0)
+    tickets_deleted = models.PositiveIntegerField(default=0)
+    users_total = models.PositiveIntegerField(default=0)
+    users_detached = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Touched after every batch, so a stalled job can be told from a running one
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Company Deletion'
+        verbose_name_plural = 'Company Deletions'
+
+    def __str__(self):
+        return f"Deletion of {self.company_name} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Share of the tickets and users handled so far, from 0 to 1."""
+        total = self.tickets_total + self.users_total
+        if not total:
+            return 1.0 if self.status == self.STATUS_DONE else 0.0
+        return (self.tickets_deleted + self.users_detached) / total
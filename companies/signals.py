@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ticket_system.cache import COMPANIES, bump_company_version, bump_namespace
+from .models import Company
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def company_changed(sender, instance, **kwargs):
+    """Invalidate cached lookups and ticket lists for the company."""
+    bump_company_version(instance.pk)
+    bump_namespace(COMPANIES)
@@ -1,5 +1,17 @@
-from django.test import TestCase
-from .models import Company
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import CustomUser
+from ticketing.models import Ticket, TicketComment
+from .admin import CompanyAdmin
+from .deletion import run_deletion, schedule_deletion
+from .models import Company, CompanyDeletion
 
 
 class CompanyModelTest(TestCase):
@@ -37,3 +49,185 @@ class CompanyModelTest(TestCase):
         self.assertEqual(company.email, '')
         self.assertEqual(company.website, '')
         self.assertTrue(company.is_active)
+
+
+class CompanyAutocompleteTest(TestCase):
+    """Tests for prefix-indexed company autocomplete."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        Company.objects.create(name='Tech Corp')
+        Company.objects.create(name='Technica AG')
+        Company.objects.create(name='Techno Closed', is_active=False)
+        admin_user = CustomUser.objects.create_superuser(
+            email='admin@example.com', password='admin123', first_name='Admin', last_name='User'
+        )
+        self.client.force_login(admin_user)
+
+    def test_autocomplete_returns_active_prefix_matches(self):
+        """Test that only active companies matching the prefix are offered."""
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'TECH', 'app_label': 'ticketing', 'model_name': 'ticket', 'field_name': 'company',
+        })
+        names = sorted(r['text'] for r in response.json()['results'])
+        self.assertEqual(names, ['Tech Corp', 'Technica AG'])
+
+    def test_autocomplete_pages_past_the_cache_cap(self):
+        """Test that cached pages follow the search column order and paging goes past the cap."""
+        Company.objects.bulk_create([Company(name=f'Tech {i:02d}', search_name=f'tech {i:02d}') for i in range(30)])
+        expected = list(Company.objects.filter(is_active=True, search_name__startswith='tech')
+                        .order_by('search_name', 'pk').values_list('name', flat=True))
+        names = []
+        with mock.patch.object(CompanyAdmin, 'autocomplete_limit', 20):
+            for page in (1, 2):
+                response = self.client.get(reverse('admin:autocomplete'), {
+                    'term': 'tech', 'app_label': 'ticketing', 'model_name': 'ticket', 'field_name': 'company',
+                    'page': page,
+                }).json()
+                names += [r['text'] for r in response['results']]
+                self.assertEqual(response['pagination']['more'], page == 1)
+        self.assertEqual(names, expected)
+
+    def test_search_name_follows_renames(self):
+        """Test that search_name is kept in sync with name."""
+        company = Company.objects.get(name='Tech Corp')
+        company.name = 'Ünited Tech'
+        company.save(update_fields=['name'])
+        company.refresh_from_db()
+        self.assertEqual(company.search_name, 'united tech')
+
+
+class CompanyDetailAPITest(TestCase):
+    """Tests for the conditional company read endpoint."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Acme')
+        self.other = Company.objects.create(name='Globex')
+        self.user = CustomUser.objects.create_user(
+            email='acme@example.com',
+            password='test123',
+            first_name='Acme',
+            last_name='User',
+            company=self.company
+        )
+        self.client.force_login(self.user)
+
+    def test_conditional_get(self):
+        """Test that an unchanged company returns 304 and an edited one 200."""
+        url = reverse('companies:api_company_detail', args=[self.company.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['name'], 'Acme')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Company.objects.filter(pk=self.company.pk).update(phone='555')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['phone'], '555')
+
+    def test_other_company_forbidden(self):
+        """Test that users cannot read other companies."""
+        url = reverse('companies:api_company_detail', args=[self.other.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(COMPANY_DELETION_BACKGROUND=False, COMPANY_DELETION_BATCH_SIZE=2, COMPANY_DELETION_SLEEP=0)
+class CompanyDeletionTest(TestCase):
+    """Tests for batched company deletion."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Initech')
+        self.other = Company.objects.create(name='Umbrella')
+        self.admin = CustomUser.objects.create_superuser(
+            email='deleter@example.com',
+            password='test123',
+            first_name='Del',
+            last_name='Eter',
+        )
+        self.users = [
+            CustomUser.objects.create_user(
+                email=f'initech{i}@example.com', password='test123', first_name='I', last_name=str(i),
+                company=self.company,
+            )
+            for i in range(3)
+        ]
+        self.tickets = [
+            Ticket.objects.create(title=f'T{i}', description='d', company=self.company) for i in range(5)
+        ]
+        TicketComment.objects.create(ticket=self.tickets[0], author=self.users[0], body='Hello')
+        self.kept = Ticket.objects.create(
+            title='Kept', description='d', company=self.other, duplicate_of=self.tickets[1]
+        )
+
+    def test_deletion_in_batches(self):
+        """Test that a company's tickets and users are removed in batches with progress recorded."""
+        with self.captureOnCommitCallbacks(execute=True):
+            job = schedule_deletion(self.company, requested_by=self.admin)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CompanyDeletion.STATUS_DONE)
+        self.assertEqual((job.tickets_deleted, job.tickets_total), (5, 5))
+        self.assertEqual((job.users_detached, job.users_total), (3, 3))
+        self.assertEqual(job.progress, 1.0)
+        self.assertFalse(Company.objects.filter(pk=self.company.pk).exists())
+        self.assertFalse(TicketComment.objects.exists())
+        self.assertEqual(CustomUser.objects.filter(pk__in=[u.pk for u in self.users], company=None).count(), 3)
+        self.kept.refresh_from_db()
+        self.assertIsNone(self.kept.duplicate_of)
+
+    def test_deactivated_before_background_work(self):
+        """Test that scheduling deactivates the company before anything is deleted."""
+        job = schedule_deletion(self.company)
+        self.company.refresh_from_db()
+        self.assertFalse(self.company.is_active)
+        self.assertEqual(job.status, CompanyDeletion.STATUS_PENDING)
+        self.assertEqual(Ticket.objects.filter(company=self.company).count(), 5)
+        self.assertEqual(schedule_deletion(self.company), job)
+
+    def test_resume_command(self):
+        """Test that an interrupted job is finished by resume_company_deletions."""
+        job = schedule_deletion(self.company)
+        CompanyDeletion.objects.filter(pk=job.pk).update(status=CompanyDeletion.STATUS_RUNNING)
+        out = StringIO()
+        call_command('resume_company_deletions', '--stale', '0', stdout=out)
+        self.assertIn('Done', out.getvalue())
+        self.assertFalse(Company.objects.filter(pk=self.company.pk).exists())
+
+    def test_recent_running_job_left_alone(self):
+        """Test that a job with a fresh heartbeat is not taken by a second runner."""
+        job = schedule_deletion(self.company)
+        CompanyDeletion.objects.filter(pk=job.pk).update(
+            status=CompanyDeletion.STATUS_RUNNING, updated_at=timezone.now()
+        )
+        call_command('resume_company_deletions', stdout=StringIO())
+        self.assertEqual(Ticket.objects.filter(company=self.company).count(), 5)
+        self.assertEqual(run_deletion(job.pk).status, CompanyDeletion.STATUS_RUNNING)
+
+    def test_inactive_company_takes_no_tickets(self):
+        """Test that tickets cannot be created for a company being deleted."""
+        schedule_deletion(self.company)
+        ticket = Ticket(title='Late', description='d', company=self.company)
+        with self.assertRaises(ValidationError):
+            ticket.full_clean()
+        # Existing tickets stay editable.
+        Ticket.objects.get(pk=self.tickets[0].pk).clean()
+
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('ticketing:api_ticket_batch'), {
+            'operations': [{'op': 'create', 'data': {'title': 'Late', 'description': 'd', 'company': self.company.pk}}],
+        }, content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['errors'], {'company': ['No such company.']})
+
+    def test_admin_delete_uses_pipeline(self):
+        """Test that the admin delete confirmation summarises counts and deletes via a job."""
+        self.client.force_login(self.admin)
+        url = reverse('admin:companies_company_delete', args=[self.company.pk])
+        response = self.client.get(url)
+        self.assertContains(response, '5 ticket(s)')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CompanyDeletion.objects.get().status, CompanyDeletion.STATUS_DONE)
+        self.assertFalse(Ticket.objects.filter(pk__in=[t.pk for t in self.tickets]).exists())
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'companies'
+
+urlpatterns = [
+    path('api/companies/', views.company_list, name='api_company_list'),
+    path('api/companies/<int:company_id>/', views.company_detail, name='api_company_detail'),
+]
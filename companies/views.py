@@ -1,3 +1,88 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from ticket_system.http import make_etag, not_modified, set_validators
+from .fieldsets import COMPANY_FIELDS
+from .models import Company
+
+COMPANY_PAGE_SIZE = 50
+COMPANY_MAX_PAGE_SIZE = 200
+
+
+def _visible_companies(user):
+    if user.can_view_all_tickets():
+        return Company.objects.all()
+    return Company.objects.filter(pk=user.company_id)
+
+
+@login_required
+@require_GET
+def company_detail(request, company_id):
+    """
+    Return one company with the fields chosen in ``?fields=``. Users who
+    cannot see every company's tickets may only read their own.
+    Conditional requests are answered from ``updated_at`` before the
+    company is loaded.
+    """
+    user = request.user
+    if not (user.can_view_all_tickets() or user.company_id == company_id):
+        raise PermissionDenied
+    try:
+        selection = COMPANY_FIELDS.parse(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    companies = Company.objects.filter(pk=company_id)
+    updated_at = companies.values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise Http404
+
+    etag = make_etag('company', company_id, request.GET.get('fields', ''), updated_at.isoformat())
+    response = not_modified(request, etag, updated_at)
+    if response is not None:
+        return response
+
+    company = COMPANY_FIELDS.apply(companies, selection).first()
+    if company is None:
+        raise Http404
+    return set_validators(JsonResponse(COMPANY_FIELDS.serialize(company, selection)), etag, updated_at)
+
+
+@login_required
+@require_GET
+def company_list(request):
+    """
+    Return the companies the user can see, by id, with the fields chosen in
+    ``?fields=``. Page with ``cursor`` (the last id seen) and ``limit``.
+    Only an ETag is sent: a deleted company would not move a Last-Modified
+    taken from the page.
+    """
+    try:
+        selection = COMPANY_FIELDS.parse(request.GET.get('fields'))
+        limit = max(min(int(request.GET.get('limit', COMPANY_PAGE_SIZE)), COMPANY_MAX_PAGE_SIZE), 1)
+        after = int(request.GET.get('cursor') or 0)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    companies = _visible_companies(request.user).filter(pk__gt=after).order_by('pk')
+    rows = list(companies.values_list('pk', 'updated_at')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1][0])
+
+    etag = make_etag(
+        'companies', request.user.ticket_scope(), request.GET.get('fields', ''), after,
+        *(f'{pk}@{updated_at.isoformat()}' for pk, updated_at in rows),
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    ids = [pk for pk, _ in rows]
+    results = [
+        COMPANY_FIELDS.serialize(company, selection)
+        for company in COMPANY_FIELDS.apply(Company.objects.filter(pk__in=ids), selection).order_by('pk')
+    ]
+    return set_validators(JsonResponse({'results': results, 'next_cursor': next_cursor}), etag)
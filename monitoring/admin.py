@@ -0,0 +1,67 @@
+from django.contrib import admin
+from django.utils.html import format_html
+from .models import QueryFingerprint
+
+
+@admin.register(QueryFingerprint)
+class QueryFingerprintAdmin(admin.ModelAdmin):
+    """Read-only view of the slowest query fingerprints, for superusers only."""
+    list_display = ['short_fingerprint', 'calls', 'total_ms_display', 'mean_ms_display', 'p95_ms_display', 'max_ms_display', 'uses_index', 'last_path', 'last_seen']
+    list_filter = ['uses_index', 'last_seen']
+    search_fields = ['fingerprint', 'last_path']
+    ordering = ['-total_ms']
+    readonly_fields = ['fingerprint', 'sample_sql', 'calls', 'total_ms', 'max_ms', 'p95_ms', 'plan_display', 'uses_index', 'last_path', 'first_seen', 'last_seen']
+    fieldsets = (
+        ('Query', {
+            'fields': ('fingerprint', 'sample_sql', 'last_path')
+        }),
+        ('Timings', {
+            'fields': ('calls', 'total_ms', 'p95_ms', 'max_ms')
+        }),
+        ('Plan', {
+            'fields': ('plan_display', 'uses_index')
+        }),
+        ('Timestamps', {
+            'fields': ('first_seen', 'last_seen'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def has_module_permission(self, request):
+        return request.user.is_active and request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_active and request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def short_fingerprint(self, obj):
+        return obj.fingerprint[:120]
+    short_fingerprint.short_description = 'Query'
+
+    def total_ms_display(self, obj):
+        return f'{obj.total_ms:.1f}'
+    total_ms_display.short_description = 'Total (ms)'
+    total_ms_display.admin_order_field = 'total_ms'
+
+    def mean_ms_display(self, obj):
+        return f'{obj.mean_ms:.2f}'
+    mean_ms_display.short_description = 'Mean (ms)'
+
+    def p95_ms_display(self, obj):
+        return f'{obj.p95_ms:.2f}'
+    p95_ms_display.short_description = 'p95 (ms)'
+    p95_ms_display.admin_order_field = 'p95_ms'
+
+    def max_ms_display(self, obj):
+        return f'{obj.max_ms:.1f}'
+    max_ms_display.short_description = 'Max (ms)'
+    max_ms_display.admin_order_field = 'max_ms'
+
+    def plan_display(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan or 'Not captured')
+    plan_display.short_description = 'Plan'
@@ -0,0 +1,283 @@
+import datetime
+import gzip
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from accounts.models import CustomUser
+from companies.models import Company
+from ticketing.models import Ticket
+
+VERIFIED_MODELS = [Ticket, Company, CustomUser]
+BACKUP_GLOB = 'db-*.sqlite3*'
+
+
+class TooManyRestarts(Exception):
+    pass
+
+
+class WriteProbe(threading.Thread):
+    """
+    Measures how long a writer waits for the database write lock, in WAL
+    mode only.
+
+    In WAL mode readers never block writers, so a writer only waits for the
+    WAL write lock, which is exactly what ``BEGIN IMMEDIATE`` takes. The
+    rollback leaves the database untouched, so the probe neither changes
+    data nor makes the backup restart. In rollback-journal mode a writer
+    also has to wait for every reader's SHARED lock to clear at commit,
+    which ``BEGIN IMMEDIATE`` does not; there the per-step lock times
+    reported by the backup are the write stall instead.
+    """
+
+    def __init__(self, connect, interval):
+        super().__init__(name='backup-write-probe', daemon=True)
+        self.connect = connect
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def sample(self, db):
+        started = time.perf_counter()
+        db.execute('BEGIN IMMEDIATE')
+        db.execute('ROLLBACK')
+        self.samples.append(time.perf_counter() - started)
+
+    def run(self):
+        db = self.connect(isolation_level=None, timeout=60)
+        try:
+            while not self._stop_event.is_set():
+                self.sample(db)
+                self._stop_event.wait(self.interval)
+        finally:
+            db.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def latency_summary(samples):
+    if not samples:
+        return 'no samples'
+    ms = sorted(sample * 1000 for sample in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f'p50 {statistics.median(ms):.2f} ms, p95 {p95:.2f} ms, max {ms[-1]:.2f} ms ({len(ms)} samples)'
+
+
+class Command(BaseCommand):
+    help = 'Backs up the SQLite database online, in small steps that let writers through'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to back up')
+        parser.add_argument('--output-dir', help='Where backups are written (default: DB_BACKUP_DIR)')
+        parser.add_argument('--pages', type=int, default=256, help='Pages copied per step')
+        parser.add_argument('--sleep', type=float, default=0.02, help='Seconds to pause between steps')
+        parser.add_argument('--compress', action='store_true', help='Gzip the backup')
+        parser.add_argument('--keep', type=int, default=7, help='Number of backups kept; older ones are deleted')
+        parser.add_argument('--max-restarts', type=int, default=20,
+                            help='Give up after the backup restarted this many times because of concurrent writes')
+        parser.add_argument('--verify', action='store_true', help='Restore the new backup and check it')
+        parser.add_argument('--verify-file', help='Only restore and check this existing backup')
+        parser.add_argument('--no-probe', action='store_true', help='Do not measure write latency')
+        parser.add_argument('--probe-interval', type=float, default=0.05, help='Seconds between write-lock probes')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('backup_db only supports SQLite databases.')
+        source_name = str(connection.settings_dict['NAME'])
+        if options['verify_file']:
+            self.verify(Path(options['verify_file']), options['database'])
+            return
+
+        output_dir = Path(options['output_dir'] or getattr(settings, 'DB_BACKUP_DIR', settings.BASE_DIR / 'backups'))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        target = output_dir / f'db-{stamp}.sqlite3'
+        suffix = 1
+        while target.exists() or Path(f'{target}.gz').exists():
+            target = output_dir / f'db-{stamp}-{suffix}.sqlite3'
+            suffix += 1
+
+        def connect(**kwargs):
+            return sqlite3.connect(source_name, uri=source_name.startswith('file:'), **kwargs)
+
+        db = connect(isolation_level=None, timeout=60)
+        wal = db.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        probe = None
+        baseline = []
+        if wal and not options['no_probe']:
+            probe = WriteProbe(connect, options['probe_interval'])
+            for _ in range(20):
+                probe.sample(db)
+            baseline, probe.samples = probe.samples, []
+            probe.start()
+        db.close()
+
+        partial = target.with_suffix('.sqlite3.partial')
+        try:
+            stats = self.backup(connect, partial, options, wal)
+            partial.rename(target)
+        finally:
+            if probe is not None:
+                probe.stop()
+            partial.unlink(missing_ok=True)
+
+        if options['compress']:
+            with open(target, 'rb') as src, gzip.open(f'{target}.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            target.unlink()
+            target = Path(f'{target}.gz')
+
+        seconds = stats['seconds']
+        size = stats['pages'] * stats['page_size']
+        self.stdout.write(self.style.SUCCESS(f'Backed up to {target} ({target.stat().st_size / 1e6:.1f} MB)'))
+        self.stdout.write(
+            f"  {stats['pages']} pages ({size / 1e6:.1f} MB) in {seconds:.2f} s: "
+            f"{size / 1e6 / seconds if seconds else 0:.1f} MB/s, {stats['steps']} steps, "
+            f"{stats['restarts']} restart(s), journal mode {stats['journal_mode']}"
+        )
+        self.stdout.write(f"  source locked per step: {latency_summary(stats['step_seconds'])}")
+        if probe is not None:
+            self.stdout.write(f'  write-lock wait before backup: {latency_summary(baseline)}')
+            self.stdout.write(f'  write-lock wait during backup: {latency_summary(probe.samples)}')
+        elif not wal:
+            self.stdout.write(
+                f"  {stats['journal_mode']} journal: writers wait for each step's lock, so the per-step "
+                'times are the write stall; in WAL mode writers are not blocked by the backup'
+            )
+
+        # Only finished backups count towards --keep; a .partial left by
+        # another run that is still going must not push out a real one.
+        backups = sorted(
+            (backup for backup in output_dir.glob(BACKUP_GLOB) if backup.name.endswith(('.sqlite3', '.sqlite3.gz'))),
+            key=lambda backup: backup.stat().st_mtime,
+            reverse=True,
+        )
+        for old in backups[max(options['keep'], 1):]:
+            old.unlink()
+            self.stdout.write(f'  removed old backup {old.name}')
+
+        if options['verify']:
+            self.verify(target, options['database'], stats['counts'])
+
+    def backup(self, connect, path, options, wal=False):
+        """
+        Copy the database with SQLite's online backup API, ``--pages`` at a
+        time. The source is only locked during a step; the pause after each
+        one lets writers in. A write from another connection makes SQLite
+        start the copy again.
+
+        The row counts of ``VERIFIED_MODELS`` are read in the same read
+        transaction as the pages they describe: in WAL mode the whole copy
+        runs in one snapshot (writers are not blocked), otherwise the
+        transaction starts just before the last step.
+        """
+        stats = {'steps': 0, 'restarts': 0, 'pages': 0, 'step_seconds': [], 'counts': None}
+        pages = max(options['pages'], 1)
+        last_remaining = None
+        step_started = None
+
+        def snapshot():
+            source.execute('BEGIN')
+            stats['counts'] = {
+                model._meta.label: source.execute(f'SELECT COUNT(*) FROM "{model._meta.db_table}"').fetchone()[0]
+                for model in VERIFIED_MODELS
+            }
+
+        def progress(status, remaining, total):
+            nonlocal last_remaining, step_started
+            stats['step_seconds'].append(time.perf_counter() - step_started)
+            stats['steps'] += 1
+            stats['pages'] = total
+            if last_remaining is not None and remaining > last_remaining:
+                stats['restarts'] += 1
+                if stats['restarts'] > options['max_restarts']:
+                    raise TooManyRestarts
+            last_remaining = remaining
+            if remaining and options['sleep']:
+                # sqlite3's own ``sleep`` only applies when a step finds the
+                # database busy; yield after every step.
+                time.sleep(options['sleep'])
+            if 0 < remaining <= pages and stats['counts'] is None:
+                snapshot()
+            step_started = time.perf_counter()
+
+        source = connect(isolation_level=None)
+        destination = sqlite3.connect(path)
+        started = time.perf_counter()
+        try:
+            if wal or source.execute('PRAGMA page_count').fetchone()[0] <= pages:
+                snapshot()
+            step_started = time.perf_counter()
+            source.backup(destination, pages=pages, progress=progress, sleep=options['sleep'])
+            if source.in_transaction:
+                source.execute('COMMIT')
+            stats['page_size'] = source.execute('PRAGMA page_size').fetchone()[0]
+            stats['journal_mode'] = source.execute('PRAGMA journal_mode').fetchone()[0]
+            if not stats['pages']:
+                stats['pages'] = destination.execute('PRAGMA page_count').fetchone()[0]
+        except TooManyRestarts:
+            raise CommandError(
+                f"The backup restarted {stats['restarts']} times because of concurrent writes. "
+                'Try a larger --pages or a quieter time.'
+            )
+        finally:
+            source.close()
+            destination.close()
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+
+    def verify(self, path, database, expected=None):
+        """
+        Restore ``path`` to a scratch file and compare its row counts with
+        ``expected`` (``{model label: count}``, captured during the backup),
+        or with the live database when there are none.
+        """
+        if not path.exists():
+            raise CommandError(f'No such backup: {path}')
+        with tempfile.TemporaryDirectory() as scratch:
+            restored = Path(scratch) / 'restored.sqlite3'
+            opener = gzip.open if path.suffix == '.gz' else open
+            with opener(path, 'rb') as src, open(restored, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            db = sqlite3.connect(restored)
+            try:
+                integrity = db.execute('PRAGMA integrity_check').fetchone()[0]
+                counts = {}
+                for model in VERIFIED_MODELS:
+                    try:
+                        counts[model] = db.execute(f'SELECT COUNT(*) FROM "{model._meta.db_table}"').fetchone()[0]
+                    except sqlite3.DatabaseError:
+                        counts[model] = None
+            finally:
+                db.close()
+
+        problems = [] if integrity == 'ok' else [f'integrity check: {integrity}']
+        self.stdout.write(f'Verifying {path}: integrity {integrity}')
+        source = 'at backup time' if expected is not None else 'live'
+        for model, count in counts.items():
+            if expected is not None:
+                reference = expected[model._meta.label]
+            else:
+                reference = model._default_manager.using(database).count()
+            name = model._meta.verbose_name_plural
+            self.stdout.write(f'  {name}: {count} in backup, {reference} {source}')
+            if count != reference:
+                problems.append(f'{name} count differs ({count} vs {reference} {source})')
+        if problems:
+            message = 'Backup verification failed: ' + '; '.join(problems) + '.'
+            if expected is None:
+                message += ' Counts also differ if the live database changed after the backup.'
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS('Backup verified'))
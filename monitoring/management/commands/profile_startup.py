@@ -0,0 +1,109 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+RESULT_PREFIX = 'PROFILE_STARTUP_RESULT '
+
+
+def child(warm, paths):
+    """Runs in a fresh interpreter: time each startup stage and the first requests."""
+    timings = []
+    started = time.perf_counter()
+    import django
+    django.setup()
+    timings.append(('setup (imports, app registry)', time.perf_counter() - started))
+
+    from django.core.wsgi import get_wsgi_application
+    from ticket_system.warmup import request_path, warm_up
+
+    started = time.perf_counter()
+    application = get_wsgi_application()
+    timings.append(('wsgi handler (middleware)', time.perf_counter() - started))
+
+    if warm:
+        timings.extend((f'warm-up: {name}', seconds) for name, seconds, _ in warm_up(application))
+    for label in ('first', 'second'):
+        for path in paths:
+            started = time.perf_counter()
+            status = request_path(application, path)
+            timings.append((f'{label} GET {path} ({status})', time.perf_counter() - started))
+    sys.stdout.write(RESULT_PREFIX + json.dumps(timings) + '\n')
+
+
+def import_times(stderr):
+    """Self import time in seconds per top-level package, from ``-X importtime`` output."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return totals
+
+
+class Command(BaseCommand):
+    help = 'Measures worker startup and first-request latency per stage, with and without warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paths', nargs='+', help='Paths to request (default: WARMUP_PATHS)')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh processes per mode; medians are shown')
+        parser.add_argument('--top', type=int, default=10, help='Packages listed by import time')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or getattr(settings, 'WARMUP_PATHS', ['/admin/login/'])
+        results = {}
+        imports = defaultdict(list)
+        for mode in ('cold', 'warm'):
+            runs = defaultdict(list)
+            for _ in range(max(options['runs'], 1)):
+                timings, stderr = self._run_child(mode == 'warm', paths)
+                for name, seconds in timings:
+                    runs[name].append(seconds)
+                if mode == 'cold':
+                    for package, seconds in import_times(stderr).items():
+                        imports[package].append(seconds)
+            results[mode] = {name: statistics.median(values) * 1000 for name, values in runs.items()}
+        slowest = sorted(
+            ((package, statistics.median(values) * 1000) for package, values in imports.items()),
+            key=lambda item: -item[1],
+        )[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({'stages_ms': results, 'imports_ms': dict(slowest)}, indent=2))
+            return
+
+        names = list(results['warm']) + [name for name in results['cold'] if name not in results['warm']]
+        width = max(len(name) for name in names)
+        self.stdout.write(f"{'stage':<{width}} {'cold ms':>9} {'warm ms':>9}")
+        for name in names:
+            cold, warm = results['cold'].get(name), results['warm'].get(name)
+            self.stdout.write(
+                f"{name:<{width}} {'-' if cold is None else f'{cold:.1f}':>9} {'-' if warm is None else f'{warm:.1f}':>9}"
+            )
+        self.stdout.write('\nImport time by package (self time, ms):')
+        for package, ms in slowest:
+            self.stdout.write(f'  {package:<30} {ms:>8.1f}')
+
+    def _run_child(self, warm, paths):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        code = (
+            'from monitoring.management.commands.profile_startup import child; '
+            f'child({warm!r}, {list(paths)!r})'
+        )
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        for line in reversed(process.stdout.splitlines()):
+            if line.startswith(RESULT_PREFIX):
+                return json.loads(line[len(RESULT_PREFIX):]), process.stderr
+        raise CommandError(f'Startup profile failed:\n{process.stderr[-2000:]}')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from monitoring.models import QueryFingerprint
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'p95': '-p95_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+}
+
+
+class Command(BaseCommand):
+    help = 'Lists the query fingerprints with the highest cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--order', choices=sorted(ORDERINGS), default='total', help='Sort key')
+        parser.add_argument('--unindexed', action='store_true', help='Only show queries whose plan does not use an index')
+        parser.add_argument('--plans', action='store_true', help='Print captured query plans')
+        parser.add_argument('--reset', action='store_true', help='Delete all collected fingerprints and exit')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = QueryFingerprint.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} fingerprint(s)'))
+            return
+
+        queryset = QueryFingerprint.objects.order_by(ORDERINGS[options['order']])
+        if options['unindexed']:
+            queryset = queryset.filter(uses_index=False)
+
+        rows = list(queryset[:options['limit']])
+        if not rows:
+            self.stdout.write('No queries recorded yet.')
+            return
+
+        self.stdout.write(f"{'calls':>8} {'total ms':>10} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} {'index':>5}  query")
+        for row in rows:
+            index = {True: 'yes', False: 'NO', None: '-'}[row.uses_index]
+            self.stdout.write(
+                f'{row.calls:>8} {row.total_ms:>10.1f} {row.mean_ms:>8.2f} {row.p95_ms:>8.2f} '
+                f'{row.max_ms:>8.1f} {index:>5}  {row.fingerprint[:200]}'
+            )
+            if options['plans'] and row.plan:
+                for line in row.plan.splitlines():
+                    self.stdout.write(f'{"":>52}{line}')
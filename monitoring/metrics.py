@@ -0,0 +1,79 @@
+"""
+Per-request counters shared between the timing middleware and the code
+that runs inside a request.
+
+The middleware installs a RequestMetrics object in a context variable for
+sampled requests only; everywhere else ``current()`` returns ``None`` and
+the recording helpers are no-ops.
+"""
+import contextvars
+import time
+
+from . import querylog
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'query_count', 'sql_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    """Begin collecting metrics; returns ``(metrics, token)``."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_cache(hit):
+    """Count a cache lookup against the current request, if it is sampled."""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+class QueryTimer:
+    """
+    ``connection.execute_wrapper`` hook that accumulates SQL time and, when
+    given a QueryLog, feeds each query into its fingerprint aggregates.
+    """
+
+    def __init__(self, metrics, query_log=None, path=''):
+        self.metrics = metrics
+        self.query_log = query_log
+        self.path = path
+
+    def __call__(self, execute, sql, params, many, context):
+        if querylog.is_explaining():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.metrics.query_count += 1
+            self.metrics.sql_time += duration
+            if self.query_log is not None:
+                self.query_log.record(sql, params, duration, context['connection'], many, self.path)
@@ -0,0 +1,82 @@
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics as request_metrics
+from .querylog import query_log
+
+logger = logging.getLogger('monitoring.requests')
+
+
+class RequestTimingMiddleware:
+    """
+    Records wall time, ORM query count and SQL time, cache hits/misses and
+    the resolved view for a sample of requests.
+
+    Results are added to the response as ``Server-Timing`` and emitted as a
+    log line on the ``monitoring.requests`` logger. Unsampled requests pass
+    straight through, so the cost in production is one random() call.
+
+    Queries of sampled requests are also aggregated by fingerprint in
+    ``monitoring.querylog.query_log`` unless ``SLOW_QUERY_LOG_ENABLED`` is off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.server_timing = getattr(settings, 'REQUEST_TIMING_SERVER_TIMING', True)
+        self.query_log = query_log if getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True) else None
+        self.flush_interval = getattr(settings, 'SLOW_QUERY_FLUSH_INTERVAL', 60)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        metrics, token = request_metrics.start()
+        try:
+            with ExitStack() as stack:
+                timer = request_metrics.QueryTimer(metrics, self.query_log, request.path)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            request_metrics.finish(token)
+
+        elapsed = metrics.elapsed
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else ''
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={elapsed * 1000:.1f}',
+                f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.query_count} queries"',
+                f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+            ])
+
+        logger.info(
+            '%s %s %s %.1fms queries=%d sql=%.1fms cache_hits=%d cache_misses=%d view=%s',
+            request.method, request.path, response.status_code, elapsed * 1000,
+            metrics.query_count, metrics.sql_time * 1000,
+            metrics.cache_hits, metrics.cache_misses, view_name or '-',
+            extra={'request_metrics': {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 3),
+                'query_count': metrics.query_count,
+                'sql_ms': round(metrics.sql_time * 1000, 3),
+                'cache_hits': metrics.cache_hits,
+                'cache_misses': metrics.cache_misses,
+                'view': view_name,
+            }},
+        )
+
+        if self.query_log is not None:
+            try:
+                self.query_log.maybe_flush(self.flush_interval)
+            except Exception:
+                logger.exception('Failed to flush query fingerprints')
+        return response
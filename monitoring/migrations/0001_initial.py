@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint_hash', models.CharField(max_length=40, unique=True)),
+                ('fingerprint', models.TextField()),
+                ('sample_sql', models.TextField()),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('p95_ms', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=dict)),
+                ('plan', models.TextField(blank=True)),
+                ('uses_index', models.BooleanField(null=True)),
+                ('last_path', models.CharField(blank=True, max_length=255)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Query Fingerprint',
+                'verbose_name_plural': 'Query Fingerprints',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class QueryFingerprint(models.Model):
+    """
+    Aggregated timings for one normalised SQL statement, merged from the
+    per-process query logs.
+    """
+    fingerprint_hash = models.CharField(max_length=40, unique=True)
+    fingerprint = models.TextField()
+    sample_sql = models.TextField()
+    calls = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    p95_ms = models.FloatField(default=0)
+    histogram = models.JSONField(default=dict)
+    plan = models.TextField(blank=True)
+    uses_index = models.BooleanField(null=True)
+    last_path = models.CharField(max_length=255, blank=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name = 'Query Fingerprint'
+        verbose_name_plural = 'Query Fingerprints'
+
+    def __str__(self):
+        return self.fingerprint[:80]
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.calls if self.calls else 0.0
@@ -0,0 +1,237 @@
+"""
+Query fingerprinting and aggregation.
+
+Every query run during a sampled request is normalised into a fingerprint
+(literals and placeholder lists collapsed) and aggregated in a bounded,
+per-process LRU structure. Durations go into a log-scale histogram so that
+p95 can be estimated and histograms from several workers can be merged by
+adding bucket counts. Queries slower than ``SLOW_QUERY_THRESHOLD_MS`` get
+their plan captured once per fingerprint.
+
+Aggregates are flushed to the QueryFingerprint table every
+``SLOW_QUERY_FLUSH_INTERVAL`` seconds; the admin page and the
+``slow_queries`` command read from there.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+BUCKETS_PER_OCTAVE = 4
+MAX_BUCKET = 127
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+_local = threading.local()
+
+
+def is_explaining():
+    return getattr(_local, 'explaining', False)
+
+
+def fingerprint(sql):
+    """Normalise SQL so that queries differing only in literals compare equal."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint_hash(fp):
+    return hashlib.sha1(fp.encode()).hexdigest()
+
+
+def bucket_for(duration):
+    """Histogram bucket for a duration in seconds (~19% wide buckets)."""
+    micros = duration * 1_000_000
+    if micros < 1:
+        return 0
+    return min(int(math.log2(micros) * BUCKETS_PER_OCTAVE) + 1, MAX_BUCKET)
+
+
+def bucket_upper_ms(bucket):
+    return 2 ** (bucket / BUCKETS_PER_OCTAVE) / 1000
+
+
+def histogram_quantile(histogram, q):
+    """Estimate the ``q`` quantile in milliseconds from a bucket histogram."""
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return bucket_upper_ms(int(bucket))
+    return bucket_upper_ms(max(int(b) for b in histogram))
+
+
+def explain(connection, sql, params):
+    """Return ``(plan_text, uses_index)`` for a query, or ``(None, None)``."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor in ('postgresql', 'mysql'):
+        prefix = 'EXPLAIN '
+    else:
+        return None, None
+
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except Exception:
+        return None, None
+    finally:
+        _local.explaining = False
+
+    if connection.vendor == 'sqlite':
+        lines = [row[-1] for row in rows]
+        full_scans = [line for line in lines if line.startswith('SCAN') and 'USING' not in line]
+        uses_index = any('USING' in line for line in lines) and not full_scans
+    else:
+        lines = [' '.join(str(col) for col in row) for row in rows]
+        plan = '\n'.join(lines)
+        uses_index = 'Index' in plan or 'index' in plan
+    return '\n'.join(lines), uses_index
+
+
+class FingerprintStats:
+    __slots__ = ('fingerprint', 'sample_sql', 'calls', 'total', 'max', 'histogram', 'plan', 'uses_index', 'path')
+
+    def __init__(self, fp, sql):
+        self.fingerprint = fp
+        self.sample_sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = {}
+        self.plan = None
+        self.uses_index = None
+        self.path = ''
+
+
+class QueryLog:
+    """Bounded in-memory aggregation of query timings by fingerprint."""
+
+    def __init__(self, max_entries=500, threshold=0.1):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Fingerprints already EXPLAINed, kept across flushes so a slow query
+        # is only explained once per process (LRU, at most max_entries).
+        self._explained = OrderedDict()
+        self.last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, sql, params, duration, connection=None, many=False, path=''):
+        if is_explaining():
+            return
+        fp = fingerprint(sql)
+        with self._lock:
+            stats = self._entries.get(fp)
+            if stats is None:
+                stats = self._entries[fp] = FingerprintStats(fp, sql)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(fp)
+            stats.calls += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            bucket = bucket_for(duration)
+            stats.histogram[bucket] = stats.histogram.get(bucket, 0) + 1
+            if path:
+                stats.path = path
+            needs_plan = (
+                duration >= self.threshold and not many and connection is not None
+                and fp not in self._explained
+            )
+            if needs_plan:
+                self._explained[fp] = True
+                if len(self._explained) > self.max_entries:
+                    self._explained.popitem(last=False)
+            elif fp in self._explained:
+                self._explained.move_to_end(fp)
+
+        if needs_plan:
+            stats.plan, stats.uses_index = explain(connection, sql, params)
+
+    def drain(self):
+        """Return and clear the aggregated entries."""
+        with self._lock:
+            entries, self._entries = self._entries, OrderedDict()
+            self.last_flush = time.monotonic()
+        return list(entries.values())
+
+    def flush(self):
+        """Merge in-memory aggregates into the QueryFingerprint table."""
+        from .models import QueryFingerprint
+
+        entries = self.drain()
+        if not entries:
+            return 0
+        now = timezone.now()
+        by_hash = {fingerprint_hash(e.fingerprint): e for e in entries}
+        with transaction.atomic():
+            existing = {
+                row.fingerprint_hash: row
+                for row in QueryFingerprint.objects.select_for_update().filter(fingerprint_hash__in=by_hash)
+            }
+            to_create, to_update = [], []
+            for key, stats in by_hash.items():
+                row = existing.get(key)
+                if row is None:
+                    row = QueryFingerprint(
+                        fingerprint_hash=key,
+                        fingerprint=stats.fingerprint,
+                        sample_sql=stats.sample_sql,
+                        histogram={},
+                        first_seen=now,
+                    )
+                    to_create.append(row)
+                else:
+                    to_update.append(row)
+                row.calls += stats.calls
+                row.total_ms += stats.total * 1000
+                row.max_ms = max(row.max_ms, stats.max * 1000)
+                for bucket, count in stats.histogram.items():
+                    row.histogram[str(bucket)] = row.histogram.get(str(bucket), 0) + count
+                row.p95_ms = histogram_quantile(row.histogram, 0.95)
+                if stats.plan is not None:
+                    row.plan = stats.plan
+                    row.uses_index = stats.uses_index
+                if stats.path:
+                    row.last_path = stats.path
+                row.last_seen = now
+            QueryFingerprint.objects.bulk_create(to_create)
+            QueryFingerprint.objects.bulk_update(
+                to_update,
+                ['calls', 'total_ms', 'max_ms', 'histogram', 'p95_ms', 'plan', 'uses_index', 'last_path', 'last_seen'],
+            )
+        return len(entries)
+
+    def maybe_flush(self, interval):
+        if time.monotonic() - self.last_flush >= interval:
+            return self.flush()
+        return 0
+
+
+query_log = QueryLog(
+    max_entries=getattr(settings, 'SLOW_QUERY_MAX_FINGERPRINTS', 500),
+    threshold=getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000,
+)
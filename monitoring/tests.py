@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from companies.models import Company
+from ticketing.models import Ticket
+from ticket_system import warmup
+from . import metrics as request_metrics
+from .management.commands.backup_db import Command as BackupCommand
+from .management.commands.profile_startup import import_times
+from .models import QueryFingerprint
+from .querylog import QueryLog, bucket_for, fingerprint, histogram_quantile
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    """Tests for the request timing middleware."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = CustomUser.objects.create_superuser(
+            email='admin@example.com',
+            password='admin123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_login(self.user)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+    def test_server_timing_header(self):
+        """Test that sampled responses carry Server-Timing."""
+        with self.assertLogs('monitoring.requests', level='INFO') as logs:
+            response = self.client.get(reverse('admin:index'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('queries"', response['Server-Timing'])
+        record = logs.records[0]
+        self.assertEqual(record.request_metrics['view'], 'admin:index')
+        self.assertGreater(record.request_metrics['query_count'], 0)
+
+    def test_metrics_endpoint(self):
+        """Test that the metrics endpoint reports this worker's cache hit rate to superusers."""
+        response = self.client.get(reverse('monitoring:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['cache']), {'hits', 'misses', 'hit_rate'})
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        """Test that unsampled requests are not instrumented."""
+        response = self.client.get(reverse('admin:index'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_record_cache_outside_request(self):
+        """Test that cache recording is a no-op without a sampled request."""
+        request_metrics.record_cache(True)
+        metrics, token = request_metrics.start()
+        try:
+            request_metrics.record_cache(True)
+            request_metrics.record_cache(False)
+        finally:
+            request_metrics.finish(token)
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (1, 1))
+        self.assertIsNone(request_metrics.current())
+
+
+class QueryLogTest(TestCase):
+    """Tests for query fingerprinting and aggregation."""
+
+    def test_fingerprint_normalizes_literals(self):
+        """Test that literals and IN lists collapse to one fingerprint."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s, %s) AND name = 'y'"),
+        )
+        self.assertEqual(fingerprint('SELECT 1 FROM t LIMIT 21'), 'SELECT ? FROM t LIMIT ?')
+
+    def test_histogram_quantile(self):
+        """Test p95 estimation from log-scale buckets."""
+        histogram = {}
+        for ms in [1] * 95 + [100] * 5:
+            bucket = bucket_for(ms / 1000)
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        self.assertLess(histogram_quantile(histogram, 0.5), 1.5)
+        self.assertLess(histogram_quantile(histogram, 0.95), 1.5)
+        self.assertGreater(histogram_quantile(histogram, 0.99), 80)
+
+    def test_bounded_entries(self):
+        """Test that the least recently seen fingerprints are evicted."""
+        log = QueryLog(max_entries=2, threshold=10)
+        log.record('SELECT a FROM t', [], 0.001)
+        log.record('SELECT b FROM t', [], 0.001)
+        log.record('SELECT a FROM t', [], 0.001)
+        log.record('SELECT c FROM t', [], 0.001)
+        self.assertEqual(
+            sorted(e.fingerprint for e in log.drain()),
+            ['SELECT a FROM t', 'SELECT c FROM t'],
+        )
+
+    def test_plans_not_repeated_after_flush(self):
+        """Test that a slow fingerprint is only explained once, even across flushes."""
+        log = QueryLog(threshold=0)
+        sql = 'SELECT id FROM accounts_customuser WHERE email = %s'
+        with mock.patch('monitoring.querylog.explain', return_value=('plan', True)) as explain:
+            log.record(sql, ['a@example.com'], 0.2, connection=connection)
+            log.drain()
+            log.record(sql, ['b@example.com'], 0.2, connection=connection)
+        self.assertEqual(explain.call_count, 1)
+
+    def test_logs_reach_a_handler_without_debug(self):
+        """Test that monitoring logs are emitted with DEBUG off."""
+        handlers = logging.getLogger('monitoring').handlers
+        self.assertTrue(handlers)
+        self.assertTrue(all(not handler.filters for handler in handlers))
+
+    def test_slow_query_plan_and_flush(self):
+        """Test that slow queries get a plan and flushes merge into the table."""
+        log = QueryLog(threshold=0)
+        sql = 'SELECT id FROM accounts_customuser WHERE email = %s'
+        log.record(sql, ['a@example.com'], 0.2, connection=connection, path='/admin/')
+        log.flush()
+        log.record(sql, ['b@example.com'], 0.4, connection=connection)
+        log.flush()
+
+        row = QueryFingerprint.objects.get()
+        self.assertEqual(row.calls, 2)
+        self.assertAlmostEqual(row.total_ms, 600)
+        self.assertEqual(row.max_ms, 400)
+        self.assertTrue(row.uses_index)
+        self.assertIn('USING', row.plan)
+        self.assertEqual(row.last_path, '/admin/')
+
+        log.record('SELECT id FROM accounts_customuser WHERE first_name = %s', ['x'], 0.2, connection=connection)
+        log.flush()
+        self.assertFalse(QueryFingerprint.objects.get(fingerprint__contains='first_name').uses_index)
+
+        out = StringIO()
+        call_command('slow_queries', '--unindexed', stdout=out)
+        self.assertIn('first_name', out.getvalue())
+        self.assertNotIn('email', out.getvalue())
+
+    def test_admin_page_is_superuser_only(self):
+        """Test that only superusers can open the fingerprint admin."""
+        supervisor = CustomUser.objects.create_user(
+            email='supervisor@example.com',
+            password='test123',
+            first_name='Super',
+            last_name='Visor',
+            role=CustomUser.SUPERVISOR,
+            is_staff=True,
+        )
+        self.client.force_login(supervisor)
+        url = reverse('admin:monitoring_queryfingerprint_changelist')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        admin_user = CustomUser.objects.create_superuser(
+            email='admin@example.com', password='admin123', first_name='Admin', last_name='User'
+        )
+        self.client.force_login(admin_user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class WarmUpTest(TestCase):
+    """Tests for worker warm-up and startup profiling."""
+
+    @override_settings(WARMUP_GC_FREEZE=False)
+    def test_stages_run_and_report(self):
+        """Test that every stage runs and the warm-up request succeeds."""
+        timings = warmup.warm_up()
+        self.assertEqual([name for name, _, _ in timings], [name for name, _ in warmup.STAGES])
+        self.assertTrue(all(error is None for _, _, error in timings))
+        self.assertEqual(warmup.request_path(WSGIHandler(), '/admin/login/'), 200)
+
+    @override_settings(WARMUP_TEMPLATES=['missing/template.html'])
+    def test_failing_stage_is_skipped(self):
+        """Test that a failing stage is logged without stopping the warm-up."""
+        with self.assertLogs('ticket_system.warmup', level='WARNING'):
+            timings = warmup.warm_up(stages=['templates', 'urls'])
+        errors = {name: error for name, _, error in timings}
+        self.assertIn('TemplateDoesNotExist', errors['templates'])
+        self.assertIsNone(errors['urls'])
+
+    def test_templates_come_from_loaders(self):
+        """Test that the default template list is what the loaders find."""
+        names = warmup.loader_templates()
+        self.assertIn('admin/login.html', names)
+        self.assertIn('admin/ticketing/company_search_filter.html', names)
+
+    @override_settings(WARMUP_GC_FREEZE=False)
+    def test_warm_up_inside_event_loop(self):
+        """Test that warm-up under a running loop (uvicorn) still reaches the database."""
+        async def serve():
+            warmup.maybe_warm_up(None)
+
+        with mock.patch.object(warmup, 'warm_up', wraps=warmup.warm_up) as warm_up:
+            with self.assertNoLogs('ticket_system.warmup', level='WARNING'):
+                asyncio.run(serve())
+        warm_up.assert_called_once()
+
+    def test_import_times(self):
+        """Test that -X importtime output is summed per top-level package."""
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       150 |        150 |   django.utils\n'
+            'import time:        50 |        200 | django\n'
+            'import time:        30 |         30 | numpy\n'
+        )
+        totals = import_times(stderr)
+        self.assertEqual(sorted(totals), ['django', 'numpy'])
+        self.assertAlmostEqual(totals['django'], 0.0002)
+        self.assertAlmostEqual(totals['numpy'], 0.00003)
+
+
+class BackupCommandTest(TransactionTestCase):
+    """Tests for the online backup command."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.output_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        company = Company.objects.create(name='Backup Co')
+        for i in range(3):
+            Ticket.objects.create(title=f'Backup {i}', description='d', company=company)
+
+    def backup(self, *args):
+        out = StringIO()
+        call_command('backup_db', '--output-dir', str(self.output_dir), '--pages', '2', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_compressed_backup_verifies(self):
+        """Test that a compressed backup restores with matching row counts."""
+        output = self.backup('--compress', '--verify')
+        self.assertIn('Backup verified', output)
+        self.assertIn('3 at backup time', output)
+        self.assertIn('source locked per step', output)
+        self.assertEqual(len(list(self.output_dir.glob('db-*.sqlite3.gz'))), 1)
+
+    def test_rotation(self):
+        """Test that only the newest --keep backups are kept."""
+        for _ in range(3):
+            self.backup('--keep', '2', '--no-probe')
+        self.assertEqual(len(list(self.output_dir.glob('db-*'))), 2)
+
+    def test_rotation_ignores_partial_backups(self):
+        """Test that an unfinished backup does not count towards --keep."""
+        self.backup('--no-probe')
+        in_progress = self.output_dir / 'db-99999999-999999.sqlite3.partial'
+        in_progress.write_bytes(b'')
+        self.backup('--keep', '2', '--no-probe')
+        self.assertEqual(len(list(self.output_dir.glob('db-*.sqlite3'))), 2)
+        self.assertTrue(in_progress.exists())
+
+    def test_failed_backup_leaves_no_partial(self):
+        """Test that the .partial file is removed when the copy fails."""
+        def fail(command, connect, path, options, wal):
+            path.write_bytes(b'half')
+            raise OSError('disk full')
+
+        with mock.patch('monitoring.management.commands.backup_db.Command.backup', fail):
+            with self.assertRaises(OSError):
+                self.backup('--no-probe')
+        self.assertEqual(list(self.output_dir.iterdir()), [])
+
+    def test_wal_backup_is_a_snapshot_and_lets_writers_through(self):
+        """Test that in WAL mode writers commit during the copy and the counts match the copy."""
+        path = self.output_dir / 'source.sqlite3'
+        db = sqlite3.connect(path, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        for table in ('ticketing_ticket', 'companies_company', 'accounts_customuser'):
+            db.execute(f'CREATE TABLE "{table}" (id INTEGER PRIMARY KEY, body BLOB)')
+        db.executemany('INSERT INTO ticketing_ticket (body) VALUES (randomblob(2000))', [()] * 50)
+        writer = sqlite3.connect(path, isolation_level=None, timeout=0.5)
+
+        def write(seconds):
+            writer.execute('INSERT INTO ticketing_ticket (body) VALUES (NULL)')
+
+        options = {'pages': 5, 'sleep': 0.001, 'max_restarts': 0}
+        with mock.patch('monitoring.management.commands.backup_db.time.sleep', write):
+            stats = BackupCommand().backup(lambda **kwargs: sqlite3.connect(path, **kwargs),
+                                           self.output_dir / 'copy.sqlite3', options, wal=True)
+        copy = sqlite3.connect(self.output_dir / 'copy.sqlite3')
+        self.assertEqual(stats['counts']['ticketing.Ticket'], 50)
+        self.assertEqual(copy.execute('SELECT COUNT(*) FROM ticketing_ticket').fetchone()[0], 50)
+        self.assertGreater(db.execute('SELECT COUNT(*) FROM ticketing_ticket').fetchone()[0], 50)
+        for handle in (copy, writer, db):
+            handle.close()
+
+    def test_verify_detects_mismatch(self):
+        """Test that verification fails when the backup and live counts differ."""
+        self.backup('--no-probe')
+        backup = next(self.output_dir.glob('db-*.sqlite3'))
+        Ticket.objects.first().delete()
+        with self.assertRaisesMessage(CommandError, 'Tickets count differs'):
+            self.backup('--verify-file', str(backup))
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('monitoring/metrics/', views.metrics, name='metrics'),
+]
@@ -0,0 +1,26 @@
+import os
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from ticket_system.cache import stats as cache_stats
+from .querylog import query_log
+
+
+@login_required
+@require_GET
+def metrics(request):
+    """
+    Counters of the worker that serves the request: cache hits, misses and
+    hit rate since the process started, and the number of query
+    fingerprints waiting to be flushed. Superusers only.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    return JsonResponse({
+        'pid': os.getpid(),
+        'cache': cache_stats.snapshot(),
+        'pending_query_fingerprints': len(query_log),
+    })
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ticket_system.settings')
 
 application = get_asgi_application()
+
+# Load URL, template and model caches before the server forks workers or
+# accepts traffic (see ticket_system/warmup.py).
+from ticket_system.warmup import maybe_warm_up  # noqa: E402
+
+maybe_warm_up(application)
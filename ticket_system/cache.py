@@ -0,0 +1,139 @@
+"""
+Read-through caching for company lookups and rendered fragments (such as
+the per-company pages of the ticket list API).
+
+Keys embed version numbers instead of being deleted one by one. Every
+company has its own version, and the ``companies`` and ``users`` namespaces
+have global ones; writes bump the relevant version (see the signal handlers
+in each app and the ``update()`` overrides on the querysets), which makes
+every key built from the old version unreachable. Old entries are then
+dropped by the backend's LRU/TTL eviction.
+
+A write inside a transaction bumps twice: once straight away, so the writer
+itself stops reading the old entries, and again on commit, so anything a
+concurrent reader cached from the pre-commit rows under the first bump is
+unreachable too.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from monitoring.metrics import record_cache
+
+_MISSING = object()
+
+COMPANIES = 'companies'
+USERS = 'users'
+
+
+class CacheStats:
+    """Hit/miss counters for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def snapshot(self):
+        """Counters of this process, as served by the monitoring metrics endpoint."""
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4)}
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def _timeout():
+    return getattr(settings, 'TICKET_CACHE_TIMEOUT', 300)
+
+
+def get_or_set(key, compute, timeout=None):
+    """Return the cached value for ``key``, computing and storing it on a miss."""
+    value = cache.get(key, _MISSING)
+    hit = value is not _MISSING
+    stats.record(hit)
+    record_cache(hit)
+    if not hit:
+        value = compute()
+        cache.set(key, value, _timeout() if timeout is None else timeout)
+    return value
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never restarts
+        # at a number that older, still-cached keys were built from.
+        version = time.time_ns() // 1000
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns() // 1000, timeout=None)
+
+
+def _bump(key):
+    _incr(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incr(key))
+
+
+def company_version(company_id):
+    return _version(f'company:{company_id}:version')
+
+
+def bump_company_version(company_id):
+    if company_id is not None:
+        _bump(f'company:{company_id}:version')
+
+
+def namespace_version(namespace):
+    return _version(f'ns:{namespace}:version')
+
+
+def bump_namespace(namespace):
+    _bump(f'ns:{namespace}:version')
+
+
+def get_company(company_id):
+    """Return a Company by id, or ``None`` if it does not exist."""
+    from companies.models import Company
+
+    key = f'company:{company_id}:v{company_version(company_id)}'
+    return get_or_set(key, lambda: Company.objects.filter(pk=company_id).first())
+
+
+def cached_fragment(name, company_id, render, timeout=None):
+    """
+    Cache the output of ``render()`` for a fragment that depends only on one
+    company's data (pass ``company_id=None`` for fragments over all companies).
+    """
+    if company_id is None:
+        version = f'n{namespace_version(COMPANIES)}'
+    else:
+        version = f'c{company_id}:v{company_version(company_id)}'
+    return get_or_set(f'fragment:{name}:{version}:u{namespace_version(USERS)}', render, timeout)
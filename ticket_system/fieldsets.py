@@ -0,0 +1,110 @@
+"""
+Sparse fieldsets for the JSON read API.
+
+Clients choose fields with ``?fields=id,title,company.name``. A ``FieldSet``
+declares which fields a resource exposes and turns a selection into a query
+plan: ``only()`` for the chosen columns, ``select_related()`` for to-one
+relations with nested fields and a ``Prefetch`` (itself restricted with
+``only()``) for to-many relations. A request therefore selects exactly the
+columns asked for, in one query plus one per to-many relation, however many
+rows are returned.
+"""
+import datetime
+
+from django.db.models import Prefetch
+
+
+class FieldSet:
+    """
+    The readable fields of one model.
+
+    ``fields`` are plain columns, ``related`` maps to-one relations and
+    ``many`` maps to-many relations to the FieldSet of the related model
+    (or a zero-argument callable returning it, to allow cycles). A bare
+    to-one name selects the related id; ``name.field`` nests an object.
+    """
+
+    def __init__(self, model, fields, related=None, many=None, default=None):
+        self.model = model
+        self.fields = list(fields)
+        self.related = dict(related or {})
+        self.many = dict(many or {})
+        self.default = list(default or self.fields)
+
+    def _child(self, name):
+        child = self.related.get(name) or self.many.get(name)
+        return child() if callable(child) else child
+
+    def parse(self, value=None):
+        """
+        Parse a ``fields`` parameter into a selection tree, e.g.
+        ``{'id': None, 'company': {'name': None}}``. Raises ValueError
+        naming the first unknown field.
+        """
+        paths = [path.strip() for path in (value or '').split(',') if path.strip()]
+        selection = {}
+        for path in paths or self.default:
+            self._add(selection, path.split('.'), path)
+        return selection
+
+    def _add(self, selection, parts, path):
+        name, rest = parts[0], parts[1:]
+        if name in self.fields and not rest:
+            selection[name] = None
+        elif name in self.related and not rest:
+            selection.setdefault(name, None)
+        elif name in self.related or name in self.many:
+            child = selection.get(name) or {}
+            selection[name] = child
+            self._child(name)._add(child, rest or ['id'], path)
+        else:
+            raise ValueError(f'Unknown field: {path}')
+
+    def plan(self, selection, prefix=''):
+        """Return ``(only, select_related, prefetches)`` for a selection."""
+        only = [f'{prefix}{self.model._meta.pk.name}']
+        select_related, prefetches = [], []
+        for name, child in selection.items():
+            if name in self.many:
+                related_set = self._child(name)
+                remote = self.model._meta.get_field(name).field.name
+                queryset = related_set.apply(related_set.model.objects.all(), child, extra=[remote])
+                prefetches.append(Prefetch(f'{prefix}{name}', queryset=queryset))
+                continue
+            only.append(f'{prefix}{name}')
+            if name in self.related and child is not None:
+                select_related.append(f'{prefix}{name}')
+                child_only, child_related, child_prefetches = self._child(name).plan(child, f'{prefix}{name}__')
+                only.extend(child_only)
+                select_related.extend(child_related)
+                prefetches.extend(child_prefetches)
+        return only, select_related, prefetches
+
+    def apply(self, queryset, selection, extra=()):
+        """Restrict ``queryset`` to the columns and relations in ``selection``."""
+        only, select_related, prefetches = self.plan(selection)
+        queryset = queryset.only(*only, *extra)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+    def serialize(self, obj, selection):
+        data = {}
+        for name, child in selection.items():
+            if name in self.many:
+                related_set = self._child(name)
+                data[name] = [related_set.serialize(item, child) for item in getattr(obj, name).all()]
+            elif name in self.related:
+                if child is None:
+                    data[name] = getattr(obj, self.model._meta.get_field(name).attname)
+                else:
+                    related = getattr(obj, name)
+                    data[name] = None if related is None else self._child(name).serialize(related, child)
+            else:
+                value = getattr(obj, name)
+                if isinstance(value, (datetime.date, datetime.datetime)):
+                    value = value.isoformat()
+                data[name] = value
+        return data
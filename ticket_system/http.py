@@ -0,0 +1,39 @@
+"""
+Conditional GET helpers for the JSON read endpoints.
+
+Views compute a validator from a narrow query (ids and ``updated_at`` values,
+plus the viewer's scope) and call ``not_modified()`` before fetching or
+serialising anything else. An unchanged resource then costs one indexed
+query and an empty 304 response.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Strong ETag over the string form of ``parts``."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 (or 412) response if the client's copy is current, else ``None``."""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the body but must revalidate before reusing it.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
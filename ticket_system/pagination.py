@@ -0,0 +1,74 @@
+"""
+Paginator for admin changelists over very large tables.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+from .cache import get_or_set
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than ``count_cap`` rows.
+
+    The count is taken over ``LIMIT count_cap + 1`` rows, so it costs the same
+    however large the table grows. When the cap is reached, an unfiltered
+    queryset reports the primary-key span as its estimated size. A filtered
+    one reports the cap. Counts are cached briefly per query, because the
+    changelist asks for the same count on every page.
+
+    A count past the cap is marked ``approximate``: the primary-key span
+    overstates the size when ids have gaps. The page links then stop a few
+    pages after the current one instead of pointing at a last page that may
+    be empty.
+    """
+    count_cap = 10000
+
+    @cached_property
+    def _counted(self):
+        queryset = self.object_list
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0, False
+        key = 'changelist-count:v2:' + hashlib.sha1(f'{sql}|{params!r}'.encode()).hexdigest()
+        timeout = getattr(settings, 'CHANGELIST_COUNT_TIMEOUT', 60)
+        return get_or_set(key, self._capped_count, timeout)
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def approximate(self):
+        return self._counted[1]
+
+    def _capped_count(self):
+        queryset = self.object_list
+        count = queryset.order_by()[:self.count_cap + 1].count()
+        if count <= self.count_cap:
+            return count, False
+        if not queryset.query.where:
+            bounds = queryset.order_by().aggregate(first=Min('pk'), last=Max('pk'))
+            return max(bounds['last'] - bounds['first'] + 1, count), True
+        return self.count_cap, True
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        if not self.approximate:
+            yield from super().get_elided_page_range(number, on_each_side=on_each_side, on_ends=on_ends)
+            return
+        number = self.validate_number(number)
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        yield from range(number + 1, min(number + on_each_side, self.num_pages) + 1)
+        if number + on_each_side < self.num_pages:
+            yield self.ELLIPSIS
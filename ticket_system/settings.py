@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,14 +41,17 @@ INSTALLED_APPS = [
     'accounts',
     'companies',
     'ticketing',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.ApiThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +88,82 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# TICKET_CACHE_BACKEND selects 'locmem' (default, per process), 'file' or
+# 'redis'. locmem and file evict least-recently-used entries past
+# MAX_ENTRIES; for Redis configure `maxmemory-policy allkeys-lru` on the
+# server. All entries also expire after TICKET_CACHE_TIMEOUT seconds.
+
+TICKET_CACHE_TIMEOUT = 300
+
+_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ticket-system',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('TICKET_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('TICKET_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        **_CACHE_BACKENDS[os.environ.get('TICKET_CACHE_BACKEND', 'locmem')],
+        'TIMEOUT': TICKET_CACHE_TIMEOUT,
+        'KEY_PREFIX': 'ticket_system',
+    },
+}
+
+
+# Sessions and authentication
+# Both are opt-in and need a cache shared by all workers (TICKET_CACHE_BACKEND
+# 'redis'); they refuse to start on a per-process or per-host cache.
+# AUTH_USER_CACHE=1 loads request.user from the cache (accounts/auth.py).
+# SESSION_WRITE_BEHIND=1 reads sessions from the cache and writes ordinary
+# session changes to the database lazily; logins and logouts are always
+# written through (accounts/sessions.py).
+
+AUTH_USER_CACHE = os.environ.get('AUTH_USER_CACHE') == '1'
+AUTH_USER_CACHE_TIMEOUT = 300
+
+if AUTH_USER_CACHE:
+    MIDDLEWARE[MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware')] = (
+        'accounts.middleware.CachedAuthenticationMiddleware'
+    )
+
+SESSION_WRITE_BEHIND = os.environ.get('SESSION_WRITE_BEHIND') == '1'
+if SESSION_WRITE_BEHIND:
+    SESSION_ENGINE = 'accounts.sessions'
+
+SESSION_WRITE_BEHIND_INTERVAL = 30
+SESSION_WRITE_BEHIND_MAX_PENDING = 1000
+
+# API rate limits (see accounts/throttling.py). Per-user rates by role;
+# None, or a role left out, means unlimited. Use the 'cache' backend with a
+# shared cache when running several workers.
+API_THROTTLE_ENABLED = True
+API_THROTTLE_BACKEND = os.environ.get('API_THROTTLE_BACKEND', 'memory')
+API_THROTTLE_PATHS = ['/api/']
+API_THROTTLE_RATES = {
+    'account_viewer': '120/min',
+    'authorized_user': '240/min',
+    'support': '600/min',
+    'supervisor': '600/min',
+    'superadmin': None,
+}
+API_THROTTLE_COMPANY_RATE = '1200/min'
+API_THROTTLE_ANON_RATE = '60/min'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -125,5 +205,76 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Turns request sampling off while the tests run
+TEST_RUNNER = 'ticket_system.test_runner.TestRunner'
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.CustomUser'
+
+LOGIN_URL = 'admin:login'
+
+# Ticket attachments
+# Content-addressed blobs live outside STATIC/MEDIA so every download goes
+# through the permission-checked view. Uploads larger than
+# FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk rather than held in memory.
+TICKET_ATTACHMENT_ROOT = BASE_DIR / 'attachments'
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
+
+# Largest number of operations accepted by /api/tickets/batch/
+TICKET_BATCH_MAX_OPERATIONS = 500
+
+# Company deletion (companies.deletion)
+# Tickets and users are removed in transactions of this many rows, with a
+# pause in between so other writers get the database lock.
+COMPANY_DELETION_BATCH_SIZE = 500
+COMPANY_DELETION_SLEEP = 0.05
+# Run deletions in a background thread of the web process; when False they
+# run inline (tests). Run `manage.py resume_company_deletions --watch 60`
+# next to the web workers: it picks up jobs whose thread was killed by a
+# restart or deploy once their heartbeat is COMPANY_DELETION_STALE seconds old.
+COMPANY_DELETION_BACKGROUND = True
+COMPANY_DELETION_STALE = 300
+
+# Written by ``manage.py backup_db``
+DB_BACKUP_DIR = BASE_DIR / 'backups'
+
+# Worker warm-up (ticket_system/warmup.py), run by wsgi.py and asgi.py
+WARMUP_ENABLED = os.environ.get('DJANGO_WARMUP', '1') != '0'
+# Requested through the full middleware stack during warm-up
+WARMUP_PATHS = ['/admin/login/']
+# WARMUP_TEMPLATES lists the templates to compile; when unset, every
+# template the configured loaders can find is compiled.
+# Freeze the objects loaded during warm-up so forked workers share them
+WARMUP_GC_FREEZE = True
+
+# Request instrumentation
+# Fraction of requests timed by monitoring.middleware.RequestTimingMiddleware.
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0.05'))
+REQUEST_TIMING_SERVER_TIMING = True
+
+# Slow-query capture (monitoring.querylog)
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_MAX_FINGERPRINTS = 500
+SLOW_QUERY_FLUSH_INTERVAL = 60
+
+# Request and query metrics are logged to stderr whatever DEBUG is, so they
+# reach the process manager's logs in production; point the 'monitoring'
+# handler elsewhere (or raise MONITORING_LOG_LEVEL) to change that.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'monitoring': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['monitoring'],
+            'level': os.environ.get('MONITORING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
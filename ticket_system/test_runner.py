@@ -0,0 +1,19 @@
+"""
+Test runner that keeps request sampling off, so test requests print no
+``monitoring`` log lines. Tests of the instrumentation turn it back on with
+``override_settings(REQUEST_TIMING_SAMPLE_RATE=...)`` and read the output
+with ``assertLogs``.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        settings.REQUEST_TIMING_SAMPLE_RATE = 0
+
+    def teardown_test_environment(self, **kwargs):
+        settings.REQUEST_TIMING_SAMPLE_RATE = self._sample_rate
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,223 @@
+"""
+Worker warm-up.
+
+Much of Django's setup happens lazily, on the first requests a worker
+serves: compiling URL patterns, loading and compiling templates, filling
+model ``_meta`` caches and the ContentType cache, importing the database
+driver and opening the first connection. ``warm_up()`` does this work
+up front. ``wsgi.py`` and ``asgi.py`` call it before the application is
+handed to the server.
+
+With a preloading prefork server (``gunicorn --preload``) the warm-up runs
+once in the master, and forked workers inherit the warm caches. Two details
+keep that memory shared copy-on-write:
+
+- Database connections are closed at the end, so no socket is shared between
+  processes. Each worker opens its own connection on its first query, after
+  the driver has been imported and the settings checked.
+- ``gc.freeze()`` moves everything loaded so far out of the garbage
+  collector's reach, so collections in the workers don't write to the
+  inherited pages.
+
+Each stage is timed. A failing stage is logged and skipped; warm-up never
+stops a worker from starting. ``python manage.py profile_startup`` reports the
+stage timings and first-request latencies with and without warm-up.
+
+ASGI servers such as uvicorn import the application inside their running
+event loop, where Django refuses synchronous database access. When a loop is
+running, ``maybe_warm_up()`` therefore runs the stages in a worker thread and
+waits for it.
+
+Settings: ``WARMUP_ENABLED`` (default True), ``WARMUP_PATHS`` (paths requested
+through the full middleware stack, default the admin login page),
+``WARMUP_TEMPLATES`` (default: every template the configured loaders can
+find) and ``WARMUP_GC_FREEZE`` (default True).
+"""
+import asyncio
+import gc
+import io
+import logging
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    from django.urls import get_resolver, reverse
+
+    resolver = get_resolver()
+    # Compiles every pattern and builds the reverse lookup tables, including
+    # those of namespaced includes (the admin, the apps' APIs).
+    resolver.reverse_dict
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        namespace_resolver.reverse_dict
+    reverse('admin:index')
+
+
+def warm_models():
+    from django.apps import apps
+
+    for model in apps.get_models():
+        opts = model._meta
+        opts.get_fields()
+        opts.related_objects
+        opts.concrete_fields
+        opts.local_concrete_fields
+
+
+def loader_templates():
+    """Names of every template the Django engines' loaders can find, first match first."""
+    from django.template import engines
+
+    names = {}
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        for loader in getattr(engine, 'template_loaders', []):
+            # The cached loader wraps the loaders that know the directories.
+            for inner in getattr(loader, 'loaders', [loader]):
+                for directory in map(Path, inner.get_dirs() if hasattr(inner, 'get_dirs') else []):
+                    if directory.is_dir():
+                        for path in sorted(directory.rglob('*')):
+                            if path.is_file():
+                                names.setdefault(path.relative_to(directory).as_posix(), None)
+    return list(names)
+
+
+def warm_templates():
+    from django.template import TemplateDoesNotExist, TemplateSyntaxError
+    from django.template.loader import get_template
+
+    # The cached template loader keeps the compiled templates.
+    names = getattr(settings, 'WARMUP_TEMPLATES', None)
+    if names is not None:
+        for name in names:
+            get_template(name)
+        return
+    for name in loader_templates():
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            # Found on disk but not loadable on its own, e.g. a fragment
+            # for a missing block or a non-template file.
+            pass
+
+
+def warm_database():
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def warm_content_types():
+    from django.apps import apps
+    from django.contrib.contenttypes.models import ContentType
+
+    ContentType.objects.get_for_models(*apps.get_models())
+
+
+def warm_requests(application=None):
+    """Send ``WARMUP_PATHS`` through the full middleware stack."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    if application is None or not isinstance(application, WSGIHandler):
+        application = WSGIHandler()
+    for path in getattr(settings, 'WARMUP_PATHS', ['/admin/login/']):
+        request_path(application, path)
+
+
+def request_path(application, path):
+    """Run one GET for ``path`` through a WSGI ``application``; returns the status code."""
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': _host(),
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+    }
+    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0]) if status else None
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0].lstrip('.') if hosts else 'localhost'
+
+
+def close_connections():
+    from django.db import connections
+
+    # Forked workers must not share a database socket.
+    connections.close_all()
+
+
+STAGES = [
+    ('urls', warm_urls),
+    ('models', warm_models),
+    ('templates', warm_templates),
+    ('database', warm_database),
+    ('content_types', warm_content_types),
+    ('requests', warm_requests),
+    ('close_connections', close_connections),
+]
+
+
+def warm_up(application=None, stages=None):
+    """
+    Run the warm-up stages (all of them, or those named in ``stages``) and
+    return ``[(stage, seconds, error)]``.
+    """
+    timings = []
+    for name, stage in STAGES:
+        if stages is not None and name not in stages:
+            continue
+        started = time.perf_counter()
+        error = None
+        try:
+            stage(application) if stage is warm_requests else stage()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            logger.warning('Warm-up stage %s failed: %s', name, error)
+        timings.append((name, time.perf_counter() - started, error))
+    if getattr(settings, 'WARMUP_GC_FREEZE', True) and (stages is None or 'gc_freeze' in stages):
+        started = time.perf_counter()
+        gc.collect()
+        gc.freeze()
+        timings.append(('gc_freeze', time.perf_counter() - started, None))
+    logger.info('Warm-up finished in %.0f ms', sum(seconds for _, seconds, _ in timings) * 1000)
+    return timings
+
+
+def maybe_warm_up(application):
+    """Warm up if ``WARMUP_ENABLED``; used by wsgi.py and asgi.py."""
+    if not getattr(settings, 'WARMUP_ENABLED', True):
+        return application
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        warm_up(application)
+    else:
+        # Inside an event loop the database stages would raise
+        # SynchronousOnlyOperation; a thread has no loop.
+        thread = threading.Thread(target=warm_up, args=(application,), name='warm-up')
+        thread.start()
+        thread.join()
+    return application
@@ -1,14 +1,143 @@
-from django.contrib import admin
-from .models import Ticket
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from companies.models import Company
+from ticket_system.cache import get_company
+from ticket_system.pagination import CappedCountPaginator
+from ticket_system.search import normalize, prefix_q
+from .models import MAX_ID, Ticket, TicketAttachment, TicketComment
+from .similarity import find_duplicates, merge_tickets
+
+
+class CompanySearchListFilter(admin.ListFilter):
+    """
+    Company filter that shows a search box instead of listing every company.
+
+    Typing a name lists up to ``max_choices`` companies whose normalised
+    name starts with it (an indexed range lookup); nothing is loaded
+    until something is searched for.
+    """
+    title = 'company'
+    parameter_name = 'company__id__exact'
+    search_parameter = 'company_q'
+    template = 'admin/ticketing/company_search_filter.html'
+    max_choices = 10
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.company_id = params.pop(self.parameter_name, None)
+        self.term = params.pop(self.search_parameter, None)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name, self.search_parameter]
+
+    def queryset(self, request, queryset):
+        if not self.company_id:
+            return queryset
+        try:
+            company_id = Company._meta.pk.to_python(self.company_id)
+            if not 0 < company_id <= MAX_ID:
+                raise ValidationError('Company id out of range.')
+        except ValidationError as e:
+            raise IncorrectLookupParameters(e)
+        return queryset.filter(company_id=company_id)
+
+    def choices(self, changelist):
+        self.preserved_params = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in self.expected_parameters()
+        ]
+        yield {
+            'selected': not self.company_id,
+            'query_string': changelist.get_query_string(remove=self.expected_parameters()),
+            'display': 'All',
+        }
+        if self.company_id:
+            company = get_company(self.company_id)
+            yield {
+                'selected': True,
+                'query_string': changelist.get_query_string(),
+                'display': str(company) if company else self.company_id,
+            }
+        if self.term:
+            matches = Company.objects.filter(prefix_q('search_name', normalize(self.term))).order_by('search_name')
+            for company in matches[:self.max_choices]:
+                if str(company.pk) == self.company_id:
+                    continue
+                yield {
+                    'selected': False,
+                    'query_string': changelist.get_query_string(
+                        {self.parameter_name: company.pk}, [self.search_parameter]
+                    ),
+                    'display': str(company),
+                }
+
+
+class LatestCommentsFormSet(BaseInlineFormSet):
+    """Limits the inline to the most recent page of comments."""
+    per_page = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = self.queryset.select_related('author').order_by('-created_at', '-id')[:self.per_page]
+        return self._queryset
+
+
+class TicketCommentInline(admin.TabularInline):
+    model = TicketComment
+    formset = LatestCommentsFormSet
+    fk_name = 'ticket'
+    extra = 1
+    fields = ['author', 'parent', 'body', 'created_at']
+    readonly_fields = ['author', 'created_at']
+    raw_id_fields = ['parent']
+    verbose_name_plural = f'Comments (latest {LatestCommentsFormSet.per_page})'
+
+
+class TicketAttachmentInline(admin.TabularInline):
+    model = TicketAttachment
+    extra = 0
+    fields = ['filename', 'content_type', 'size', 'uploaded_by', 'created_at', 'download_link']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        # Files are added through the streaming upload endpoint, not the admin form.
+        return False
+
+    def size(self, obj):
+        return obj.blob.size
+
+    def download_link(self, obj):
+        url = reverse('ticketing:download_attachment', args=[obj.pk])
+        return format_html('<a href="{}">Download</a>', url)
+    download_link.short_description = 'Download'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('blob', 'uploaded_by')
 
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'company', 'status', 'priority', 'created_by', 'assigned_to', 'created_at']
-    list_filter = ['status', 'priority', 'company', 'created_at']
+    list_display = ['id', 'title', 'company', 'status', 'priority', 'created_by', 'assigned_to', 'comment_count', 'created_at']
+    list_filter = ['status', 'priority', CompanySearchListFilter, 'created_at']
+    list_select_related = ['company', 'created_by', 'assigned_to']
+    date_hierarchy = 'created_at'
+    paginator = CappedCountPaginator
+    show_full_result_count = False
     search_fields = ['title', 'description', 'company__name']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'created_at', 'updated_at', 'comment_count', 'last_activity_at', 'all_comments_link',
+        'duplicate_of', 'likely_duplicates',
+    ]
     autocomplete_fields = ['company', 'created_by', 'assigned_to']
+    inlines = [TicketCommentInline, TicketAttachmentInline]
+    actions = ['merge_duplicates']
     
     fieldsets = (
         ('Ticket Information', {
@@ -20,13 +149,78 @@ class TicketAdmin(admin.ModelAdmin):
         ('Status & Priority', {
             'fields': ('status', 'priority')
         }),
+        ('Activity', {
+            'fields': ('comment_count', 'last_activity_at', 'all_comments_link')
+        }),
+        ('Duplicates', {
+            'fields': ('duplicate_of', 'likely_duplicates')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'resolved_at'),
             'classes': ('collapse',)
         }),
     )
     
+    def all_comments_link(self, obj):
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:ticketing_ticketcomment_changelist') + f'?ticket__id__exact={obj.pk}'
+        return format_html('<a href="{}">View all {} comments</a>', url, obj.comment_count)
+    all_comments_link.short_description = 'Comments'
+    
+    def likely_duplicates(self, obj):
+        if not obj.pk:
+            return '-'
+        matches = find_duplicates(obj, limit=10)
+        if not matches:
+            return '-'
+        titles = dict(Ticket.objects.filter(pk__in=[pk for pk, _ in matches]).values_list('pk', 'title'))
+        return format_html_join(
+            format_html('<br>'),
+            '<a href="{}">#{} {}</a> ({}%)',
+            (
+                (reverse('admin:ticketing_ticket_change', args=[pk]), pk, titles[pk], round(score * 100))
+                for pk, score in matches if pk in titles
+            ),
+        )
+    likely_duplicates.short_description = 'Likely duplicates'
+    
+    def merge_duplicates(self, request, queryset):
+        tickets = list(queryset.select_related(None).only('company_id', 'created_at').order_by('created_at', 'pk'))
+        if len(tickets) < 2:
+            self.message_user(request, 'Select at least two tickets to merge.', messages.WARNING)
+            return
+        primary = tickets[0]
+        try:
+            merged = merge_tickets(primary, tickets[1:])
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(request, f'Merged {merged} ticket(s) into #{primary.pk}.', messages.SUCCESS)
+    merge_duplicates.short_description = 'Merge selected tickets into the oldest one'
+    
     def save_model(self, request, obj, form, change):
         if not change:  # If creating a new ticket
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+    
+    def save_formset(self, request, form, formset, change):
+        if formset.model is TicketComment:
+            for comment in formset.save(commit=False):
+                if comment.author_id is None:
+                    comment.author = request.user
+                comment.save()
+            for comment in formset.deleted_objects:
+                comment.delete()
+        else:
+            super().save_formset(request, form, formset, change)
+
+
+@admin.register(TicketComment)
+class TicketCommentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'ticket', 'author', 'parent', 'created_at']
+    list_select_related = ['ticket__company', 'author']
+    raw_id_fields = ['ticket', 'parent', 'author']
+    search_fields = ['body']
+    ordering = ['-created_at', '-id']
+    show_full_result_count = False
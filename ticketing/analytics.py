@@ -0,0 +1,281 @@
+"""
+Vectorised ticket analytics.
+
+Tickets are read in primary-key order, ``chunk_size`` rows at a time, as
+plain numbers: status and priority are encoded to small integers and the
+timestamps to epoch seconds in SQL, so each chunk becomes one float64 NumPy
+array without building model instances. Every report is an accumulator that
+folds chunks into fixed-size or per-group totals, so memory stays bounded by
+the chunk size and the number of groups, not the number of tickets.
+
+All times are UTC.
+"""
+import time
+
+import numpy as np
+from django.db import connections
+from django.db.models import Case, FloatField, Func, IntegerField, Value, When
+
+from .models import Ticket
+
+STATUSES = [value for value, _ in Ticket.STATUS_CHOICES]
+PRIORITIES = [value for value, _ in Ticket.PRIORITY_CHOICES]
+RESOLVED_CODES = [STATUSES.index(status) for status in Ticket.RESOLVED_STATUSES]
+
+# Upper edges, in hours, of the backlog age histogram bins
+AGE_BINS = [1, 4, 8, 24, 48, 72, 168, 336, 720, 2160]
+AGE_LABELS = ['<1h', '1-4h', '4-8h', '8-24h', '1-2d', '2-3d', '3-7d', '1-2w', '2-4w', '1-3mo', '>3mo']
+
+REPORTS = ['backlog_age', 'arrivals_by_hour', 'arrival_series', 'agent_throughput', 'reopen_rates']
+
+COLUMNS = ['id', 'company', 'assignee', 'reopens', 'status', 'priority', 'created', 'resolved']
+_ID, _COMPANY, _ASSIGNEE, _REOPENS, _STATUS, _PRIORITY, _CREATED, _RESOLVED = range(len(COLUMNS))
+
+
+class EpochSeconds(Func):
+    """Seconds since 1970-01-01 UTC of a datetime column."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+            **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def _encode(field, values):
+    return Case(
+        *(When(**{field: value}, then=Value(code)) for code, value in enumerate(values)),
+        default=Value(-1),
+        output_field=IntegerField(),
+    )
+
+
+def iter_chunks(queryset=None, chunk_size=50000):
+    """
+    Yield float64 arrays of shape ``(rows, len(COLUMNS))``. Missing values
+    (unassigned tickets, unresolved tickets) are NaN.
+    """
+    queryset = Ticket.objects.all() if queryset is None else queryset
+    columns = queryset.order_by().annotate(
+        _status=_encode('status', STATUSES),
+        _priority=_encode('priority', PRIORITIES),
+        _created=EpochSeconds('created_at'),
+        _resolved=EpochSeconds('resolved_at'),
+    ).values_list(
+        # The SQL selects model columns before annotations, whatever order
+        # values_list() is given, so list them that way to match COLUMNS.
+        'pk', 'company_id', 'assigned_to_id', 'reopen_count', '_status', '_priority', '_created', '_resolved'
+    )
+    last_pk = 0
+    # Every column is numeric, so rows are fetched straight from the cursor,
+    # skipping the ORM's per-row converters.
+    with connections[queryset.db].cursor() as cursor:
+        while True:
+            sql, params = columns.filter(pk__gt=last_pk).order_by('pk')[:chunk_size].query.sql_with_params()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield np.array(rows, dtype=np.float64).reshape(len(rows), len(COLUMNS))
+
+
+class GroupTotals:
+    """Per-key running sums of several columns."""
+
+    def __init__(self, width):
+        self.width = width
+        self.totals = {}
+
+    def add(self, keys, *columns):
+        if not len(keys):
+            return
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = [np.bincount(inverse, weights=column, minlength=len(unique)) for column in columns]
+        for index, key in enumerate(unique.tolist()):
+            total = self.totals.get(key)
+            if total is None:
+                total = self.totals[key] = np.zeros(self.width)
+            total += [column_sums[index] for column_sums in sums]
+
+    def items(self):
+        return sorted(self.totals.items())
+
+
+class BacklogAge:
+    """Age histogram of unresolved tickets, per priority."""
+    name = 'backlog_age'
+
+    def __init__(self, now):
+        self.now = now
+        self.histogram = np.zeros((len(PRIORITIES) + 1, len(AGE_LABELS)), dtype=np.int64)
+        self.age_sums = np.zeros(len(PRIORITIES) + 1)
+
+    def update(self, chunk):
+        open_tickets = chunk[~np.isin(chunk[:, _STATUS], RESOLVED_CODES)]
+        ages = (self.now - open_tickets[:, _CREATED]) / 3600
+        priorities = open_tickets[:, _PRIORITY].astype(np.int64)
+        priorities[priorities < 0] = len(PRIORITIES)
+        cells = priorities * len(AGE_LABELS) + np.searchsorted(AGE_BINS, ages, side='right')
+        self.histogram += np.bincount(cells, minlength=self.histogram.size).reshape(self.histogram.shape)
+        self.age_sums += np.bincount(priorities, weights=ages, minlength=len(self.age_sums))
+
+    def rows(self):
+        rows = []
+        for code, priority in enumerate(PRIORITIES + ['unknown']):
+            count = int(self.histogram[code].sum())
+            if not count:
+                continue
+            row = {'priority': priority, 'open': count, 'mean_age_hours': round(float(self.age_sums[code] / count), 2)}
+            row.update({f'age_{label}': int(n) for label, n in zip(AGE_LABELS, self.histogram[code])})
+            rows.append(row)
+        return rows
+
+
+class ArrivalsByHour:
+    """Created and resolved tickets per weekday and hour of day."""
+    name = 'arrivals_by_hour'
+
+    def __init__(self):
+        self.created = np.zeros(7 * 24, dtype=np.int64)
+        self.resolved = np.zeros(7 * 24, dtype=np.int64)
+
+    @staticmethod
+    def _slots(seconds):
+        hours = (seconds[~np.isnan(seconds)] // 3600).astype(np.int64)
+        # 1970-01-01 was a Thursday; shift so that Monday is weekday 0.
+        weekdays = (hours // 24 + 3) % 7
+        return weekdays * 24 + hours % 24
+
+    def update(self, chunk):
+        self.created += np.bincount(self._slots(chunk[:, _CREATED]), minlength=self.created.size)
+        self.resolved += np.bincount(self._slots(chunk[:, _RESOLVED]), minlength=self.resolved.size)
+
+    def rows(self):
+        names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+        return [
+            {'weekday': names[slot // 24], 'hour': slot % 24,
+             'created': int(self.created[slot]), 'resolved': int(self.resolved[slot])}
+            for slot in range(self.created.size)
+        ]
+
+
+class ArrivalSeries:
+    """Created and resolved tickets per day, week or month."""
+    name = 'arrival_series'
+
+    def __init__(self, bucket='day'):
+        self.bucket = bucket
+        self.totals = GroupTotals(2)
+
+    def _periods(self, seconds):
+        days = (seconds // 86400).astype(np.int64)
+        if self.bucket == 'week':
+            return days - (days + 3) % 7
+        if self.bucket == 'month':
+            return days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+        return days
+
+    def update(self, chunk):
+        created = chunk[:, _CREATED]
+        resolved = chunk[~np.isnan(chunk[:, _RESOLVED]), _RESOLVED]
+        self.totals.add(self._periods(created), np.ones(len(created)), np.zeros(len(created)))
+        self.totals.add(self._periods(resolved), np.zeros(len(resolved)), np.ones(len(resolved)))
+
+    def rows(self):
+        return [
+            {'period': str(np.datetime64(day, 'D')), 'created': int(created), 'resolved': int(resolved)}
+            for day, (created, resolved) in self.totals.items()
+        ]
+
+
+class AgentThroughput:
+    """Assigned, open and resolved tickets and mean resolution time per assignee."""
+    name = 'agent_throughput'
+
+    def __init__(self):
+        self.totals = GroupTotals(5)
+
+    def update(self, chunk):
+        chunk = chunk[~np.isnan(chunk[:, _ASSIGNEE])]
+        resolved_at = chunk[:, _RESOLVED]
+        resolved = ~np.isnan(resolved_at)
+        durations = np.where(resolved, resolved_at - chunk[:, _CREATED], 0.0)
+        self.totals.add(
+            chunk[:, _ASSIGNEE].astype(np.int64),
+            np.ones(len(chunk)),
+            np.isnan(resolved_at).astype(np.float64),
+            resolved.astype(np.float64),
+            durations,
+            chunk[:, _REOPENS],
+        )
+
+    def rows(self):
+        from accounts.models import CustomUser
+
+        items = self.totals.items()
+        emails = dict(CustomUser.objects.filter(pk__in=[key for key, _ in items]).values_list('pk', 'email'))
+        return [
+            {'assignee_id': key, 'email': emails.get(key, ''), 'assigned': int(assigned), 'open': int(still_open),
+             'resolved': int(resolved),
+             'mean_resolution_hours': round(float(seconds / resolved / 3600), 2) if resolved else None,
+             'reopens': int(reopens)}
+            for key, (assigned, still_open, resolved, seconds, reopens) in items
+        ]
+
+
+class ReopenRates:
+    """Share of resolved tickets that were later reopened, per priority and company."""
+    name = 'reopen_rates'
+
+    def __init__(self):
+        self.by_priority = GroupTotals(3)
+        self.by_company = GroupTotals(3)
+
+    def update(self, chunk):
+        reopens = chunk[:, _REOPENS]
+        ever_resolved = (~np.isnan(chunk[:, _RESOLVED]) | (reopens > 0)).astype(np.float64)
+        reopened = (reopens > 0).astype(np.float64)
+        for totals, column in ((self.by_priority, _PRIORITY), (self.by_company, _COMPANY)):
+            totals.add(chunk[:, column].astype(np.int64), ever_resolved, reopened, reopens)
+
+    def rows(self):
+        rows = []
+        for dimension, totals in (('priority', self.by_priority), ('company', self.by_company)):
+            for key, (resolved, reopened, reopens) in totals.items():
+                if dimension == 'priority':
+                    key = PRIORITIES[key] if 0 <= key < len(PRIORITIES) else 'unknown'
+                rows.append({
+                    'dimension': dimension, 'key': key, 'resolved': int(resolved), 'reopened': int(reopened),
+                    'reopens': int(reopens), 'reopen_rate': round(float(reopened / resolved), 4) if resolved else None,
+                })
+        return rows
+
+
+def build_reports(names, bucket='day', now=None):
+    now = time.time() if now is None else now
+    factories = {
+        'backlog_age': lambda: BacklogAge(now),
+        'arrivals_by_hour': ArrivalsByHour,
+        'arrival_series': lambda: ArrivalSeries(bucket),
+        'agent_throughput': AgentThroughput,
+        'reopen_rates': ReopenRates,
+    }
+    return [factories[name]() for name in names]
+
+
+def run_reports(names=REPORTS, queryset=None, chunk_size=50000, **options):
+    """Compute the named reports in one pass; returns ``{name: rows}``."""
+    reports = build_reports(names, **options)
+    for chunk in iter_chunks(queryset, chunk_size):
+        for report in reports:
+            report.update(chunk)
+    return {report.name: report.rows() for report in reports}
@@ -0,0 +1,153 @@
+"""
+Content-addressed storage for ticket attachments.
+
+Uploads are streamed to a temporary file in fixed-size chunks while the
+SHA-256 digest is computed, then moved to ``<root>/<aa>/<bb>/<digest>``.
+Identical files therefore occupy disk space once no matter how many
+tickets they are attached to.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def storage_root():
+    return Path(settings.TICKET_ATTACHMENT_ROOT)
+
+
+def blob_path(sha256):
+    return storage_root() / sha256[:2] / sha256[2:4] / sha256
+
+
+def iter_upload_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Yield chunks from an UploadedFile or any file-like request stream."""
+    if hasattr(stream, 'chunks'):
+        yield from stream.chunks(chunk_size)
+        return
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def store_blob(chunks):
+    """
+    Write an iterable of byte chunks to the blob store and return the
+    matching AttachmentBlob, creating it only if the digest is new.
+
+    The row is locked before the file is placed or reused, so call this
+    inside ``transaction.atomic()`` together with whatever then references
+    the blob; prune_attachments cannot delete it in between.
+    """
+    root = storage_root()
+    tmp_dir = root / 'tmp'
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in chunks:
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        with transaction.atomic():
+            blob = _locked_blob(sha256, size)
+            # Checked under the lock: a prune that got there first has
+            # already moved the old file away.
+            target = blob_path(sha256)
+            if target.exists():
+                os.unlink(tmp_name)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, target)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    return blob
+
+
+def _locked_blob(sha256, size):
+    from .models import AttachmentBlob
+
+    blobs = AttachmentBlob.objects.select_for_update()
+    try:
+        with transaction.atomic():
+            blob, _ = blobs.get_or_create(sha256=sha256, defaults={'size': size})
+    except IntegrityError:
+        blob = blobs.get(sha256=sha256)
+    return blob
+
+
+def attach_file(ticket, stream, filename, content_type='', uploaded_by=None):
+    """Stream ``stream`` into the blob store and attach it to ``ticket``."""
+    from .models import Ticket, TicketAttachment
+
+    with transaction.atomic():
+        blob = store_blob(iter_upload_chunks(stream))
+        attachment = TicketAttachment.objects.create(
+            ticket=ticket,
+            blob=blob,
+            filename=os.path.basename(filename)[:255] or blob.sha256,
+            content_type=content_type[:255],
+            uploaded_by=uploaded_by,
+        )
+        # Also moves updated_at, so API clients see the new attachment.
+        Ticket.objects.filter(pk=ticket.pk).update(last_activity_at=attachment.created_at)
+    return attachment
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns ``None`` when the header is absent or not understood (serve the
+    whole file) and raises ValueError when the range is unsatisfiable.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Unsatisfiable range')
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, length, chunk_size=CHUNK_SIZE):
+    """Yield ``length`` bytes of ``path`` starting at ``start``."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def orphaned_blobs():
+    from .models import AttachmentBlob
+    return AttachmentBlob.objects.filter(attachments__isnull=True)
@@ -0,0 +1,190 @@
+"""
+Batched ticket writes.
+
+A batch is a list of ``{"op": "create", "data": {...}}`` and
+``{"op": "update", "id": ..., "data": {...}}`` operations. Everything is
+validated up front with one query per referenced table. The valid
+operations are then applied in one transaction:
+- creates go through a single ``bulk_create``
+- updates that set the same values share one ``update()``
+- updates that set the same fields to different values share one
+  ``bulk_update``
+A batch of hundreds of status changes therefore costs a handful of
+statements.
+
+Status changes always use ``update()`` with literal values, so resolved_at,
+reopen counts and SLA rollups are maintained as for any other queryset
+update.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from companies.models import Company
+from ticket_system.cache import bump_company_version
+from .models import Ticket
+
+WRITABLE_FIELDS = ['title', 'description', 'company', 'assigned_to', 'status', 'priority']
+RELATED_FIELDS = {'company': Company, 'assigned_to': CustomUser}
+# Inactive companies (e.g. ones being deleted) take no new or moved tickets.
+RELATED_FILTERS = {'company': {'is_active': True}}
+
+
+def max_operations():
+    return getattr(settings, 'TICKET_BATCH_MAX_OPERATIONS', 500)
+
+
+def _is_id(value):
+    # bool is an int subclass; JSON true must not mean id 1.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _clean(data, required, known_ids):
+    """Return ``(values, errors)`` for one operation's data."""
+    values, errors = {}, {}
+    if not isinstance(data, dict) or not data:
+        return {}, {'data': ['Expected a non-empty object.']}
+    for name in data:
+        if name not in WRITABLE_FIELDS:
+            errors[name] = ['Unknown or read-only field.']
+    for name in required:
+        if data.get(name) in (None, ''):
+            errors.setdefault(name, []).append('This field is required.')
+    for name in WRITABLE_FIELDS:
+        if name not in data or name in errors:
+            continue
+        value = data[name]
+        if name in RELATED_FIELDS:
+            if value is None and name == 'assigned_to':
+                values['assigned_to_id'] = None
+            elif _is_id(value) and value in known_ids[name]:
+                values[f'{name}_id'] = value
+            else:
+                errors[name] = [f'No such {name.replace("_", " ")}.']
+            continue
+        try:
+            values[name] = Ticket._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    return values, errors
+
+
+def _referenced_ids(operations):
+    """Existing ids of every company and user the batch refers to, one query each."""
+    wanted = defaultdict(set)
+    for operation in operations:
+        data = operation.get('data') if isinstance(operation, dict) else None
+        if isinstance(data, dict):
+            for name in RELATED_FIELDS:
+                if _is_id(data.get(name)):
+                    wanted[name].add(data[name])
+    return {
+        name: set(
+            model.objects.filter(pk__in=wanted[name], **RELATED_FILTERS.get(name, {})).values_list('pk', flat=True)
+        ) if wanted[name] else set()
+        for name, model in RELATED_FIELDS.items()
+    }
+
+
+def apply_batch(user, operations, atomic=False):
+    """
+    Validate and apply ``operations`` as ``user``. Returns a result per
+    operation, in order. With ``atomic=True`` nothing is written unless
+    every operation is valid.
+    """
+    known_ids = _referenced_ids(operations)
+    update_ids = [
+        op.get('id') for op in operations
+        if isinstance(op, dict) and op.get('op') == 'update' and _is_id(op.get('id'))
+    ]
+    existing = set(Ticket.objects.visible_to(user).filter(pk__in=update_ids).values_list('pk', flat=True))
+
+    results = []
+    creates, updates = [], []
+    seen = set()
+    for index, operation in enumerate(operations):
+        op = operation.get('op') if isinstance(operation, dict) else None
+        result = {'index': index, 'op': op}
+        results.append(result)
+        if op == 'create':
+            values, errors = _clean(operation.get('data'), ['title', 'description', 'company'], known_ids)
+            if not errors:
+                creates.append((result, values))
+        elif op == 'update':
+            ticket_id = operation.get('id')
+            result['id'] = ticket_id
+            values, errors = _clean(operation.get('data'), [], known_ids)
+            if not _is_id(ticket_id) or ticket_id not in existing:
+                errors = {'id': ['No such ticket.']}
+            elif ticket_id in seen:
+                errors = {'id': ['The ticket is updated more than once in this batch.']}
+            else:
+                seen.add(ticket_id)
+                if not errors:
+                    updates.append((result, ticket_id, values))
+        else:
+            errors = {'op': ['Expected "create" or "update".']}
+        result['status'] = 'error' if errors else 'ok'
+        if errors:
+            result['errors'] = errors
+
+    if atomic and any(result['status'] == 'error' for result in results):
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = 'skipped'
+        return results
+
+    with transaction.atomic():
+        _create(user, creates)
+        _update(updates)
+    return results
+
+
+def _create(user, creates):
+    if not creates:
+        return
+    from .similarity import index_tickets
+    from .sla import record_resolution_changes, resolution_entry
+
+    # bulk_create() bypasses Ticket.save() and post_save, so do their work here.
+    now = timezone.now()
+    tickets = [Ticket(created_by=user, **values) for _, values in creates]
+    for ticket in tickets:
+        if ticket.status in Ticket.RESOLVED_STATUSES:
+            ticket.resolved_at = now
+    Ticket.objects.bulk_create(tickets)
+
+    for (result, _), ticket in zip(creates, tickets):
+        result['id'] = ticket.pk
+    record_resolution_changes(
+        (None, resolution_entry(ticket.company_id, ticket.priority, ticket.created_at, ticket.resolved_at))
+        for ticket in tickets if ticket.resolved_at
+    )
+    index_tickets(tickets)
+    for company_id in {ticket.company_id for ticket in tickets}:
+        bump_company_version(company_id)
+
+
+def _update(updates):
+    by_fields = defaultdict(list)
+    for _, ticket_id, values in updates:
+        by_fields[frozenset(values)].append((ticket_id, values))
+
+    for fields, items in by_fields.items():
+        by_values = defaultdict(list)
+        for ticket_id, values in items:
+            by_values[tuple(sorted(values.items()))].append(ticket_id)
+        if 'status' in fields or len(by_values) == 1:
+            # One UPDATE ... WHERE id IN (...) per distinct set of values
+            for values, ticket_ids in by_values.items():
+                Ticket.objects.filter(pk__in=ticket_ids).update(**dict(values))
+        else:
+            Ticket.objects.bulk_update(
+                [Ticket(pk=ticket_id, **values) for ticket_id, values in items],
+                sorted(fields),
+                batch_size=500,
+            )
@@ -0,0 +1,27 @@
+from accounts.fieldsets import USER_FIELDS
+from companies.fieldsets import COMPANY_FIELDS
+from ticket_system.fieldsets import FieldSet
+from .models import Ticket, TicketAttachment
+
+ATTACHMENT_FIELDS = FieldSet(
+    TicketAttachment,
+    fields=['id', 'filename', 'content_type', 'created_at'],
+    related={'uploaded_by': USER_FIELDS},
+)
+
+TICKET_FIELDS = FieldSet(
+    Ticket,
+    fields=[
+        'id', 'title', 'description', 'status', 'priority', 'comment_count', 'reopen_count',
+        'created_at', 'updated_at', 'resolved_at', 'last_activity_at',
+    ],
+    related={'company': COMPANY_FIELDS, 'created_by': USER_FIELDS, 'assigned_to': USER_FIELDS},
+    many={'attachments': ATTACHMENT_FIELDS},
+    default=[
+        'id', 'title', 'description', 'company', 'created_by', 'assigned_to', 'status', 'priority',
+        'comment_count', 'reopen_count', 'created_at', 'updated_at', 'resolved_at', 'last_activity_at',
+    ],
+)
+
+# Relations whose nested fields come from users, which carry no updated_at
+USER_RELATIONS = ('created_by', 'assigned_to', 'attachments')
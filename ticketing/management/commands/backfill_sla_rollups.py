@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from ticketing.models import ResolutionRollup, Ticket
+from ticketing.sketches import QuantileSketch
+from ticketing.sla import RESOLUTION_FIELDS, apply_rollup_deltas, resolution_entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the daily SLA rollups from every resolved ticket in one transaction; '
+        'ticket writes wait until it commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Tickets read per query')
+        parser.add_argument('--max-groups', type=int, default=5000,
+                            help='Rollup rows kept in memory before they are written')
+
+    def handle(self, *args, **options):
+        # Ticket.save() and TicketQuerySet.update() keep applying deltas to
+        # the rollups, so a resolution committed mid-rebuild would be counted
+        # twice or lost. Rebuild in one transaction that keeps ticket writers
+        # out until it commits; sla_report reads the old rows until then.
+        with transaction.atomic():
+            self._lock_writers()
+            fixed, tickets = self._rebuild(options['batch_size'], options['max_groups'])
+            rows = ResolutionRollup.objects.count()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed resolved_at on {fixed} ticket(s); rolled up {tickets} resolved ticket(s) '
+            f'into {rows} row(s)'
+        ))
+
+    def _lock_writers(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {Ticket._meta.db_table} IN SHARE MODE')
+        else:
+            # SQLite has one writer at a time: the first write takes the
+            # lock, and other writers wait for the commit.
+            ResolutionRollup.objects.all().delete()
+
+    def _rebuild(self, batch_size, max_groups):
+        # Tickets resolved before resolved_at was maintained have no
+        # timestamp; their last update is the closest estimate.
+        fixed = self._in_batches(
+            Ticket.objects.filter(status__in=Ticket.RESOLVED_STATUSES, resolved_at__isnull=True),
+            batch_size, resolved_at=F('updated_at'),
+        )
+        fixed += self._in_batches(
+            Ticket.objects.exclude(status__in=Ticket.RESOLVED_STATUSES).filter(resolved_at__isnull=False),
+            batch_size, resolved_at=None,
+        )
+        # Also drops the deltas the fixes above just applied.
+        ResolutionRollup.objects.all().delete()
+
+        deltas = defaultdict(lambda: [0, 0.0, QuantileSketch()])
+        tickets = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                Ticket.objects.filter(pk__gt=last_pk, resolved_at__isnull=False)
+                .order_by('pk')
+                .values_list('pk', *RESOLUTION_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            for _, *values in rows:
+                day, company_id, priority, seconds = resolution_entry(*values)
+                delta = deltas[day, company_id, priority]
+                delta[0] += 1
+                delta[1] += seconds
+                delta[2].add(seconds)
+            tickets += len(rows)
+            if len(deltas) >= max_groups:
+                apply_rollup_deltas(deltas)
+                deltas.clear()
+        if deltas:
+            apply_rollup_deltas(deltas)
+        return fixed, tickets
+
+    def _in_batches(self, queryset, batch_size, **values):
+        updated = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return updated
+            updated += Ticket.objects.filter(pk__in=ids).update(**values)
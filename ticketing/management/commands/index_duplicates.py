@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ticketing.models import Ticket
+from ticketing.similarity import index_tickets
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the near-duplicate index (MinHash signatures and LSH buckets) of every ticket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tickets indexed per transaction')
+        parser.add_argument('--company', type=int, help='Only re-index this company\'s tickets')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.only('company_id', 'title', 'description').order_by('pk')
+        if options['company']:
+            tickets = tickets.filter(company_id=options['company'])
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(tickets.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            index_tickets(batch)
+            indexed += len(batch)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} ticket(s)'))
@@ -0,0 +1,56 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+
+from ticketing.attachments import orphaned_blobs
+from ticketing.models import AttachmentBlob
+
+
+class Command(BaseCommand):
+    help = 'Deletes attachment blobs that are no longer referenced by any ticket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        removed = 0
+        skipped = 0
+        freed = 0
+        for blob_id, size in list(orphaned_blobs().values_list('pk', 'size')):
+            if options['dry_run'] or self.prune(blob_id):
+                removed += 1
+                freed += size
+            else:
+                skipped += 1
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        message = f'{verb} {removed} blob(s), {freed} bytes'
+        if skipped:
+            message += f'; skipped {skipped} attached again meanwhile'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def prune(self, blob_id):
+        """Delete one blob and its file unless it was attached again; return whether it was."""
+        blob = aside = None
+        try:
+            with transaction.atomic():
+                # store_blob locks the row too, so an upload of the same
+                # digest either attaches before this re-check or waits for
+                # the commit and then writes the file back.
+                blob = AttachmentBlob.objects.select_for_update().filter(pk=blob_id).first()
+                if blob is None or blob.attachments.exists():
+                    return False
+                blob.delete()
+                # Moved aside, not unlinked, until the delete has committed.
+                if blob.path.exists():
+                    aside = blob.path.with_name(f'{blob.sha256}.pruned')
+                    os.replace(blob.path, aside)
+        except (ProtectedError, IntegrityError):
+            if aside is not None:
+                os.replace(aside, blob.path)
+            return False
+        if aside is not None:
+            os.unlink(aside)
+        return True
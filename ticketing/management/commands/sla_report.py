@@ -0,0 +1,45 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand
+
+from ticketing.sla import QUANTILES, resolution_report
+
+
+class Command(BaseCommand):
+    help = 'Prints time-to-resolution statistics from the daily SLA rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat, help='First resolution day (YYYY-MM-DD)')
+        parser.add_argument('--until', type=datetime.date.fromisoformat, help='Last resolution day (YYYY-MM-DD)')
+        parser.add_argument('--company', type=int, help='Only this company id')
+        parser.add_argument('--by', nargs='*', choices=['company', 'priority', 'month'], default=['priority'],
+                            help='Grouping (default: priority)')
+        parser.add_argument('--json', action='store_true', help='Output JSON instead of a table')
+
+    def handle(self, *args, **options):
+        report = resolution_report(
+            since=options['since'],
+            until=options['until'],
+            company_id=options['company'],
+            group_by=tuple(options['by']),
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if not report:
+            self.stdout.write('No resolved tickets in range.')
+            return
+
+        columns = [*options['by'], 'count', 'mean_seconds', *(f'p{round(q * 100)}_seconds' for q in QUANTILES)]
+        self.stdout.write('  '.join(
+            f'{column.replace("_seconds", " (h)"):>12}' for column in columns
+        ))
+        for line in report:
+            cells = []
+            for column in columns:
+                value = line[column]
+                if column.endswith('_seconds'):
+                    value = '-' if value is None else f'{value / 3600:.2f}'
+                cells.append(f'{value!s:>12}')
+            self.stdout.write('  '.join(cells))
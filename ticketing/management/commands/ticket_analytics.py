@@ -0,0 +1,64 @@
+import csv
+import datetime
+import io
+import json
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ticketing.analytics import REPORTS, run_reports
+from ticketing.models import Ticket
+
+
+class Command(BaseCommand):
+    help = 'Computes backlog, arrival, throughput and reopen statistics over all tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('reports', nargs='*', choices=REPORTS, help='Reports to run (default: all)')
+        parser.add_argument('--format', choices=['json', 'csv'], default='json')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--company', type=int, help='Only tickets of this company id')
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Only tickets created on or after this day (YYYY-MM-DD)')
+        parser.add_argument('--bucket', choices=['day', 'week', 'month'], default='day',
+                            help='Period of the arrival_series report')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Tickets read per query')
+
+    def handle(self, *args, **options):
+        queryset = Ticket.objects.all()
+        if options['company']:
+            queryset = queryset.filter(company_id=options['company'])
+        if options['since']:
+            since = datetime.datetime.combine(options['since'], datetime.time.min, tzinfo=datetime.timezone.utc)
+            queryset = queryset.filter(created_at__gte=since)
+
+        results = run_reports(
+            options['reports'] or REPORTS,
+            queryset=queryset,
+            chunk_size=options['chunk_size'],
+            bucket=options['bucket'],
+            now=timezone.now().timestamp(),
+        )
+
+        out = io.StringIO()
+        if options['format'] == 'json':
+            json.dump(results, out, indent=2)
+        else:
+            self._write_csv(results, out)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.write(out.getvalue())
+        else:
+            self.stdout.write(out.getvalue())
+
+    def _write_csv(self, results, out):
+        fieldnames = ['report']
+        for rows in results.values():
+            for row in rows:
+                fieldnames.extend(key for key in row if key not in fieldnames)
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        for name, rows in results.items():
+            for row in rows:
+                writer.writerow({'report': name, **row})
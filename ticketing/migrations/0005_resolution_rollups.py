@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_search_fields'),
+        ('ticketing', '0004_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResolutionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resolution_rollups', to='companies.company')),
+            ],
+            options={
+                'verbose_name': 'Resolution Rollup',
+                'verbose_name_plural': 'Resolution Rollups',
+                'ordering': ['-day', 'company', 'priority'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resolutionrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'company', 'priority'), name='ticketing_rollup_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0005_resolution_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='reopen_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
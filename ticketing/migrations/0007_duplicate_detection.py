@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_search_fields'),
+        ('ticketing', '0006_ticket_reopen_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSignature',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='ticketing.ticket')),
+                ('signature', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'Ticket Signature',
+                'verbose_name_plural': 'Ticket Signatures',
+            },
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='ticketing.ticket'),
+        ),
+        migrations.CreateModel(
+            name='TicketLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='companies.company')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ticketing.ticket')),
+            ],
+            options={
+                'verbose_name': 'LSH Bucket',
+                'verbose_name_plural': 'LSH Buckets',
+                'indexes': [models.Index(fields=['company', 'band', 'bucket'], name='ticketing_lsh_lookup_idx')],
+            },
+        ),
+    ]
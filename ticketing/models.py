@@ -1,6 +1,108 @@
-from django.db import models
+import datetime
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from companies.models import Company
+from ticket_system.cache import bump_company_version
+
+
+RESOLUTION_TRACKED_FIELDS = {'status', 'resolved_at', 'created_at', 'priority', 'company', 'company_id'}
+SIMILARITY_TRACKED_FIELDS = {'title', 'description', 'company', 'company_id'}
+
+
+class TicketQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        status = kwargs.get('status')
+        if isinstance(status, str) and 'resolved_at' not in kwargs:
+            if status in Ticket.RESOLVED_STATUSES:
+                kwargs['resolved_at'] = Coalesce('resolved_at', models.Value(timezone.now()))
+            else:
+                kwargs['resolved_at'] = None
+                kwargs.setdefault('reopen_count', models.Case(
+                    models.When(resolved_at__isnull=False, then=models.F('reopen_count') + 1),
+                    default=models.F('reopen_count'),
+                    output_field=models.PositiveIntegerField(),
+                ))
+        tracks_resolution = not RESOLUTION_TRACKED_FIELDS.isdisjoint(kwargs)
+        tracks_similarity = not SIMILARITY_TRACKED_FIELDS.isdisjoint(kwargs)
+        if not (tracks_resolution or tracks_similarity):
+            return self._update_and_invalidate(kwargs)
+
+        # Bulk updates bypass Ticket.save() and post_save, so move the
+        # affected tickets' resolution times between SLA rollups and
+        # re-index their text for duplicate detection here.
+        from .similarity import index_tickets
+        from .sla import record_resolution_changes, resolution_entries
+
+        with transaction.atomic():
+            ticket_ids = list(self.order_by().values_list('pk', flat=True))
+            if tracks_resolution:
+                before = resolution_entries(ticket_ids)
+            rows = self._update_and_invalidate(kwargs)
+            if tracks_resolution:
+                after = resolution_entries(ticket_ids)
+                record_resolution_changes(
+                    (before.get(pk), after.get(pk)) for pk in before.keys() | after.keys()
+                )
+            if tracks_similarity:
+                for start in range(0, len(ticket_ids), 500):
+                    index_tickets(Ticket.objects.filter(pk__in=ticket_ids[start:start + 500]).only(
+                        'company_id', 'title', 'description'
+                    ))
+        return rows
+
+    def _update_and_invalidate(self, kwargs):
+        # auto_now is only applied by save(); keep ETags and Last-Modified honest.
+        kwargs.setdefault('updated_at', timezone.now())
+        # Bulk updates bypass post_save, so invalidate cached ticket lists here.
+        company_ids = set(self.order_by().values_list('company_id', flat=True).distinct())
+        rows = super().update(**kwargs)
+        new_company = kwargs.get('company', kwargs.get('company_id'))
+        if new_company is not None:
+            company_ids.add(getattr(new_company, 'pk', new_company))
+        for company_id in company_ids:
+            bump_company_version(company_id)
+        return rows
+
+    def visible_to(self, user):
+        """Tickets ``user`` may view: all of them, or their company's."""
+        if user.can_view_all_tickets():
+            return self
+        if user.company_id is None:
+            return self.none()
+        return self.filter(company_id=user.company_id)
+
+    def newest_page(self, cursor=None, limit=50):
+        """
+        Return ``(rows, next_cursor)`` for the page of ``(id, updated_at)``
+        pairs following ``cursor``, newest first. Pages are resolved from the
+        ``created_at`` indexes with a range condition, like comment pages.
+        """
+        qs = self.order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            qs = qs.filter(
+                models.Q(created_at__lt=created_at) |
+                models.Q(created_at=created_at, id__lt=pk)
+            )
+        rows = list(qs.values_list('id', 'updated_at', 'created_at')[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+        return [(pk, updated_at) for pk, updated_at, _ in rows], next_cursor
+
+    def delete(self):
+        from .sla import record_resolution_changes, resolution_entries
+
+        with transaction.atomic():
+            entries = resolution_entries(self.order_by().values_list('pk', flat=True))
+            result = super().delete()
+            record_resolution_changes((entry, None) for entry in entries.values())
+        return result
 
 
 class Ticket(models.Model):
@@ -21,6 +123,9 @@ class Ticket(models.Model):
         (STATUS_CLOSED, 'Closed'),
     ]
     
+    # Statuses that count as resolved for resolved_at and the SLA rollups
+    RESOLVED_STATUSES = (STATUS_RESOLVED, STATUS_CLOSED)
+    
     # Priority choices
     PRIORITY_LOW = 'low'
     PRIORITY_MEDIUM = 'medium'
@@ -69,10 +174,370 @@ class Ticket(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
     
+    # Denormalized from TicketComment, maintained by ticketing.signals
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    # Times the ticket went from resolved/closed back to an open status
+    reopen_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Set when the ticket is merged into another one
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
+    
+    objects = TicketQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='ticketing_created_idx'),
+            models.Index(fields=['company', 'created_at'], name='ticketing_company_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='ticketing_status_created_idx'),
+        ]
         verbose_name = 'Ticket'
         verbose_name_plural = 'Tickets'
     
     def __str__(self):
         return f"#{self.pk} - {self.title} ({self.company.name})"
+    
+    def clean(self):
+        # Inactive companies (e.g. ones being deleted) take no new tickets.
+        if not self.company_id or self.company_id == getattr(self, '_loaded_company_id', None):
+            return
+        if not Company.objects.filter(pk=self.company_id, is_active=True).exists():
+            raise ValidationError({'company': 'This company is inactive and cannot take new tickets.'})
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that a move to another company invalidates both.
+        instance._loaded_company_id = instance.__dict__.get('company_id')
+        if all(name in instance.__dict__ for name in ('company_id', 'priority', 'created_at', 'resolved_at')):
+            instance._loaded_resolution = (
+                instance.company_id, instance.priority, instance.created_at, instance.resolved_at
+            )
+        if 'title' in instance.__dict__ and 'description' in instance.__dict__:
+            # Lets the similarity index skip saves that leave the text alone.
+            instance._loaded_text = (instance.company_id, instance.title, instance.description)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep resolved_at in step with the status and move the ticket's
+        resolution time between SLA rollups when it changes.
+        """
+        from .sla import record_resolution_changes, resolution_entry
+        
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            previous = self._previous_resolution()
+            if update_fields is None or 'status' in update_fields:
+                changed = set()
+                resolved_at = self.resolved_at
+                if self.status not in self.RESOLVED_STATUSES:
+                    resolved_at = None
+                elif resolved_at is None:
+                    resolved_at = timezone.now()
+                if resolved_at != self.resolved_at:
+                    self.resolved_at = resolved_at
+                    changed.add('resolved_at')
+                if resolved_at is None and previous and previous[3] is not None:
+                    self.reopen_count += 1
+                    changed.add('reopen_count')
+                if changed and update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, *changed}
+            
+            super().save(*args, **kwargs)
+            current = (self.company_id, self.priority, self.created_at, self.resolved_at)
+            record_resolution_changes([
+                (previous and resolution_entry(*previous), resolution_entry(*current))
+            ])
+        self._loaded_resolution = current
+    
+    def delete(self, *args, **kwargs):
+        from .sla import record_resolution_changes, resolution_entry
+        
+        with transaction.atomic():
+            previous = self._previous_resolution()
+            result = super().delete(*args, **kwargs)
+            record_resolution_changes([(previous and resolution_entry(*previous), None)])
+        return result
+    
+    def _previous_resolution(self):
+        """The stored (company_id, priority, created_at, resolved_at), if any."""
+        if self._state.adding or self.pk is None:
+            return None
+        previous = getattr(self, '_loaded_resolution', None)
+        if previous is None:
+            previous = Ticket.objects.filter(pk=self.pk).values_list(
+                'company_id', 'priority', 'created_at', 'resolved_at'
+            ).first()
+        return previous
+
+
+class TicketSignature(models.Model):
+    """MinHash signature of a ticket's title and description (ticketing.similarity)."""
+    ticket = models.OneToOneField(
+        Ticket,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    signature = models.BinaryField()
+
+    class Meta:
+        verbose_name = 'Ticket Signature'
+        verbose_name_plural = 'Ticket Signatures'
+
+    def __str__(self):
+        return f"Signature of ticket #{self.ticket_id}"
+
+
+class TicketLSHBucket(models.Model):
+    """One LSH band bucket of a ticket's signature, scoped to its company."""
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'band', 'bucket'], name='ticketing_lsh_lookup_idx'),
+        ]
+        verbose_name = 'LSH Bucket'
+        verbose_name_plural = 'LSH Buckets'
+
+    def __str__(self):
+        return f"Ticket #{self.ticket_id} band {self.band}"
+
+
+class AttachmentBlob(models.Model):
+    """
+    Content-addressed file stored once on disk and shared by every
+    attachment with the same SHA-256 digest.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Attachment Blob'
+        verbose_name_plural = 'Attachment Blobs'
+
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
+    @property
+    def path(self):
+        from .attachments import blob_path
+        return blob_path(self.sha256)
+
+
+class ResolutionRollup(models.Model):
+    """
+    Time-to-resolution of the tickets of one company and priority resolved
+    on one day. Maintained incrementally by ticketing.sla.
+    """
+    day = models.DateField()
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='resolution_rollups'
+    )
+    priority = models.CharField(max_length=20, choices=Ticket.PRIORITY_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    # Serialised ticketing.sketches.QuantileSketch
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-day', 'company', 'priority']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'company', 'priority'], name='ticketing_rollup_unique'),
+        ]
+        verbose_name = 'Resolution Rollup'
+        verbose_name_plural = 'Resolution Rollups'
+
+    def __str__(self):
+        return f"{self.day} {self.company_id}/{self.priority}: {self.count} resolved"
+
+    @property
+    def mean_seconds(self):
+        return self.total_seconds / self.count if self.count else None
+
+
+class TicketAttachment(models.Model):
+    """
+    A file attached to a ticket. The bytes live in a shared AttachmentBlob.
+    """
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name='attachments'
+    )
+    blob = models.ForeignKey(
+        AttachmentBlob,
+        on_delete=models.PROTECT,
+        related_name='attachments'
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, blank=True)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ticket_attachments'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Attachment'
+        verbose_name_plural = 'Attachments'
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def size(self):
+        return self.blob.size
+
+
+class TicketCommentQuerySet(models.QuerySet):
+    def delete(self):
+        ticket_ids = set(self.values_list('ticket_id', flat=True))
+        result = super().delete()
+        refresh_comment_counts(ticket_ids)
+        return result
+
+    def keyset_page(self, cursor=None, limit=50):
+        """
+        Return ``(comments, next_cursor)`` for the page following ``cursor``.
+
+        Pages are ordered by ``(created_at, id)`` and resolved with a range
+        condition on the ``(ticket, created_at)`` index, so fetching any
+        page costs the same regardless of how deep into the thread it is.
+        """
+        qs = self.order_by('created_at', 'id')
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            qs = qs.filter(
+                models.Q(created_at__gt=created_at) |
+                models.Q(created_at=created_at, id__gt=pk)
+            )
+        comments = list(qs[:limit + 1])
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(comments[-1].created_at, comments[-1].pk)
+        return comments, next_cursor
+
+
+def refresh_comment_counts(ticket_ids):
+    """
+    Recount comments for the given tickets after deletions, and recompute
+    last_activity_at from the newest remaining comment or attachment
+    (falling back to the ticket's creation time).
+    """
+    comments = TicketComment.objects.filter(ticket=models.OuterRef('pk')).order_by().values('ticket')
+    attachments = TicketAttachment.objects.filter(ticket=models.OuterRef('pk')).order_by().values('ticket')
+    Ticket.objects.filter(pk__in=ticket_ids).update(
+        comment_count=Coalesce(
+            models.Subquery(comments.annotate(n=models.Count('id')).values('n')), 0
+        ),
+        last_activity_at=Greatest(
+            Coalesce(models.Subquery(comments.annotate(last=models.Max('created_at')).values('last')), 'created_at'),
+            Coalesce(models.Subquery(attachments.annotate(last=models.Max('created_at')).values('last')), 'created_at'),
+        ),
+    )
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+# Largest value a BigAutoField (a signed 64-bit integer) can hold
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(created_at, pk):
+    """Opaque keyset cursor for a ``(created_at, id)`` position."""
+    return f"{(created_at - _EPOCH) // _MICROSECOND}.{pk}"
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = cursor.split('.', 1)
+        created_at, pk = _EPOCH + int(micros) * _MICROSECOND, int(pk)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not 0 < pk <= MAX_ID:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return created_at, pk
+
+
+class TicketComment(models.Model):
+    """
+    A comment on a ticket. Replies point at their parent comment.
+    """
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name='comments'
+    )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ticket_comments'
+    )
+    body = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = TicketCommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['ticket', 'created_at'], name='ticketing_comment_ticket_idx'),
+        ]
+        verbose_name = 'Comment'
+        verbose_name_plural = 'Comments'
+
+    def __str__(self):
+        return f"Comment #{self.pk} on ticket #{self.ticket_id}"
+
+    def delete(self, *args, **kwargs):
+        ticket_id = self.ticket_id
+        result = super().delete(*args, **kwargs)
+        refresh_comment_counts([ticket_id])
+        return result
+
+    def clean(self):
+        if not self.parent_id:
+            return
+        parent_ticket_id = TicketComment.objects.filter(pk=self.parent_id).values_list('ticket_id', flat=True).first()
+        if parent_ticket_id is None:
+            raise ValidationError({'parent': 'No such comment.'})
+        if parent_ticket_id != self.ticket_id:
+            raise ValidationError({'parent': 'Replies must belong to the same ticket.'})
@@ -0,0 +1,46 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ticket_system.cache import bump_company_version
+from .models import SIMILARITY_TRACKED_FIELDS, Ticket, TicketAttachment, TicketComment, refresh_comment_counts
+from .similarity import index_tickets
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    """Invalidate cached ticket lists of the ticket's (old and new) company."""
+    bump_company_version(instance.company_id)
+    loaded_company_id = getattr(instance, '_loaded_company_id', None)
+    if loaded_company_id != instance.company_id:
+        bump_company_version(loaded_company_id)
+    instance._loaded_company_id = instance.company_id
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_text_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Re-index the ticket for duplicate detection when its text or company changes."""
+    if raw or (update_fields is not None and SIMILARITY_TRACKED_FIELDS.isdisjoint(update_fields)):
+        return
+    current = (instance.company_id, instance.title, instance.description)
+    if created or getattr(instance, '_loaded_text', None) != current:
+        index_tickets([instance])
+        instance._loaded_text = current
+
+
+@receiver(post_save, sender=TicketComment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    """Keep Ticket.comment_count and last_activity_at in step with new comments."""
+    if not created or raw:
+        return
+    Ticket.objects.filter(pk=instance.ticket_id).update(
+        comment_count=F('comment_count') + 1,
+        last_activity_at=instance.created_at,
+    )
+
+
+@receiver(post_delete, sender=TicketAttachment)
+def attachment_deleted(sender, instance, **kwargs):
+    """Recompute the ticket's last activity; the update also invalidates cached lists."""
+    refresh_comment_counts([instance.ticket_id])
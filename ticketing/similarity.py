@@ -0,0 +1,161 @@
+"""
+Near-duplicate detection for tickets.
+
+Each ticket's title and description are normalised and cut into character
+4-gram shingles. A MinHash signature of ``NUM_PERMUTATIONS`` values
+estimates the Jaccard similarity of two shingle sets: the fraction of
+positions where two signatures agree. The signature is split into ``BANDS``
+bands, and each band is hashed into a bucket stored in TicketLSHBucket.
+Finding candidates is then one indexed lookup of the ticket's own buckets
+within its company, not a comparison against every ticket. With 16 bands of
+4 rows, pairs above about 50% similarity share a bucket with high
+probability.
+
+Signatures are kept in step by the Ticket post_save handler and the ticket
+queryset's ``update()``. ``python manage.py index_duplicates`` rebuilds the
+index.
+"""
+import hashlib
+import zlib
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Q
+
+from ticket_system.search import normalize
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 4
+DEFAULT_THRESHOLD = 0.5
+
+_PRIME = (1 << 61) - 1
+
+
+def _coefficients(name):
+    # Derived from a hash rather than a seeded RNG so that stored signatures
+    # stay valid across NumPy versions.
+    return np.array([
+        int.from_bytes(hashlib.blake2b(f'{name}{i}'.encode(), digest_size=4).digest(), 'big') | 1
+        for i in range(NUM_PERMUTATIONS)
+    ], dtype=np.uint64)
+
+
+_A = _coefficients('a')
+_B = _coefficients('b')
+
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(title, description=''):
+    """MinHash signature of a ticket's text, or ``None`` if it has none."""
+    grams = shingles(f'{title} {description}')
+    if not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+    # (a * x + b) mod p for every permutation and shingle; a, x < 2**32 so
+    # the product fits in 64 bits.
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_buckets(sig):
+    """One 63-bit bucket id per band."""
+    rows = sig.reshape(BANDS, ROWS)
+    return [
+        int.from_bytes(hashlib.blake2b(rows[band].tobytes(), digest_size=8).digest(), 'big') >> 1
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig, others):
+    """Estimated Jaccard similarity of ``sig`` to each row of ``others``."""
+    return (others == sig).mean(axis=1)
+
+
+def index_tickets(tickets):
+    """(Re)index ``tickets``; each needs ``pk``, ``company_id``, ``title`` and ``description``."""
+    from .models import TicketLSHBucket, TicketSignature
+
+    tickets = list(tickets)
+    if not tickets:
+        return
+    signatures, buckets = [], []
+    for ticket in tickets:
+        sig = signature(ticket.title, ticket.description)
+        if sig is None:
+            continue
+        signatures.append(TicketSignature(ticket_id=ticket.pk, signature=sig.tobytes()))
+        buckets.extend(
+            TicketLSHBucket(company_id=ticket.company_id, band=band, bucket=bucket, ticket_id=ticket.pk)
+            for band, bucket in enumerate(band_buckets(sig))
+        )
+    ids = [ticket.pk for ticket in tickets]
+    with transaction.atomic():
+        TicketLSHBucket.objects.filter(ticket_id__in=ids).delete()
+        TicketSignature.objects.filter(ticket_id__in=ids).delete()
+        TicketSignature.objects.bulk_create(signatures)
+        TicketLSHBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+def find_duplicates(ticket, threshold=DEFAULT_THRESHOLD, limit=20):
+    """
+    Return ``[(ticket_id, similarity)]`` for the tickets of the same company
+    most similar to ``ticket``, best first.
+    """
+    from .models import TicketLSHBucket, TicketSignature
+
+    sig = signature(ticket.title, ticket.description)
+    if sig is None:
+        return []
+    conditions = reduce(or_, (
+        Q(band=band, bucket=bucket) for band, bucket in enumerate(band_buckets(sig))
+    ))
+    candidates = TicketLSHBucket.objects.filter(conditions, company_id=ticket.company_id).exclude(
+        ticket_id=ticket.pk
+    ).values_list('ticket_id', flat=True).distinct()
+    rows = list(TicketSignature.objects.filter(ticket_id__in=candidates).values_list('ticket_id', 'signature'))
+    if not rows:
+        return []
+    others = np.frombuffer(b''.join(bytes(data) for _, data in rows), dtype=np.uint64).reshape(len(rows), -1)
+    scores = similarity(sig, others)
+    ranked = sorted(
+        ((ticket_id, float(score)) for (ticket_id, _), score in zip(rows, scores) if score >= threshold),
+        key=lambda item: -item[1],
+    )
+    return ranked[:limit]
+
+
+def merge_tickets(primary, duplicates):
+    """
+    Merge ``duplicates`` into ``primary``: move their comments and
+    attachments over and close them with ``duplicate_of`` set. All tickets
+    must belong to the same company.
+    """
+    from .models import Ticket, TicketAttachment, TicketComment, refresh_comment_counts
+
+    duplicate_ids = [ticket.pk for ticket in duplicates if ticket.pk != primary.pk]
+    if any(ticket.company_id != primary.company_id for ticket in duplicates):
+        raise ValueError('Only tickets of the same company can be merged.')
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        TicketComment.objects.filter(ticket_id__in=duplicate_ids).update(ticket_id=primary.pk)
+        TicketAttachment.objects.filter(ticket_id__in=duplicate_ids).update(ticket_id=primary.pk)
+        refresh_comment_counts([primary.pk, *duplicate_ids])
+        last_activity = Ticket.objects.filter(pk__in=[primary.pk, *duplicate_ids]).aggregate(
+            last=Max('last_activity_at')
+        )['last']
+        if last_activity:
+            Ticket.objects.filter(pk=primary.pk).update(last_activity_at=last_activity)
+        # Tickets merged into a duplicate follow it to the primary.
+        Ticket.objects.filter(duplicate_of_id__in=duplicate_ids).update(duplicate_of_id=primary.pk)
+        Ticket.objects.filter(pk__in=duplicate_ids).update(status=Ticket.STATUS_CLOSED, duplicate_of_id=primary.pk)
+    return len(duplicate_ids)
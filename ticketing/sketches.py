@@ -0,0 +1,71 @@
+"""
+Mergeable quantile sketch for resolution times.
+
+A log-bucketed histogram in the style of DDSketch: a value ``x`` is counted
+in bucket ``ceil(log(x) / log(gamma))``, so any quantile read back is within
+``relative_accuracy`` of the true value. Two sketches merge (and a value can
+be removed again) by adding or subtracting bucket counts, which is what lets
+daily rollups be combined into reports over any period.
+"""
+import math
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_VALUE = 1e-3
+
+
+class QuantileSketch:
+    def __init__(self, buckets=None, zero_count=0):
+        self.buckets = {int(k): v for k, v in (buckets or {}).items()}
+        self.zero_count = zero_count
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(data.get('buckets'), data.get('zero', 0))
+
+    def to_dict(self):
+        return {
+            'buckets': {str(k): v for k, v in sorted(self.buckets.items()) if v},
+            'zero': self.zero_count,
+        }
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value, weight=1):
+        """Add ``value`` ``weight`` times; a negative weight removes it."""
+        if value < _MIN_VALUE:
+            self.zero_count += weight
+            return
+        key = math.ceil(math.log(value) / _LOG_GAMMA)
+        count = self.buckets.get(key, 0) + weight
+        if count:
+            self.buckets[key] = count
+        else:
+            self.buckets.pop(key, None)
+
+    def merge(self, other, weight=1):
+        for key, count in other.buckets.items():
+            merged = self.buckets.get(key, 0) + weight * count
+            if merged:
+                self.buckets[key] = merged
+            else:
+                self.buckets.pop(key, None)
+        self.zero_count += weight * other.zero_count
+
+    def quantile(self, q):
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * _GAMMA ** key / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.buckets) / (_GAMMA + 1)
@@ -0,0 +1,152 @@
+"""
+Daily time-to-resolution rollups.
+
+Every resolved ticket contributes its resolution time to one
+``ResolutionRollup`` row, keyed by the day it was resolved, its company and
+its priority. Ticket.save() and the ticket queryset's ``update()`` and
+``delete()`` move contributions between rows as tickets are resolved,
+reopened or edited, and ``backfill_sla_rollups`` rebuilds the table from
+scratch. Reports merge the rows' sketches, so they read one row per
+company, priority and day instead of every ticket.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ResolutionRollup, Ticket
+from .sketches import QuantileSketch
+
+RESOLUTION_FIELDS = ('company_id', 'priority', 'created_at', 'resolved_at')
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def resolution_entry(company_id, priority, created_at, resolved_at):
+    """
+    Return ``(day, company_id, priority, seconds)`` for a resolved ticket,
+    or ``None`` if it does not count towards any rollup.
+    """
+    if resolved_at is None or created_at is None:
+        return None
+    seconds = max((resolved_at - created_at).total_seconds(), 0.0)
+    return timezone.localdate(resolved_at), company_id, priority, seconds
+
+
+def record_resolution_changes(changes):
+    """Apply ``(old_entry, new_entry)`` pairs to the rollup table."""
+    deltas = defaultdict(lambda: [0, 0.0, QuantileSketch()])
+    for old, new in changes:
+        if old == new:
+            continue
+        for entry, weight in ((old, -1), (new, 1)):
+            if entry is None:
+                continue
+            day, company_id, priority, seconds = entry
+            delta = deltas[day, company_id, priority]
+            delta[0] += weight
+            delta[1] += weight * seconds
+            delta[2].add(seconds, weight)
+    if deltas:
+        apply_rollup_deltas(deltas)
+
+
+def apply_rollup_deltas(deltas, retries=3):
+    """
+    Merge ``{(day, company_id, priority): [count, total_seconds, sketch]}``
+    into the rollup rows, creating and deleting rows as needed.
+    """
+    for attempt in range(retries):
+        try:
+            with transaction.atomic():
+                _apply(deltas)
+            return
+        except IntegrityError:
+            # Another writer created one of the rows first; merge into it.
+            if attempt == retries - 1:
+                raise
+
+
+def _apply(deltas):
+    keys = list(deltas)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        existing = {
+            (row.day, row.company_id, row.priority): row
+            for row in ResolutionRollup.objects.select_for_update().filter(
+                day__in={day for day, _, _ in chunk},
+                company_id__in={company_id for _, company_id, _ in chunk},
+                priority__in={priority for _, _, priority in chunk},
+            )
+        }
+        created, updated, deleted = [], [], []
+        for key in chunk:
+            count, total, sketch = deltas[key]
+            row = existing.get(key)
+            if row is None:
+                if count > 0:
+                    created.append(ResolutionRollup(
+                        day=key[0], company_id=key[1], priority=key[2],
+                        count=count, total_seconds=total, sketch=sketch.to_dict(),
+                    ))
+                continue
+            merged = QuantileSketch.from_dict(row.sketch)
+            merged.merge(sketch)
+            row.count += count
+            row.total_seconds += total
+            row.sketch = merged.to_dict()
+            (updated if row.count > 0 else deleted).append(row)
+        if created:
+            ResolutionRollup.objects.bulk_create(created)
+        if updated:
+            ResolutionRollup.objects.bulk_update(updated, ['count', 'total_seconds', 'sketch'])
+        if deleted:
+            ResolutionRollup.objects.filter(pk__in=[row.pk for row in deleted]).delete()
+
+
+def resolution_entries(ticket_ids):
+    """Return ``{ticket_id: entry}`` for the resolved tickets among ``ticket_ids``."""
+    ticket_ids = list(ticket_ids)
+    entries = {}
+    for start in range(0, len(ticket_ids), 500):
+        rows = Ticket.objects.filter(
+            pk__in=ticket_ids[start:start + 500], resolved_at__isnull=False
+        ).order_by().values_list('pk', *RESOLUTION_FIELDS)
+        for pk, *values in rows:
+            entries[pk] = resolution_entry(*values)
+    return entries
+
+
+def resolution_report(since=None, until=None, company_id=None, group_by=('priority',)):
+    """
+    Time-to-resolution statistics for tickets resolved between ``since``
+    and ``until`` (inclusive dates), grouped by any of ``company``,
+    ``priority`` and ``month``. Times are in seconds.
+    """
+    rows = ResolutionRollup.objects.order_by()
+    if since:
+        rows = rows.filter(day__gte=since)
+    if until:
+        rows = rows.filter(day__lte=until)
+    if company_id:
+        rows = rows.filter(company_id=company_id)
+
+    groups = defaultdict(lambda: [0, 0.0, QuantileSketch()])
+    for day, row_company_id, priority, count, total, sketch in rows.values_list(
+        'day', 'company_id', 'priority', 'count', 'total_seconds', 'sketch'
+    ).iterator():
+        values = {'company': row_company_id, 'priority': priority, 'month': day.strftime('%Y-%m')}
+        group = groups[tuple(values[name] for name in group_by)]
+        group[0] += count
+        group[1] += total
+        group[2].merge(QuantileSketch.from_dict(sketch))
+
+    report = []
+    for key in sorted(groups, key=lambda k: tuple(str(part) for part in k)):
+        count, total, sketch = groups[key]
+        line = dict(zip(group_by, key))
+        line['count'] = count
+        line['mean_seconds'] = total / count if count else None
+        for q in QUANTILES:
+            line[f'p{round(q * 100)}_seconds'] = sketch.quantile(q)
+        report.append(line)
+    return report
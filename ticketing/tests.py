@@ -1,8 +1,33 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
-from .models import Ticket
+from django.utils.http import http_date
+from .models import (
+    AttachmentBlob, ResolutionRollup, Ticket, TicketAttachment, TicketComment, TicketLSHBucket, TicketSignature,
+)
+from .analytics import run_reports
+from .similarity import BANDS, find_duplicates
+from .sketches import QuantileSketch
+from .sla import resolution_report
 from companies.models import Company
 from accounts.models import CustomUser
+from ticket_system import cache as ticket_cache
+from ticket_system.pagination import CappedCountPaginator
 
 
 class TicketModelTest(TestCase):
@@ -97,3 +122,899 @@ class TicketModelTest(TestCase):
         tickets = Ticket.objects.all()
         self.assertEqual(tickets[0], ticket2)
         self.assertEqual(tickets[1], ticket1)
+
+
+class TicketAttachmentTest(TestCase):
+    """Tests for attachment upload, deduplication and download."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.storage = tempfile.mkdtemp()
+        self.settings_override = override_settings(TICKET_ATTACHMENT_ROOT=self.storage)
+        self.settings_override.enable()
+        self.company = Company.objects.create(name='Test Company')
+        self.other_company = Company.objects.create(name='Other Company')
+        self.support = CustomUser.objects.create_user(
+            email='support@example.com',
+            password='test123',
+            first_name='Support',
+            last_name='User',
+            role=CustomUser.SUPPORT
+        )
+        self.viewer = CustomUser.objects.create_user(
+            email='viewer@example.com',
+            password='test123',
+            first_name='Viewer',
+            last_name='User',
+            company=self.company,
+            role=CustomUser.ACCOUNT_VIEWER
+        )
+        self.ticket = Ticket.objects.create(
+            title='Crash', description='Crashes on upload', company=self.company
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.storage, ignore_errors=True)
+
+    def upload(self, ticket, content, name='log.txt'):
+        return self.client.post(
+            reverse('ticketing:upload_attachment', args=[ticket.pk]),
+            {'file': SimpleUploadedFile(name, content, content_type='text/plain')},
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        """Test that the same content is stored once."""
+        other_ticket = Ticket.objects.create(
+            title='Crash again', description='Same log', company=self.company
+        )
+        self.client.force_login(self.support)
+        self.assertEqual(self.upload(self.ticket, b'same bytes').status_code, 201)
+        self.assertEqual(self.upload(other_ticket, b'same bytes').status_code, 201)
+        self.assertEqual(TicketAttachment.objects.count(), 2)
+        self.assertEqual(AttachmentBlob.objects.count(), 1)
+
+    def test_raw_body_upload(self):
+        """Test uploading a raw request body."""
+        self.client.force_login(self.support)
+        response = self.client.post(
+            reverse('ticketing:upload_attachment', args=[self.ticket.pk]) + '?filename=dump.bin',
+            data=b'\x00\x01\x02',
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['size'], 3)
+
+    def test_viewer_cannot_upload(self):
+        """Test that read-only roles cannot attach files."""
+        self.client.force_login(self.viewer)
+        self.assertEqual(self.upload(self.ticket, b'data').status_code, 403)
+
+    def test_ranged_download(self):
+        """Test that Range requests return partial content."""
+        self.client.force_login(self.support)
+        self.upload(self.ticket, b'0123456789')
+        attachment = TicketAttachment.objects.get()
+        url = reverse('ticketing:download_attachment', args=[attachment.pk])
+
+        self.client.force_login(self.viewer)
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_download_requires_company_access(self):
+        """Test that users cannot download other companies' attachments."""
+        other_ticket = Ticket.objects.create(
+            title='Other', description='Other company', company=self.other_company
+        )
+        self.client.force_login(self.support)
+        self.upload(other_ticket, b'secret')
+        attachment = TicketAttachment.objects.get()
+
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse('ticketing:download_attachment', args=[attachment.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_prune_removes_only_orphaned_blobs(self):
+        """Test that pruning deletes unattached blobs and their files, and re-uploads restore them."""
+        self.client.force_login(self.support)
+        self.upload(self.ticket, b'kept')
+        self.upload(self.ticket, b'orphan')
+        orphan = TicketAttachment.objects.get(blob__size=6)
+        blob = orphan.blob
+        orphan.delete()
+
+        out = StringIO()
+        call_command('prune_attachments', stdout=out)
+        self.assertIn('Removed 1 blob(s), 6 bytes', out.getvalue())
+        self.assertFalse(AttachmentBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(blob.path.exists())
+        self.assertEqual(list(blob.path.parent.iterdir()), [])
+        self.assertTrue(TicketAttachment.objects.get().blob.path.exists())
+
+        self.upload(self.ticket, b'orphan')
+        self.assertTrue(AttachmentBlob.objects.get(sha256=blob.sha256).path.exists())
+
+    def test_prune_skips_blobs_attached_again(self):
+        """Test that a blob referenced after the orphan query is kept with its file."""
+        self.client.force_login(self.support)
+        self.upload(self.ticket, b'attached')
+        blob = AttachmentBlob.objects.get()
+
+        out = StringIO()
+        with mock.patch(
+            'ticketing.management.commands.prune_attachments.orphaned_blobs',
+            return_value=AttachmentBlob.objects.all(),
+        ):
+            call_command('prune_attachments', stdout=out)
+        self.assertIn('Removed 0 blob(s), 0 bytes; skipped 1 attached again meanwhile', out.getvalue())
+        self.assertTrue(AttachmentBlob.objects.filter(pk=blob.pk).exists())
+        self.assertTrue(blob.path.exists())
+
+class TicketCommentTest(TestCase):
+    """Tests for threaded comments and their denormalized counters."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Test Company')
+        self.support = CustomUser.objects.create_user(
+            email='support@example.com',
+            password='test123',
+            first_name='Support',
+            last_name='User',
+            role=CustomUser.SUPPORT
+        )
+        self.ticket = Ticket.objects.create(
+            title='Login Issue', description='Cannot login', company=self.company
+        )
+
+    def add_comments(self, n):
+        return [
+            TicketComment.objects.create(ticket=self.ticket, author=self.support, body=f'Comment {i}')
+            for i in range(n)
+        ]
+
+    def test_comment_count_maintained(self):
+        """Test that comment_count and last_activity_at follow writes."""
+        comments = self.add_comments(3)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.comment_count, 3)
+        self.assertEqual(self.ticket.last_activity_at, comments[-1].created_at)
+
+        comments[0].delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.comment_count, 2)
+
+        TicketComment.objects.filter(ticket=self.ticket).delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.comment_count, 0)
+
+    def test_deleting_parent_recounts_replies(self):
+        """Test that cascaded reply deletion is reflected in the count."""
+        parent = TicketComment.objects.create(ticket=self.ticket, body='Question')
+        TicketComment.objects.create(ticket=self.ticket, parent=parent, body='Answer')
+        parent.delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.comment_count, 0)
+
+    def test_keyset_pagination(self):
+        """Test walking a thread page by page."""
+        comments = self.add_comments(5)
+        page, cursor = TicketComment.objects.filter(ticket=self.ticket).keyset_page(limit=2)
+        self.assertEqual(page, comments[:2])
+        page, cursor = TicketComment.objects.filter(ticket=self.ticket).keyset_page(cursor=cursor, limit=2)
+        self.assertEqual(page, comments[2:4])
+        page, cursor = TicketComment.objects.filter(ticket=self.ticket).keyset_page(cursor=cursor, limit=2)
+        self.assertEqual(page, comments[4:])
+        self.assertIsNone(cursor)
+
+    def test_reply_must_share_ticket(self):
+        """Test that a reply cannot point at another ticket's comment."""
+        other = Ticket.objects.create(title='Other', description='Other', company=self.company)
+        parent = TicketComment.objects.create(ticket=other, body='Elsewhere')
+        reply = TicketComment(ticket=self.ticket, parent=parent, body='Reply')
+        with self.assertRaises(ValidationError):
+            reply.full_clean()
+
+    def test_comments_endpoint(self):
+        """Test posting and paging comments over HTTP."""
+        self.client.force_login(self.support)
+        url = reverse('ticketing:ticket_comments', args=[self.ticket.pk])
+        for i in range(3):
+            self.assertEqual(self.client.post(url, {'body': f'Note {i}'}).status_code, 201)
+
+        data = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([c['body'] for c in data['results']], ['Note 0', 'Note 1'])
+        data = self.client.get(url, {'limit': 2, 'cursor': data['next_cursor']}).json()
+        self.assertEqual([c['body'] for c in data['results']], ['Note 2'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_parent_rejected(self):
+        """Test that a malformed or unknown parent id is a 400, not a server error."""
+        self.client.force_login(self.support)
+        url = reverse('ticketing:ticket_comments', args=[self.ticket.pk])
+        self.assertEqual(self.client.post(url, {'body': 'Hi', 'parent': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'body': 'Hi', 'parent': '999999'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'body': 'Hi', 'parent': '9' * 30}).status_code, 400)
+
+    def test_out_of_range_cursor_rejected(self):
+        """Test that cursors too large for a datetime or an id are a 400, not a server error."""
+        self.client.force_login(self.support)
+        for url in (reverse('ticketing:ticket_comments', args=[self.ticket.pk]), reverse('ticketing:api_ticket_list')):
+            for cursor in ('99999999999999999999.1', '0.99999999999999999999', '0.-1'):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400)
+
+    def test_deleting_newest_comment_moves_activity_back(self):
+        """Test that last_activity_at falls back to the remaining comments, then to created_at."""
+        comments = self.add_comments(2)
+        comments[1].delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.last_activity_at, comments[0].created_at)
+        comments[0].delete()
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.last_activity_at, self.ticket.created_at)
+
+
+class CacheLayerTest(TestCase):
+    """Tests for the versioned ticket and company cache."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        ticket_cache.stats.reset()
+        self.company = Company.objects.create(name='Test Company')
+        self.user = CustomUser.objects.create_user(
+            email='user@example.com',
+            password='test123',
+            first_name='Test',
+            last_name='User',
+            company=self.company
+        )
+        self.ticket = Ticket.objects.create(
+            title='Login Issue', description='Cannot login', company=self.company, created_by=self.user
+        )
+
+    def company_tickets(self, company_id, status=None):
+        """A per-company list cached the way views cache theirs."""
+        def render():
+            queryset = Ticket.objects.filter(company_id=company_id).select_related('created_by')
+            if status:
+                queryset = queryset.filter(status=status)
+            return list(queryset)
+        return ticket_cache.cached_fragment(f'tickets:{status}', company_id, render)
+
+    def test_repeated_reads_hit_cache(self):
+        """Test that a second read does not query the database."""
+        self.company_tickets(self.company.pk)
+        ticket_cache.get_company(self.company.pk)
+        with self.assertNumQueries(0):
+            tickets = self.company_tickets(self.company.pk)
+            company = ticket_cache.get_company(self.company.pk)
+        self.assertEqual(tickets, [self.ticket])
+        self.assertEqual(company, self.company)
+        self.assertEqual(ticket_cache.stats.hits, 2)
+
+    def test_ticket_save_invalidates_list(self):
+        """Test that saving a ticket invalidates its company's list."""
+        self.company_tickets(self.company.pk)
+        self.ticket.title = 'Renamed'
+        self.ticket.save()
+        self.assertEqual(self.company_tickets(self.company.pk)[0].title, 'Renamed')
+
+    def test_ticket_move_invalidates_both_companies(self):
+        """Test that moving a ticket invalidates the old and new company."""
+        other = Company.objects.create(name='Other Company')
+        self.company_tickets(self.company.pk)
+        self.company_tickets(other.pk)
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.company = other
+        ticket.save()
+        self.assertEqual(self.company_tickets(self.company.pk), [])
+        self.assertEqual(self.company_tickets(other.pk), [ticket])
+
+    def test_bulk_update_invalidates_list(self):
+        """Test that queryset updates invalidate cached lists."""
+        self.company_tickets(self.company.pk, status=Ticket.STATUS_OPEN)
+        Ticket.objects.filter(company=self.company).update(status=Ticket.STATUS_CLOSED)
+        self.assertEqual(self.company_tickets(self.company.pk, status=Ticket.STATUS_OPEN), [])
+
+    def test_company_and_user_changes_invalidate(self):
+        """Test that company and user writes invalidate dependent entries."""
+        version = ticket_cache.namespace_version(ticket_cache.COMPANIES)
+        Company.objects.filter(pk=self.company.pk).update(is_active=False)
+        self.assertNotEqual(ticket_cache.namespace_version(ticket_cache.COMPANIES), version)
+
+        self.company_tickets(self.company.pk)
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(self.company_tickets(self.company.pk)[0].created_by.first_name, 'Changed')
+
+    def test_version_bumped_again_on_commit(self):
+        """Test that entries cached by a reader before the write commits are dropped on commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.filter(pk=self.ticket.pk).update(title='Renamed')
+            # A concurrent reader still sees the committed rows at this point.
+            ticket_cache.cached_fragment('tickets:None', self.company.pk, lambda: [self.ticket])
+        self.assertEqual(self.company_tickets(self.company.pk)[0].title, 'Renamed')
+
+    def test_cached_fragment(self):
+        """Test that fragments are rendered once per company version."""
+        calls = []
+
+        def render():
+            calls.append(1)
+            return '<p>fragment</p>'
+
+        ticket_cache.cached_fragment('summary', self.company.pk, render)
+        ticket_cache.cached_fragment('summary', self.company.pk, render)
+        self.assertEqual(len(calls), 1)
+        Ticket.objects.create(title='New', description='New', company=self.company)
+        ticket_cache.cached_fragment('summary', self.company.pk, render)
+        self.assertEqual(len(calls), 2)
+
+    def test_company_ticket_list_served_from_cache(self):
+        """Test that a repeated company-scoped list request reads no tickets and edits show up."""
+        self.client.force_login(self.user)
+        url = reverse('ticketing:api_ticket_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['title'], 'Login Issue')
+        self.assertFalse([q for q in queries.captured_queries if 'ticketing_ticket' in q['sql']])
+
+        Ticket.objects.filter(pk=self.ticket.pk).update(title='Renamed')
+        self.assertEqual(self.client.get(url).json()['results'][0]['title'], 'Renamed')
+
+
+class TicketChangelistTest(TestCase):
+    """Tests for the large-table ticket changelist."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.company = Company.objects.create(name='Tech Corp')
+        self.other = Company.objects.create(name='Business Solutions Inc')
+        Ticket.objects.bulk_create(
+            [Ticket(title=f'Ticket {i}', description='Bulk', company=self.company) for i in range(30)]
+            + [Ticket(title='Other', description='Bulk', company=self.other)]
+        )
+        self.admin = CustomUser.objects.create_superuser(
+            email='admin@example.com', password='admin123', first_name='Admin', last_name='User'
+        )
+        self.client.force_login(self.admin)
+
+    def test_capped_count(self):
+        """Test that counting stops at the cap and estimates unfiltered totals."""
+        paginator = CappedCountPaginator(Ticket.objects.filter(company=self.company), 10)
+        paginator.count_cap = 20
+        self.assertEqual(paginator.count, 20)
+
+        paginator = CappedCountPaginator(Ticket.objects.all(), 10)
+        paginator.count_cap = 20
+        self.assertEqual(paginator.count, 31)
+        self.assertTrue(paginator.approximate)
+
+        paginator = CappedCountPaginator(Ticket.objects.filter(company=self.other), 10)
+        self.assertEqual(paginator.count, 1)
+        self.assertFalse(paginator.approximate)
+
+    def test_approximate_count_hides_last_page(self):
+        """Test that an estimated count does not link to a last page that may be empty."""
+        Ticket.objects.filter(pk__in=Ticket.objects.order_by('pk').values('pk')[5:25]).delete()
+        paginator = CappedCountPaginator(Ticket.objects.all(), 2)
+        paginator.count_cap = 5
+        self.assertEqual(paginator.num_pages, 16)
+        self.assertEqual(list(paginator.get_elided_page_range(1)), [1, 2, 3, 4, paginator.ELLIPSIS])
+        self.assertEqual(
+            list(paginator.get_elided_page_range(10)),
+            [1, 2, paginator.ELLIPSIS, 7, 8, 9, 10, 11, 12, 13, paginator.ELLIPSIS],
+        )
+
+    def test_company_filter_searches_lazily(self):
+        """Test that companies are only listed once a search term is given."""
+        url = reverse('admin:ticketing_ticket_changelist')
+        response = self.client.get(url)
+        self.assertNotContains(response, '?company__id__exact=')
+
+        response = self.client.get(url, {'company_q': 'busi'})
+        self.assertContains(response, f'?company__id__exact={self.other.pk}')
+        self.assertNotContains(response, f'?company__id__exact={self.company.pk}')
+
+        response = self.client.get(url, {'company__id__exact': self.other.pk})
+        self.assertEqual(list(response.context['cl'].result_list), list(Ticket.objects.filter(company=self.other)))
+
+    def test_invalid_company_filter_redirects(self):
+        """Test that a malformed company id is reported like other bad lookups, not a 500."""
+        url = reverse('admin:ticketing_ticket_changelist')
+        for value in ('abc', '9' * 30):
+            response = self.client.get(url, {'company__id__exact': value})
+            self.assertRedirects(response, f'{url}?e=1', fetch_redirect_response=False)
+
+    def test_date_hierarchy_without_distinct_scan(self):
+        """Test that the date hierarchy builds its links from MIN/MAX only."""
+        url = reverse('admin:ticketing_ticket_changelist')
+        year = timezone.localtime().year
+        response = self.client.get(url)
+        self.assertContains(response, f'?created_at__year={year}')
+        response = self.client.get(url, {'created_at__year': year})
+        self.assertContains(response, 'created_at__month=12')
+        self.assertEqual(response.context['cl'].result_count, 31)
+
+
+class ResolutionRollupTest(TestCase):
+    """Tests for resolved_at tracking and the SLA rollups."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='SLA Company', email='sla@company.com')
+        self.user = CustomUser.objects.create_user(
+            email='sla@example.com',
+            password='test123',
+            first_name='Sla',
+            last_name='User',
+            company=self.company
+        )
+
+    def _ticket(self, hours_ago, **kwargs):
+        ticket = Ticket.objects.create(
+            title='SLA', description='d', company=self.company, created_by=self.user, **kwargs
+        )
+        Ticket.objects.filter(pk=ticket.pk).update(
+            created_at=timezone.now() - datetime.timedelta(hours=hours_ago)
+        )
+        return Ticket.objects.get(pk=ticket.pk)
+
+    def test_resolved_at_follows_status(self):
+        """Test that resolving sets resolved_at and reopening clears it."""
+        ticket = self._ticket(2)
+        ticket.status = Ticket.STATUS_RESOLVED
+        ticket.save()
+        self.assertIsNotNone(ticket.resolved_at)
+        resolved_at = ticket.resolved_at
+
+        ticket.status = Ticket.STATUS_CLOSED
+        ticket.save(update_fields=['status'])
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).resolved_at, resolved_at)
+
+        ticket.status = Ticket.STATUS_OPEN
+        ticket.save(update_fields=['status'])
+        self.assertIsNone(Ticket.objects.get(pk=ticket.pk).resolved_at)
+
+    def test_rollup_updated_incrementally(self):
+        """Test that resolving and reopening tickets adjusts the daily rollup."""
+        first = self._ticket(2, priority=Ticket.PRIORITY_HIGH)
+        second = self._ticket(4, priority=Ticket.PRIORITY_HIGH)
+        for ticket in (first, second):
+            ticket.status = Ticket.STATUS_RESOLVED
+            ticket.save()
+
+        rollup = ResolutionRollup.objects.get(company=self.company, priority=Ticket.PRIORITY_HIGH)
+        self.assertEqual(rollup.count, 2)
+        self.assertAlmostEqual(rollup.mean_seconds / 3600, 3, places=1)
+
+        second.status = Ticket.STATUS_OPEN
+        second.save()
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.count, 1)
+
+        first.delete()
+        self.assertFalse(ResolutionRollup.objects.exists())
+
+    def test_bulk_update_moves_rollups(self):
+        """Test that queryset updates of status and priority keep rollups in step."""
+        for hours in (1, 2, 3):
+            self._ticket(hours)
+        Ticket.objects.filter(company=self.company).update(status=Ticket.STATUS_RESOLVED)
+        self.assertEqual(ResolutionRollup.objects.get().count, 3)
+        self.assertFalse(Ticket.objects.filter(resolved_at__isnull=True).exists())
+
+        Ticket.objects.filter(company=self.company).update(priority=Ticket.PRIORITY_URGENT)
+        rollup = ResolutionRollup.objects.get()
+        self.assertEqual((rollup.priority, rollup.count), (Ticket.PRIORITY_URGENT, 3))
+
+        Ticket.objects.filter(company=self.company).update(status=Ticket.STATUS_IN_PROGRESS)
+        self.assertFalse(ResolutionRollup.objects.exists())
+
+    def test_report_and_backfill(self):
+        """Test that the backfill rebuilds rollups the report reads."""
+        for hours in range(1, 11):
+            self._ticket(hours, status=Ticket.STATUS_RESOLVED)
+        incremental = resolution_report()
+
+        ResolutionRollup.objects.all().delete()
+        call_command('backfill_sla_rollups', batch_size=3, stdout=StringIO())
+        report = resolution_report()
+        self.assertEqual(report, incremental)
+        self.assertEqual(report[0]['count'], 10)
+        self.assertAlmostEqual(report[0]['p50_seconds'] / 3600, 5.5, delta=0.6)
+
+    def test_failed_backfill_keeps_old_rollups(self):
+        """Test that the backfill swaps the rollups in one transaction."""
+        for priority in (Ticket.PRIORITY_LOW, Ticket.PRIORITY_HIGH):
+            self._ticket(2, status=Ticket.STATUS_RESOLVED, priority=priority)
+        before = resolution_report()
+
+        with mock.patch(
+            'ticketing.management.commands.backfill_sla_rollups.apply_rollup_deltas',
+            side_effect=[None, RuntimeError('disk full')],
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command('backfill_sla_rollups', batch_size=1, max_groups=1, stdout=StringIO())
+        self.assertEqual(resolution_report(), before)
+
+    def test_sketch_merge_and_quantiles(self):
+        """Test that merged sketches answer quantiles within the relative accuracy."""
+        left, right = QuantileSketch(), QuantileSketch()
+        for value in range(1, 501):
+            left.add(value)
+        for value in range(501, 1001):
+            right.add(value)
+        left.merge(right)
+        self.assertEqual(left.count, 1000)
+        self.assertAlmostEqual(left.quantile(0.9), 900, delta=900 * 0.02)
+        right.merge(right.from_dict(right.to_dict()), weight=-1)
+        self.assertEqual(right.count, 0)
+
+
+class TicketAnalyticsTest(TestCase):
+    """Tests for the vectorised ticket analytics."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Analytics Company', email='analytics@company.com')
+        self.agent = CustomUser.objects.create_user(
+            email='agent@example.com',
+            password='test123',
+            first_name='Agent',
+            last_name='User',
+            role=CustomUser.SUPPORT,
+            company=self.company
+        )
+        created_at = timezone.now() - datetime.timedelta(hours=10)
+        for priority, status in [
+            (Ticket.PRIORITY_HIGH, Ticket.STATUS_OPEN),
+            (Ticket.PRIORITY_HIGH, Ticket.STATUS_RESOLVED),
+            (Ticket.PRIORITY_LOW, Ticket.STATUS_CLOSED),
+            (Ticket.PRIORITY_LOW, Ticket.STATUS_IN_PROGRESS),
+        ]:
+            Ticket.objects.create(
+                title='A', description='d', company=self.company, assigned_to=self.agent,
+                priority=priority, status=status
+            )
+        Ticket.objects.update(created_at=created_at)
+
+    def test_reopen_count(self):
+        """Test that reopening through save and update increments reopen_count."""
+        ticket = Ticket.objects.get(status=Ticket.STATUS_RESOLVED)
+        ticket.status = Ticket.STATUS_OPEN
+        ticket.save()
+        self.assertEqual(ticket.reopen_count, 1)
+
+        Ticket.objects.update(status=Ticket.STATUS_RESOLVED)
+        Ticket.objects.update(status=Ticket.STATUS_OPEN)
+        self.assertEqual(sorted(Ticket.objects.values_list('reopen_count', flat=True)), [1, 1, 1, 2])
+
+    def test_reports(self):
+        """Test backlog age, throughput and reopen rate results."""
+        ticket = Ticket.objects.get(status=Ticket.STATUS_CLOSED)
+        ticket.status = Ticket.STATUS_OPEN
+        ticket.save()
+
+        results = run_reports(chunk_size=2)
+        backlog = {row['priority']: row for row in results['backlog_age']}
+        self.assertEqual(backlog['high']['open'], 1)
+        self.assertEqual(backlog['low']['open'], 2)
+        self.assertEqual(backlog['low']['age_8-24h'], 2)
+
+        agent = results['agent_throughput'][0]
+        self.assertEqual((agent['email'], agent['assigned'], agent['resolved']), ('agent@example.com', 4, 1))
+        self.assertAlmostEqual(agent['mean_resolution_hours'], 10, delta=0.1)
+
+        rates = {row['key']: row for row in results['reopen_rates'] if row['dimension'] == 'priority'}
+        self.assertEqual(rates['low']['reopen_rate'], 1.0)
+        self.assertEqual(rates['high']['reopen_rate'], 0.0)
+        self.assertEqual(sum(row['created'] for row in results['arrivals_by_hour']), 4)
+        self.assertEqual(sum(row['created'] for row in results['arrival_series']), 4)
+
+    def test_command_output(self):
+        """Test JSON and CSV output of the ticket_analytics command."""
+        out = StringIO()
+        call_command('ticket_analytics', 'backlog_age', stdout=out)
+        self.assertEqual(sum(row['open'] for row in json.loads(out.getvalue())['backlog_age']), 2)
+
+        out = StringIO()
+        call_command('ticket_analytics', 'arrival_series', '--format', 'csv', '--bucket', 'month', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(rows[0]['report'], 'arrival_series')
+        self.assertTrue(rows[0]['period'].endswith('-01'))
+
+
+class TicketReadAPITest(TestCase):
+    """Tests for the conditional ticket read endpoints."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='API Company')
+        self.other = Company.objects.create(name='Other Company')
+        self.viewer = CustomUser.objects.create_user(
+            email='viewer@example.com',
+            password='test123',
+            first_name='View',
+            last_name='Er',
+            company=self.company
+        )
+        self.tickets = [
+            Ticket.objects.create(title=f'T{i}', description='d', company=self.company) for i in range(3)
+        ]
+        self.hidden = Ticket.objects.create(title='Hidden', description='d', company=self.other)
+        self.client.force_login(self.viewer)
+
+    def test_detail_not_modified(self):
+        """Test that an unchanged ticket answers 304 with a single ticket query."""
+        url = reverse('ticketing:api_ticket_detail', args=[self.tickets[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['title'], 'T0')
+        etag = response['ETag']
+
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        # Session, user and the ticket's updated_at.
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Ticket.objects.filter(pk=self.tickets[0].pk).update(status=Ticket.STATUS_IN_PROGRESS)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_scoped_to_company(self):
+        """Test that other companies' tickets are forbidden."""
+        response = self.client.get(reverse('ticketing:api_ticket_detail', args=[self.hidden.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_etag_tracks_page(self):
+        """Test that the list ETag changes when a ticket on the page changes."""
+        url = reverse('ticketing:api_ticket_list')
+        response = self.client.get(url, {'limit': 2})
+        data = response.json()
+        self.assertEqual([t['title'] for t in data['results']], ['T2', 'T1'])
+        etag = response['ETag']
+
+        response = self.client.get(url, {'limit': 2, 'cursor': data['next_cursor']})
+        self.assertEqual([t['title'] for t in response.json()['results']], ['T0'])
+
+        self.assertEqual(self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        TicketComment.objects.create(ticket=self.tickets[1], body='Ping')
+        self.assertEqual(self.client.get(url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_has_no_last_modified(self):
+        """Test that a deletion is not hidden behind If-Modified-Since."""
+        url = reverse('ticketing:api_ticket_list')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(time.time() + 60)
+        self.tickets[0].delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_sparse_fields(self):
+        """Test that ?fields= selects only the requested columns in constant queries."""
+        url = reverse('ticketing:api_ticket_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,title,company.name,attachments.filename'})
+        results = response.json()['results']
+        self.assertEqual(results[0], {'id': self.tickets[2].pk, 'title': 'T2',
+                                      'company': {'name': 'API Company'},
+                                      'attachments': []})
+        ticket_sql = [q['sql'] for q in queries.captured_queries if 'ticketing_ticket"."title' in q['sql']]
+        self.assertEqual(len(ticket_sql), 1)
+        self.assertNotIn('description', ticket_sql[0])
+        # Session and user, plus the four queries of the page itself.
+        self.assertEqual(len(queries), 6)
+
+        Ticket.objects.create(title='T3', description='d', company=self.company)
+        with self.assertNumQueries(6):
+            self.client.get(url, {'fields': 'id,title,company.name,attachments.filename'})
+
+    def test_unknown_field_rejected(self):
+        """Test that unknown fields are a 400 error."""
+        url = reverse('ticketing:api_ticket_detail', args=[self.tickets[0].pk])
+        self.assertEqual(self.client.get(url, {'fields': 'id,password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'fields': 'created_by.password'}).status_code, 400)
+
+
+class TicketBatchTest(TestCase):
+    """Tests for the batch write endpoint."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Batch Company')
+        self.support = CustomUser.objects.create_user(
+            email='batch@example.com',
+            password='test123',
+            first_name='Batch',
+            last_name='User',
+            role=CustomUser.SUPPORT
+        )
+        self.tickets = [
+            Ticket.objects.create(title=f'B{i}', description='d', company=self.company) for i in range(6)
+        ]
+        self.url = reverse('ticketing:api_ticket_batch')
+        self.client.force_login(self.support)
+
+    def post(self, operations, **extra):
+        return self.client.post(
+            self.url, json.dumps({'operations': operations, **extra}), content_type='application/json'
+        )
+
+    def test_boolean_ids_rejected(self):
+        """Test that JSON true/false are not taken as ids 1 and 0."""
+        response = self.post([
+            {'op': 'create', 'data': {'title': 'X', 'description': 'd', 'company': True}},
+            {'op': 'update', 'id': True, 'data': {'status': Ticket.STATUS_CLOSED}},
+            {'op': 'update', 'id': self.tickets[0].pk, 'data': {'assigned_to': True}},
+        ])
+        errors = [result['errors'] for result in response.json()['results']]
+        self.assertEqual(errors, [
+            {'company': ['No such company.']},
+            {'id': ['No such ticket.']},
+            {'assigned_to': ['No such assigned to.']},
+        ])
+
+    def test_grouped_updates_and_creates(self):
+        """Test that updates are grouped into a few statements and creates are applied."""
+        operations = [
+            {'op': 'update', 'id': ticket.pk, 'data': {'status': Ticket.STATUS_RESOLVED}}
+            for ticket in self.tickets[:4]
+        ] + [
+            {'op': 'update', 'id': ticket.pk, 'data': {'title': f'Renamed {ticket.pk}'}}
+            for ticket in self.tickets[4:]
+        ] + [
+            {'op': 'create', 'data': {'title': 'New', 'description': 'd', 'company': self.company.pk}},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(operations)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertTrue(all(result['status'] == 'ok' for result in results))
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "ticketing_ticket"')]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(Ticket.objects.filter(status=Ticket.STATUS_RESOLVED, resolved_at__isnull=False).count(), 4)
+        self.assertEqual(ResolutionRollup.objects.get().count, 4)
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[5].pk).title, f'Renamed {self.tickets[5].pk}')
+        created = Ticket.objects.get(pk=results[-1]['id'])
+        self.assertEqual(created.created_by, self.support)
+
+    def test_per_item_errors(self):
+        """Test that invalid operations are reported while valid ones apply."""
+        response = self.post([
+            {'op': 'update', 'id': self.tickets[0].pk, 'data': {'status': 'bogus'}},
+            {'op': 'update', 'id': 999999, 'data': {'priority': Ticket.PRIORITY_LOW}},
+            {'op': 'update', 'id': self.tickets[1].pk, 'data': {'priority': Ticket.PRIORITY_LOW}},
+        ])
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['error', 'error', 'ok'])
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[1].pk).priority, Ticket.PRIORITY_LOW)
+
+    def test_atomic_batch_rejected(self):
+        """Test that an atomic batch with an invalid operation writes nothing."""
+        response = self.post([
+            {'op': 'update', 'id': self.tickets[0].pk, 'data': {'priority': Ticket.PRIORITY_LOW}},
+            {'op': 'create', 'data': {'title': 'Missing company', 'description': 'd'}},
+        ], atomic=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'][0]['status'], 'skipped')
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[0].pk).priority, Ticket.PRIORITY_MEDIUM)
+
+    def test_requires_edit_permission(self):
+        """Test that users who cannot edit tickets are refused."""
+        viewer = CustomUser.objects.create_user(
+            email='viewer@example.com', password='test123', first_name='V', last_name='V', company=self.company
+        )
+        self.client.force_login(viewer)
+        self.assertEqual(self.post([]).status_code, 403)
+
+
+class DuplicateDetectionTest(TestCase):
+    """Tests for the near-duplicate index, API and merge action."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.company = Company.objects.create(name='Dup Company')
+        self.other_company = Company.objects.create(name='Other Dup Company')
+        self.support = CustomUser.objects.create_superuser(
+            email='dup@example.com',
+            password='test123',
+            first_name='Dup',
+            last_name='User',
+        )
+        text = 'The office printer on the second floor keeps jamming when printing double sided pages'
+        self.original = Ticket.objects.create(title='Printer jams', description=text, company=self.company)
+        self.duplicate = Ticket.objects.create(
+            title='Printer jam', description=text + ' again', company=self.company
+        )
+        self.unrelated = Ticket.objects.create(
+            title='VPN login fails', description='Cannot connect to the VPN from home since the update',
+            company=self.company,
+        )
+        self.elsewhere = Ticket.objects.create(title='Printer jams', description=text, company=self.other_company)
+        self.client.force_login(self.support)
+
+    def test_index_maintained_on_save(self):
+        """Test that creating and editing tickets keeps their signatures and buckets current."""
+        self.assertEqual(TicketSignature.objects.count(), 4)
+        self.assertEqual(TicketLSHBucket.objects.filter(ticket=self.original).count(), BANDS)
+        self.assertEqual([pk for pk, _ in find_duplicates(self.original)], [self.duplicate.pk])
+
+        self.unrelated.description = self.original.description
+        self.unrelated.title = self.original.title
+        self.unrelated.save()
+        self.assertIn(self.unrelated.pk, [pk for pk, _ in find_duplicates(self.original)])
+
+    def test_index_maintained_on_queryset_update(self):
+        """Test that queryset updates of the text or company re-index the tickets."""
+        Ticket.objects.filter(pk=self.elsewhere.pk).update(company=self.company)
+        self.assertIn(self.elsewhere.pk, [pk for pk, _ in find_duplicates(self.original)])
+        Ticket.objects.filter(pk=self.duplicate.pk).update(title='Other', description='Something else entirely')
+        self.assertNotIn(self.duplicate.pk, [pk for pk, _ in find_duplicates(self.original)])
+
+    def test_duplicates_api(self):
+        """Test that the API returns same-company duplicates only, best first."""
+        url = reverse('ticketing:api_ticket_duplicates', args=[self.original.pk])
+        results = self.client.get(url).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.duplicate.pk])
+        self.assertGreater(results[0]['similarity'], 0.5)
+        self.assertEqual(self.client.get(url, {'threshold': 'x'}).status_code, 400)
+
+        viewer = CustomUser.objects.create_user(
+            email='dupviewer@example.com', password='test123', first_name='V', last_name='V',
+            company=self.other_company,
+        )
+        self.client.force_login(viewer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_merge_action(self):
+        """Test that the admin action merges selected tickets into the oldest."""
+        change_page = self.client.get(reverse('admin:ticketing_ticket_change', args=[self.original.pk]))
+        self.assertContains(change_page, f'#{self.duplicate.pk} Printer jam')
+        TicketComment.objects.create(ticket=self.duplicate, author=self.support, body='Same here')
+        response = self.client.post(reverse('admin:ticketing_ticket_changelist'), {
+            'action': 'merge_duplicates',
+            '_selected_action': [self.original.pk, self.duplicate.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.duplicate.refresh_from_db()
+        self.original.refresh_from_db()
+        self.assertEqual(self.duplicate.duplicate_of, self.original)
+        self.assertEqual(self.duplicate.status, Ticket.STATUS_CLOSED)
+        self.assertEqual(self.original.comment_count, 1)
+        self.assertEqual(self.original.comments.get().body, 'Same here')
+
+    def test_merge_refuses_mixed_companies(self):
+        """Test that tickets of different companies are not merged."""
+        self.client.post(reverse('admin:ticketing_ticket_changelist'), {
+            'action': 'merge_duplicates',
+            '_selected_action': [self.original.pk, self.elsewhere.pk],
+        })
+        self.elsewhere.refresh_from_db()
+        self.assertIsNone(self.elsewhere.duplicate_of)
+
+    def test_index_duplicates_command(self):
+        """Test that the rebuild command recreates a missing index."""
+        TicketLSHBucket.objects.all().delete()
+        TicketSignature.objects.all().delete()
+        call_command('index_duplicates', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(TicketSignature.objects.count(), 4)
+        self.assertEqual([pk for pk, _ in find_duplicates(self.original)], [self.duplicate.pk])
@@ -0,0 +1,14 @@
+from django.urls import path
+from . import views
+
+app_name = 'ticketing'
+
+urlpatterns = [
+    path('api/tickets/', views.ticket_list, name='api_ticket_list'),
+    path('api/tickets/batch/', views.ticket_batch, name='api_ticket_batch'),
+    path('api/tickets/<int:ticket_id>/', views.ticket_detail, name='api_ticket_detail'),
+    path('api/tickets/<int:ticket_id>/duplicates/', views.ticket_duplicates, name='api_ticket_duplicates'),
+    path('tickets/<int:ticket_id>/attachments/', views.upload_attachment, name='upload_attachment'),
+    path('tickets/<int:ticket_id>/comments/', views.ticket_comments, name='ticket_comments'),
+    path('attachments/<int:attachment_id>/download/', views.download_attachment, name='download_attachment'),
+]
@@ -1,3 +1,378 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from ticket_system.cache import USERS, cached_fragment, namespace_version
+from ticket_system.http import make_etag, not_modified, set_validators
+from .attachments import attach_file, iter_file_range, parse_range
+from .batch import apply_batch, max_operations
+from .fieldsets import TICKET_FIELDS, USER_RELATIONS
+from .models import MAX_ID, Ticket, TicketAttachment, TicketComment
+from .similarity import DEFAULT_THRESHOLD, find_duplicates
+
+
+@login_required
+@require_POST
+def upload_attachment(request, ticket_id):
+    """
+    Attach a file to a ticket.
+
+    Accepts either a multipart form with a ``file`` field or a raw request
+    body with the name in ``?filename=``. Both are streamed to disk in chunks.
+    """
+    ticket = get_object_or_404(Ticket, pk=ticket_id)
+    if not (request.user.can_edit_tickets() and request.user.can_view_ticket(ticket)):
+        raise PermissionDenied
+
+    if request.content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'error': 'No file was submitted.'}, status=400)
+        attachment = attach_file(
+            ticket, upload, upload.name,
+            content_type=upload.content_type or '',
+            uploaded_by=request.user,
+        )
+    else:
+        filename = request.GET.get('filename')
+        if not filename:
+            return JsonResponse({'error': 'The filename parameter is required.'}, status=400)
+        attachment = attach_file(
+            ticket, request, filename,
+            content_type=request.content_type or '',
+            uploaded_by=request.user,
+        )
+
+    return JsonResponse({
+        'id': attachment.pk,
+        'filename': attachment.filename,
+        'size': attachment.blob.size,
+        'sha256': attachment.blob.sha256,
+    }, status=201)
+
+
+@login_required
+@require_GET
+def download_attachment(request, attachment_id):
+    """Stream an attachment, honouring single-range ``Range`` requests."""
+    attachment = get_object_or_404(
+        TicketAttachment.objects.select_related('ticket', 'blob'),
+        pk=attachment_id,
+    )
+    if not request.user.can_view_ticket(attachment.ticket):
+        raise PermissionDenied
+
+    blob = attachment.blob
+    etag = f'"{blob.sha256}"'
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, blob.size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{blob.size}'
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, blob.size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    length = max(end - start + 1, 0)
+
+    response = StreamingHttpResponse(
+        iter_file_range(blob.path, start, length),
+        status=status,
+        content_type=attachment.content_type or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = content_disposition_header(True, attachment.filename)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{blob.size}'
+    return response
+
+
+COMMENT_PAGE_SIZE = 50
+COMMENT_MAX_PAGE_SIZE = 200
+
+
+def _serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'parent': comment.parent_id,
+        'author': comment.author_id,
+        'body': comment.body,
+        'created_at': comment.created_at.isoformat(),
+    }
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def ticket_comments(request, ticket_id):
+    """
+    GET returns one keyset page of comments (``?cursor=`` and ``?limit=``);
+    POST adds a comment from ``body`` and optional ``parent``.
+    """
+    ticket = get_object_or_404(Ticket, pk=ticket_id)
+    if not request.user.can_view_ticket(ticket):
+        raise PermissionDenied
+
+    if request.method == 'POST':
+        if not request.user.can_edit_tickets():
+            raise PermissionDenied
+        try:
+            parent_id = int(request.POST['parent']) if request.POST.get('parent') else None
+            if parent_id is not None and not 0 < parent_id <= MAX_ID:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'errors': {'parent': ['Expected a comment id.']}}, status=400)
+        comment = TicketComment(
+            ticket=ticket,
+            author=request.user,
+            body=request.POST.get('body', ''),
+            parent_id=parent_id,
+        )
+        try:
+            comment.full_clean()
+        except ValidationError as e:
+            return JsonResponse({'errors': e.message_dict}, status=400)
+        comment.save()
+        return JsonResponse(_serialize_comment(comment), status=201)
+
+    try:
+        limit = min(int(request.GET.get('limit', COMMENT_PAGE_SIZE)), COMMENT_MAX_PAGE_SIZE)
+        comments, next_cursor = TicketComment.objects.filter(ticket=ticket).keyset_page(
+            cursor=request.GET.get('cursor'), limit=max(limit, 1)
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit.'}, status=400)
+
+    return JsonResponse({
+        'count': ticket.comment_count,
+        'results': [_serialize_comment(c) for c in comments],
+        'next_cursor': next_cursor,
+    })
+
+
+TICKET_PAGE_SIZE = 50
+TICKET_MAX_PAGE_SIZE = 200
+# Query parameter -> model field
+TICKET_LIST_FILTERS = {
+    'status': 'status',
+    'priority': 'priority',
+    'company': 'company_id',
+    'assigned_to': 'assigned_to_id',
+}
+
+
+def _validators(queryset, selection):
+    """
+    Columns and versions that change whenever the selected data does: the
+    ticket's updated_at, its company's when company fields are nested, and
+    the users namespace version when user fields are.
+    """
+    columns = ['id', 'updated_at']
+    if selection.get('company'):
+        columns.append('company__updated_at')
+    versions = []
+    if any(selection.get(name) for name in USER_RELATIONS):
+        versions.append(f'users:{namespace_version(USERS)}')
+    return queryset.values_list(*columns), versions
+
+
+@login_required
+@require_GET
+def ticket_detail(request, ticket_id):
+    """
+    Return one ticket with the fields chosen in ``?fields=``.
+
+    Supports ``If-None-Match``/``If-Modified-Since``: the validators come
+    from ``updated_at`` alone, so an unchanged ticket is answered with a
+    304 without loading the row.
+    """
+    try:
+        selection = TICKET_FIELDS.parse(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    tickets = Ticket.objects.filter(pk=ticket_id).visible_to(request.user)
+    validators, versions = _validators(tickets, selection)
+    row = validators.first()
+    if row is None:
+        if Ticket.objects.filter(pk=ticket_id).exists():
+            raise PermissionDenied
+        raise Http404
+    updated_at = max(value for value in row[1:] if value is not None)
+
+    etag = make_etag('ticket', request.user.ticket_scope(), request.GET.get('fields', ''), *row, *versions)
+    response = not_modified(request, etag, updated_at)
+    if response is not None:
+        return response
+
+    ticket = TICKET_FIELDS.apply(tickets, selection).first()
+    if ticket is None:
+        raise Http404
+    return set_validators(JsonResponse(TICKET_FIELDS.serialize(ticket, selection)), etag, updated_at)
+
+
+def _page_validators(tickets, selection, cursor, limit):
+    """
+    Return ``(ids, next_cursor, validators)`` for one page: the ids in
+    order plus the ``updated_at`` values (and version keys) its ETag is
+    built from.
+    """
+    rows, next_cursor = tickets.newest_page(cursor=cursor, limit=limit)
+    ids = [pk for pk, _ in rows]
+    validators, versions = _validators(Ticket.objects.filter(pk__in=ids), selection)
+    if selection.get('company'):
+        rows = list(validators)
+    return ids, next_cursor, rows, versions
+
+
+def _page_results(ids, selection):
+    by_id = TICKET_FIELDS.apply(Ticket.objects.all(), selection).in_bulk(ids)
+    return [TICKET_FIELDS.serialize(by_id[pk], selection) for pk in ids if pk in by_id]
+
+
+def _cached_company(user, filters):
+    """The one company a ticket list is confined to, if any; only those lists are cached."""
+    if not user.can_view_all_tickets():
+        return user.company_id
+    if 'company_id' in filters:
+        return int(filters['company_id'])
+    return None
+
+
+@login_required
+@require_GET
+def ticket_list(request):
+    """
+    Return one keyset page of the tickets the user can see, newest first,
+    with the fields chosen in ``?fields=``.
+
+    Filters: ``status``, ``priority``, ``company`` and ``assigned_to``;
+    paging: ``cursor`` and ``limit``. The ETag covers the ids and
+    ``updated_at`` values of the page, so it changes when any ticket on the
+    page is edited, added or removed. There is no Last-Modified: the newest
+    ``updated_at`` on the page does not move when a ticket is deleted or
+    leaves the page.
+
+    Pages confined to one company (the user's own, or a ``company`` filter)
+    are cached whole with ``cached_fragment``; the company's cache version
+    changes on every write to its tickets, so a hit needs no queries.
+    """
+    tickets = Ticket.objects.visible_to(request.user)
+    filters = {
+        field: request.GET[name] for name, field in TICKET_LIST_FILTERS.items() if request.GET.get(name)
+    }
+    fields, cursor = request.GET.get('fields', ''), request.GET.get('cursor')
+    try:
+        selection = TICKET_FIELDS.parse(fields)
+        tickets = tickets.filter(**filters)
+        limit = max(min(int(request.GET.get('limit', TICKET_PAGE_SIZE)), TICKET_MAX_PAGE_SIZE), 1)
+        company_id = _cached_company(request.user, filters)
+        etag_parts = ('tickets', request.user.ticket_scope(), sorted(filters.items()), fields, cursor, limit)
+
+        if company_id is None:
+            ids, next_cursor, rows, versions = _page_validators(tickets, selection, cursor, limit)
+            page = None
+        else:
+            def render():
+                ids, next_cursor, rows, versions = _page_validators(tickets, selection, cursor, limit)
+                return {
+                    'results': _page_results(ids, selection),
+                    'next_cursor': next_cursor,
+                    'rows': rows,
+                    'versions': versions,
+                }
+            page = cached_fragment(f'ticket_list:{make_etag(*etag_parts)}', company_id, render)
+            next_cursor, rows, versions = page['next_cursor'], page['rows'], page['versions']
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    etag = make_etag(*etag_parts, *versions, *sorted(rows))
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    results = page['results'] if page is not None else _page_results(ids, selection)
+    return set_validators(JsonResponse({'results': results, 'next_cursor': next_cursor}), etag)
+
+
+@login_required
+@require_POST
+def ticket_batch(request):
+    """
+    Apply a batch of ticket creates and updates in one transaction.
+
+    The body is JSON: ``{"operations": [...], "atomic": false}`` (see
+    ticketing.batch). The response lists a result per operation. With
+    ``atomic`` set, any invalid operation rejects the whole batch with 400.
+    """
+    if not request.user.can_edit_tickets():
+        raise PermissionDenied
+    try:
+        payload = json.loads(request.body)
+        operations = payload['operations']
+        if not isinstance(operations, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with an "operations" list.'}, status=400)
+    if len(operations) > max_operations():
+        return JsonResponse({'error': f'At most {max_operations()} operations per batch.'}, status=400)
+
+    atomic = bool(payload.get('atomic'))
+    results = apply_batch(request.user, operations, atomic=atomic)
+    failed = any(result['status'] == 'error' for result in results)
+    return JsonResponse({'results': results}, status=400 if atomic and failed else 200)
+
+
+DUPLICATE_MAX_LIMIT = 100
+
+
+@login_required
+@require_GET
+def ticket_duplicates(request, ticket_id):
+    """
+    Return the tickets of the same company that are likely duplicates of
+    this one, most similar first.
+
+    ``threshold`` (0-1, default 0.5) is the minimum estimated similarity of
+    title and description; ``limit`` caps the results. Candidates come from
+    the LSH index (ticketing.similarity), so the cost does not grow with the
+    number of tickets.
+    """
+    ticket = get_object_or_404(Ticket.objects.only('company_id', 'title', 'description'), pk=ticket_id)
+    if not request.user.can_view_ticket(ticket):
+        raise PermissionDenied
+    try:
+        threshold = float(request.GET.get('threshold', DEFAULT_THRESHOLD))
+        limit = min(int(request.GET.get('limit', 20)), DUPLICATE_MAX_LIMIT)
+        if not 0 <= threshold <= 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Invalid threshold or limit.'}, status=400)
+
+    matches = find_duplicates(ticket, threshold=threshold, limit=max(limit, 1))
+    by_id = Ticket.objects.only('title', 'status', 'created_at', 'duplicate_of').in_bulk(
+        [pk for pk, _ in matches]
+    )
+    return JsonResponse({'results': [
+        {
+            'id': pk,
+            'title': by_id[pk].title,
+            'status': by_id[pk].status,
+            'created_at': by_id[pk].created_at.isoformat(),
+            'duplicate_of': by_id[pk].duplicate_of_id,
+            'similarity': round(score, 3),
+        }
+        for pk, score in matches if pk in by_id
+    ]})